@@ -0,0 +1,152 @@
+"""
+Builds the archives of the logs (or replays) of a contest: one with all the files, and one per team with the files of
+its games, compressing each file only once.
+
+Each file is compressed (in a pool of processes) as one member holding its tar entry (header, data, and padding), with
+the codec of the archives (gzip, zstd, xz, or none; see archive_codecs.py). As their readers (and tar) go through
+concatenated members as one stream, the archive of all the files is
+just their members one after another, followed by a member with the end-of-archive blocks of tar, and the archive of a
+team is a copy of the byte ranges of the members of its files (plus the end member). So the per-team archives are
+built (also in the pool) by copying bytes, not by compressing the files of each game again once per team.
+
+The files of each team are given (e.g., from the games of the contest), not found by their name: a team whose name
+is in the name of another team (e.g., "bot" and "robot") does not get the files of the other team.
+
+The offset and length of the member of each file in the archive of all the files is returned, and can be saved as
+the index of the archive (see archive_index.py), so single files and the files of a team can also be read from it with
+byte ranges, without the per-team archives.
+"""
+import os
+import time
+import shutil
+import logging
+import tarfile
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+from archive_codecs import GzipCodec
+from archive_index import save_index
+
+COPY_BUFFER_BYTES = 1024 * 1024
+
+
+def _tar_header(file_path, name):
+    """Returns the tar header (GNU format) of a regular file, stored with name in the archive"""
+    info = tarfile.TarInfo(name)
+    file_stat = os.stat(file_path)
+    info.size = file_stat.st_size
+    info.mtime = int(file_stat.st_mtime)
+    info.mode = file_stat.st_mode & 0o7777
+    return info.tobuf(format=tarfile.GNU_FORMAT, encoding="utf-8", errors="surrogateescape")
+
+
+def _compress_member(args):
+    """Compresses the tar entry of a file into a part file (one member) and returns the size of the part"""
+    file_path, name, part_file, codec = args
+    with open(file_path, "rb") as f_in, open(part_file, "wb") as f_out:
+        with codec.open_member(f_out) as gz:
+            gz.write(_tar_header(file_path, name))
+            size = 0
+            while True:
+                chunk = f_in.read(COPY_BUFFER_BYTES)
+                if not chunk:
+                    break
+                gz.write(chunk)
+                size += len(chunk)
+            if size % tarfile.BLOCKSIZE:
+                gz.write(tarfile.NUL * (tarfile.BLOCKSIZE - size % tarfile.BLOCKSIZE))
+    return os.path.getsize(part_file)
+
+
+def _end_member(codec):
+    """Returns the member with the end-of-archive marker of tar (two zero blocks)"""
+    return codec.compress(tarfile.NUL * (2 * tarfile.BLOCKSIZE))
+
+
+def _copy_ranges(args):
+    """Writes an archive with the byte ranges (offset, length) of another archive, followed by an end member"""
+    src_archive, ranges, dst_archive, end_member = args
+    with open(src_archive, "rb") as f_in, open(dst_archive, "wb") as f_out:
+        for offset, length in ranges:
+            f_in.seek(offset)
+            while length > 0:
+                chunk = f_in.read(min(COPY_BUFFER_BYTES, length))
+                if not chunk:
+                    raise IOError(f"Archive {src_archive} is shorter than expected")
+                f_out.write(chunk)
+                length -= len(chunk)
+        f_out.write(end_member)
+    return dst_archive
+
+
+def build_archives(folder, archive_file, team_archives, teams=None, no_workers=None, codec=None, on_archive=None):
+    """Builds the archive of all the files in a folder, and the archives of subsets of them (e.g., per team)
+
+    Args:
+        folder (str): the folder with the files to archive (only its regular files; sub-folders are skipped)
+        archive_file (str): the archive of all the files, stored by their name (no folder)
+        team_archives (dict): archive file -> list of names of the files (in folder) that go in it
+        teams (dict, optional): team name -> names of the files of its games, to save the index of archive_file next
+            to it (see archive_index.py). Defaults to None (no index).
+        no_workers (int, optional): no. of processes that compress files and build archives. Defaults to no. of CPUs.
+        codec (Codec, optional): the codec of the archives (see archive_codecs.py), which must match the extension of
+            their files. Defaults to None (gzip, level 9).
+        on_archive (callable, optional): called with archive_file once it is complete (and indexed), before the
+            per-team archives are built (e.g., to start uploading it in the background). Defaults to None.
+
+    Returns:
+        dict: name of each file -> (offset, length) of its member in archive_file
+    """
+    if codec is None:
+        codec = GzipCodec()
+    start_time = time.time()
+    names = sorted(
+        name
+        for name in os.listdir(folder)
+        if os.path.isfile(os.path.join(folder, name)) and os.path.join(folder, name) not in team_archives
+    )
+    end_member = _end_member(codec)
+
+    index = {}
+    parts_dir = tempfile.mkdtemp(prefix=".parts-", dir=os.path.dirname(os.path.abspath(archive_file)))
+    try:
+        with ProcessPoolExecutor(max_workers=no_workers or os.cpu_count()) as executor:
+            # compress each file once, into its own member, and then concatenate them all into the full archive
+            jobs = [
+                (os.path.join(folder, name), name, os.path.join(parts_dir, str(i)), codec)
+                for i, name in enumerate(names)
+            ]
+            offset = 0
+            with open(archive_file, "wb") as f_out:
+                for (_, name, part_file, _), length in zip(jobs, executor.map(_compress_member, jobs)):
+                    with open(part_file, "rb") as f_in:
+                        shutil.copyfileobj(f_in, f_out, COPY_BUFFER_BYTES)
+                    os.remove(part_file)
+                    index[name] = (offset, length)
+                    offset += length
+                f_out.write(end_member)
+            if teams is not None:
+                save_index(archive_file, index, (offset, len(end_member)), teams, codec.name)
+            input_mb = sum(os.path.getsize(os.path.join(folder, name)) for name in names) / 2 ** 20
+            secs = max(time.time() - start_time, 1e-3)
+            logging.info(
+                f"Archived {len(names)} files ({input_mb:.1f} MB) into {archive_file} "
+                f"({(offset + len(end_member)) / 2 ** 20:.1f} MB) with {codec.name} in {secs:.1f} secs: "
+                f"{input_mb / secs:.1f} MB/s"
+            )
+            if on_archive is not None:
+                on_archive(archive_file)
+
+            # the archive of each team is a copy of the members of its files
+            jobs = []
+            for team_archive, team_names in team_archives.items():
+                missing = [name for name in team_names if name not in index]
+                if missing:
+                    logging.warning(f"{len(missing)} files to put in {team_archive} are not in {folder}; skipped")
+                ranges = [index[name] for name in team_names if name in index]
+                jobs.append((archive_file, ranges, team_archive, end_member))
+            list(executor.map(_copy_ranges, jobs))
+    finally:
+        shutil.rmtree(parts_dir, ignore_errors=True)
+
+    return index
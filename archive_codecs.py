@@ -0,0 +1,178 @@
+"""
+Codecs to compress the archives of the logs and replays of a contest (see archive_builder.py):
+
+    - gzip: .tar.gz, with zlib at the given level (1-9; default 9, as tarfile "w:gz").
+    - zstd: .tar.zst, much faster than gzip for a similar ratio (levels 1-19; default 3), with several threads per
+        file. Uses the zstandard library if installed, and else the zstd command.
+    - xz: .tar.xz, slower but smaller (presets 0-9; default 6).
+    - none: .tar, not compressed at all (e.g., if the web server or file system already compresses them).
+
+Archives are built as one compressed member (gzip member, zstd frame, or xz stream) per file, one after another. All
+these formats decompress concatenated members as one stream, so the archives are valid for tar and other tools (e.g.,
+tar xzf, tar --zstd -xf, and tar xJf), and each member can also be decompressed on its own (see archive_index.py).
+
+Only the standard library is needed, except for zstd (library or command).
+"""
+import os
+import io
+import gzip
+import lzma
+import shutil
+import subprocess
+
+
+class Codec:
+    """A compression format of archives: compresses files (streams) into members, and decompresses members"""
+
+    name = "none"
+    extension = ".tar"
+    default_level = None
+
+    def __init__(self, level=None, threads=1):
+        """
+        :param level: compression level (None: the default of the codec)
+        :param threads: no. of threads to compress each member (only for codecs that support it)
+        """
+        self.level = level if level is not None else self.default_level
+        self.threads = threads
+
+    def open_member(self, f_out):
+        """Returns a writable binary stream that writes one compressed member into file object f_out when closed"""
+        return _Unclosable(f_out)
+
+    def compress(self, data):
+        """Returns data compressed as one member"""
+        f_out = io.BytesIO()
+        with self.open_member(f_out) as member:
+            member.write(data)
+        return f_out.getvalue()
+
+    def decompress(self, data):
+        """Returns the data of one (or more, concatenated) compressed members"""
+        return data
+
+
+class _Unclosable(io.RawIOBase):
+    """Writes into a file object that stays open when this is closed"""
+
+    def __init__(self, f):
+        self._f = f
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        return self._f.write(data)
+
+
+class GzipCodec(Codec):
+    name = "gzip"
+    extension = ".tar.gz"
+    default_level = 9  # as tarfile "w:gz"
+
+    def open_member(self, f_out):
+        return gzip.GzipFile(filename="", fileobj=f_out, mode="wb", compresslevel=self.level, mtime=0)
+
+    def decompress(self, data):
+        return gzip.decompress(data)
+
+
+class XzCodec(Codec):
+    name = "xz"
+    extension = ".tar.xz"
+    default_level = 6
+
+    def open_member(self, f_out):
+        return lzma.LZMAFile(f_out, mode="wb", format=lzma.FORMAT_XZ, preset=self.level)
+
+    def decompress(self, data):
+        return lzma.decompress(data)
+
+
+class ZstdCodec(Codec):
+    name = "zstd"
+    extension = ".tar.zst"
+    default_level = 3
+
+    def open_member(self, f_out):
+        try:
+            import zstandard
+        except ImportError:
+            return _ZstdCommandWriter(f_out, self.level, self.threads)
+        compressor = zstandard.ZstdCompressor(level=self.level, threads=self.threads if self.threads > 1 else 0)
+        return compressor.stream_writer(f_out, closefd=False)
+
+    def compress(self, data):
+        try:
+            import zstandard
+        except ImportError:
+            return subprocess.run(
+                ["zstd", "-q", "-c", f"-{self.level}"], input=data, stdout=subprocess.PIPE, check=True
+            ).stdout
+        return zstandard.ZstdCompressor(level=self.level).compress(data)
+
+    def decompress(self, data):
+        try:
+            import zstandard
+        except ImportError:
+            return subprocess.run(["zstd", "-d", "-q", "-c"], input=data, stdout=subprocess.PIPE, check=True).stdout
+        with zstandard.ZstdDecompressor().stream_reader(io.BytesIO(data), read_across_frames=True) as reader:
+            return reader.read()
+
+
+class _ZstdCommandWriter(io.RawIOBase):
+    """Compresses what is written with the zstd command (one frame) into a (real) file, which stays open"""
+
+    def __init__(self, f_out, level, threads):
+        f_out.flush()
+        self._process = subprocess.Popen(
+            ["zstd", "-q", "-c", f"-{level}", f"-T{threads}"], stdin=subprocess.PIPE, stdout=f_out.fileno()
+        )
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._process.stdin.write(data)
+        return len(data)
+
+    def close(self):
+        if not self.closed:
+            self._process.stdin.close()
+            if self._process.wait() != 0:
+                raise IOError(f"zstd failed with exit code {self._process.returncode}")
+        super().close()
+
+
+CODECS = {codec.name: codec for codec in [GzipCodec, ZstdCodec, XzCodec, Codec]}
+ARCHIVE_EXTENSIONS = [codec.extension for codec in CODECS.values()]
+
+
+def get_codec(name, level=None, threads=1):
+    """Returns the codec with that name (gzip, zstd, xz, or none), to compress at that level (None: its default)"""
+    if name == "zstd" and shutil.which("zstd") is None:
+        try:
+            import zstandard  # noqa: F401
+        except ImportError:
+            raise ValueError("The zstd codec needs the zstandard library (pip install zstandard) or the zstd command")
+    return CODECS[name](level, threads)
+
+
+def find_archive(archive_path):
+    """Returns the archive of path archive_path + the extension of any codec (e.g., logs_<id>.tar.zst), or None
+
+    Args:
+        archive_path (str): the path of the archive, without extension (e.g., www/logs-archive/logs_<id>)
+    """
+    for extension in ARCHIVE_EXTENSIONS:
+        if os.path.isfile(archive_path + extension):
+            return archive_path + extension
+    return None
+
+
+def codec_of(archive_file):
+    """Returns the codec (with default level) of an archive from its extension (e.g., gzip for .tar.gz)"""
+    for codec in CODECS.values():
+        if archive_file.endswith(codec.extension):
+            return codec()
+    raise ValueError(f"Unknown extension of archive {archive_file}")
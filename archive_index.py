@@ -0,0 +1,151 @@
+"""
+Random access to the archives of the logs (or replays) of a contest, through their index.
+
+The archive of all the logs of a contest (built by archive_builder.py) is a .tar.gz (or .tar.zst, etc.) made of one
+compressed member per log, so the bytes of each member are a small archive of its own. The index of the archive, saved
+next to it as <archive>.index.json, tells where each member is, which files are those of each team, and the codec:
+
+    {"files": {"alpha_vs_beta_RANDOM1.log": [0, 3412], ...},    # name -> [offset, length] of its member
+     "end": [81234, 35],                                         # member with the end-of-archive blocks of tar
+     "teams": {"alpha": ["alpha_vs_beta_RANDOM1.log", ...], ...},
+     "codec": "gzip"}                                            # see archive_codecs.py
+
+With it, a single game is read by decompressing just its member (read_file()), and the archive of a team is streamed
+as the byte ranges of its members plus the end member (iter_bundle()), which is a valid archive. So the plain files
+and the per-team archives do not need to be stored (see --www-archives indexed), and web pages can fetch single games
+or per-team bundles from the archive itself with HTTP range requests.
+
+This module (and archive_codecs.py) only uses the standard library, so it can also be used by the dashboard. It can
+also be run to get files out of an archive:
+
+    python archive_index.py www/logs-archive/logs_<id>.tar.gz --team alpha --output logs_alpha.tar.gz
+    python archive_index.py www/logs-archive/logs_<id>.tar.gz --file alpha_vs_beta_RANDOM1.log
+"""
+import io
+import sys
+import json
+import argparse
+import tarfile
+
+from archive_codecs import get_codec
+
+INDEX_SUFFIX = ".index.json"
+READ_BUFFER_BYTES = 1024 * 1024
+
+
+def index_file_of(archive_file):
+    """Returns the index file of an archive"""
+    return archive_file + INDEX_SUFFIX
+
+
+def save_index(archive_file, files, end, teams, codec="gzip"):
+    """Saves the index of an archive next to it
+
+    Args:
+        archive_file (str): the archive
+        files (dict): name of each file -> (offset, length) of its member in the archive
+        end (tuple): (offset, length) of the end member of the archive
+        teams (dict): team name -> names of the files of its games
+        codec (str, optional): name of the codec of the archive. Defaults to "gzip".
+
+    Returns:
+        str: the index file
+    """
+    index_file = index_file_of(archive_file)
+    with open(index_file, "w") as f:
+        json.dump({"files": files, "end": end, "teams": teams, "codec": codec}, f)
+    return index_file
+
+
+def load_index(archive_file):
+    """Loads the index of an archive (see save_index()); raises OSError if it has none"""
+    with open(index_file_of(archive_file), "r") as f:
+        return json.load(f)
+
+
+def _read_range(f, offset, length):
+    f.seek(offset)
+    data = f.read(length)
+    if len(data) != length:
+        raise IOError(f"Archive {f.name} is shorter than its index")
+    return data
+
+
+def read_file(archive_file, name, index=None):
+    """Reads a single file (e.g., the log of a game) from an indexed archive, decompressing only its member
+
+    Args:
+        archive_file (str): the archive
+        name (str): the name of the file in the archive
+        index (dict, optional): the index of the archive, if already loaded. Defaults to None (load it).
+
+    Returns:
+        bytes: the content of the file; raises KeyError if it is not in the archive
+    """
+    if index is None:
+        index = load_index(archive_file)
+    offset, length = index["files"][name]
+    with open(archive_file, "rb") as f:
+        member = get_codec(index.get("codec", "gzip")).decompress(_read_range(f, offset, length))
+    with tarfile.open(fileobj=io.BytesIO(member), mode="r:") as tar:
+        return tar.extractfile(tar.next()).read()
+
+
+def iter_bundle(archive_file, names, index=None):
+    """Streams an archive with some files (e.g., those of a team) of an indexed archive, copying byte ranges of it
+
+    Args:
+        archive_file (str): the archive
+        names (list(str)): the names of the files to put in the bundle; those not in the archive are skipped
+        index (dict, optional): the index of the archive, if already loaded. Defaults to None (load it).
+
+    Yields:
+        bytes: consecutive chunks of the bundle
+    """
+    if index is None:
+        index = load_index(archive_file)
+    ranges = [index["files"][name] for name in names if name in index["files"]]
+    with open(archive_file, "rb") as f:
+        for offset, length in ranges + [index["end"]]:
+            f.seek(offset)
+            while length > 0:
+                chunk = f.read(min(READ_BUFFER_BYTES, length))
+                if not chunk:
+                    raise IOError(f"Archive {archive_file} is shorter than its index")
+                length -= len(chunk)
+                yield chunk
+
+
+def team_files(index, team_name):
+    """Returns the names of the files of the games of a team in an indexed archive (empty if it has none)"""
+    return index["teams"].get(team_name, [])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Gets files out of an indexed archive of logs or replays.")
+    parser.add_argument("archive", help="the archive (e.g., www/logs-archive/logs_<id>.tar.gz).")
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("--file", help="name of a file (game) to read.")
+    group.add_argument("--team", help="name of a team, to build the archive with the files of its games.")
+    group.add_argument("--list", help="list the teams and files in the archive.", action="store_true")
+    parser.add_argument("--output", help="file where to write the file or bundle (default: standard output).")
+    args = parser.parse_args()
+
+    archive_index = load_index(args.archive)
+    if args.list:
+        for team, names in sorted(archive_index["teams"].items()):
+            print(f"{team}: {len(names)} files")
+        for name in sorted(archive_index["files"]):
+            print(name)
+        sys.exit(0)
+
+    out = open(args.output, "wb") if args.output else sys.stdout.buffer
+    try:
+        if args.file:
+            out.write(read_file(args.archive, args.file, archive_index))
+        else:
+            for data in iter_bundle(args.archive, team_files(archive_index, args.team), archive_index):
+                out.write(data)
+    finally:
+        if args.output:
+            out.close()
@@ -5,6 +5,7 @@ from zoneinfo import ZoneInfo
 
 DIR_SCRIPT = sys.path[0]
 DIR_ASSETS = os.path.join(DIR_SCRIPT, "assets")
+DIR_WORKER = os.path.join(DIR_SCRIPT, "worker")  # scripts shipped with the contest bundle to run in the workers
 
 # !!!! SUPER IMPORTANT !!!!
 # Where Python is installed and the pacman virtual environment
@@ -35,6 +36,15 @@ TMP_DIR = "tmp"
 TMP_CONTEST_DIR = 'contest-run' # where the contest game script is expanded and kept (to have a full copy)
 TMP_REPLAYS_DIR = 'replays-run'
 TMP_LOGS_DIR = 'logs-run'
+# result files of the games (result-0.json, written by capture.py next to the replay) and their resources used
+TMP_RESULTS_DIR = 'results-run'
+TMP_BATCHES_DIR = 'batches-run'  # archives returned by jobs that play several games (see --games-per-job)
+JOURNAL_FILE = 'journal.jsonl'  # append-only record of the games completed, used to resume a contest
+
+# limits of the result cache (see --result-cache-dir): games not used in this many days are removed from it, and then
+# the least recently used ones, to keep at most this many
+RESULT_CACHE_MAX_AGE_DAYS = 30
+RESULT_CACHE_MAX_ENTRIES = 100000
 
 # the package that contains the contest game script (is static; changed only for new contest versions)
 CONTEST_ZIP_FILE = os.path.join(DIR_ASSETS, "contest.zip")
@@ -43,10 +53,27 @@ CONTEST_ZIP_FILE = os.path.join(DIR_ASSETS, "contest.zip")
 # this file is transfered once at the start to the worker hosts
 CORE_CONTEST_TEAM_ZIP_FILE = "contest_and_teams.zip"
 
+# folder in each worker host where the contest+teams bundle is unpacked once, under a sub-folder named by its hash
+# every game then runs in a cheap symlink view of that (read-only) copy, instead of unzipping the bundle again
+WORKER_CACHE_DIR = "/tmp/pacman-contest-cache"
+WORKER_CACHE_KEEP = 3  # bundles kept unpacked in each worker (the most recently used); older ones are removed
+
+# with delta sync, the bundle is sent instead as pieces (engine and one per team) named by their hash; each worker
+# keeps them in this content-addressed store, so pieces already there (e.g., unchanged teams) are not sent again
+WORKER_STORE_DIR = os.path.join(WORKER_CACHE_DIR, "store")
+TMP_PIECES_DIR = 'bundle-pieces'  # pieces of the bundle, and the script to assemble it in the workers
+
+# warm game server run in each worker (when enabled): forks one pre-loaded game engine per game
+GAME_SERVER_SCRIPT = "game_server.py"
+
+# wrapper of each game in the workers that records its CPU time and peak memory (resources-0.json)
+GAME_RESOURCES_SCRIPT = "game_resources.py"
+
 # STAFF_TEAM_FILENAME_PATTERN = re.compile(r"^staff\_team\_.+\.zip$")
 STAFF_TEAM_FILENAME_PATTERN = re.compile(r"^staff\_team\_.+$")
 SUBMISSION_FILENAME_PATTERN = re.compile(r"^(s\d+)(_([-+0-9T:.]+))?(\.zip)?$")
 TEAMS_SUBDIR = "teams"
+PYCACHE_DIR = "__pycache__"  # compiled Python files, left out of the hashes and zips of the code of contest and teams
 AGENT_FILE_NAME = "myTeam.py"
 
 DEFAULT_CONFIG_FILE = "config.json"
@@ -56,5 +83,37 @@ DEFAULT_LAYOUTS_ZIP_FILE = os.path.join(DIR_ASSETS, "layouts.zip")
 DEFAULT_RANDOM_LAYOUTS = 3
 
 DEFAULT_NO_SPLIT = 1
+DEFAULT_GAMES_PER_JOB = 1
+JOB_ORDERS = ["generated", "longest-first"]  # order in which jobs are submitted (see --job-order)
+DEFAULT_JOB_ORDER = "generated"
+LOG_PARSE_MODES = ["full", "tail"]  # how game logs are parsed for their outcome (see --log-parse-mode)
+DEFAULT_LOG_PARSE_MODE = "full"
+# what is kept in WWW of the logs and replays of a contest (see --www-archives): plain files, the archive of all of them
+# (and its index), and per-team archives; or only the archive and its index (see archive_index.py)
+WWW_ARCHIVES_MODES = ["all", "indexed"]
+DEFAULT_WWW_ARCHIVES = "all"
+WWW_STAGING_MODES = ["copy", "link", "move"]  # how logs and replays are put into WWW (see --www-staging, file_staging.py)
+DEFAULT_WWW_STAGING = "copy"
+ARCHIVE_CODECS = ["gzip", "zstd", "xz", "none"]  # compression of the archives of logs and replays (see archive_codecs.py)
+DEFAULT_ARCHIVE_CODEC = "gzip"
+
+# uploads of the archives of logs and replays (see --upload-all and uploader.py)
+DEFAULT_UPLOAD_URL = "https://transfer.sh"  # each archive is PUT to <url>/<file name>
+UPLOAD_WORKERS = 2  # archives uploaded at once, in the background
+# times a failed upload (or chunk) is retried, waiting UPLOAD_BACKOFF_SECS first, then twice as long, etc.
+UPLOAD_RETRIES = 5
+UPLOAD_BACKOFF_SECS = 2
+UPLOAD_TIMEOUT_SECS = 60
+
+BASELINE_TEAM_FILE = "baselineTeam.py"  # in the contest zip file
+
+# smoke test of the teams before the contest (see --smoke-test): one short game of each team vs the baseline team
+SMOKE_TEST_STEPS = 40
+SMOKE_TEST_TIMEOUT = 300  # secs for a smoke test game; a team that takes longer is not taken as failed
+
+# calibration of the hosts (see --calibrate-hosts): a game between baseline teams, always the same, timed in each host
+CALIBRATION_LAYOUT = "RANDOM1"  # random layouts are generated from their seed, so it is the same in all hosts
+CALIBRATION_STEPS = 600
+CALIBRATION_MARK = "Calibration game ms:"  # printed by the calibration job, followed by the ms taken by the game
 
 LOG_HEADER_MARK = "##########"
@@ -5,26 +5,47 @@ import shutil
 import zipfile
 import glob
 import tarfile
-import subprocess
 import json
 from itertools import combinations
 import logging
 from config import *
 import random
 
-from cluster_manager.elements import ClusterManager
 from cluster_manager.config import Job, TransferableFile
+from duration_estimator import DurationEstimator
+from job_journal import JobJournal
+from result_cache import ResultCache
+from log_parser import parse_game_log, parse_game_log_file, parse_game_logs, parse_game_result_file
+from timing import Tracer, traced, save_timing
+from archive_builder import build_archives
+from archive_index import read_file, index_file_of
+from archive_codecs import get_codec, find_archive
+from uploader import Uploader
+from file_staging import stage_file, stage_tree
 
 from config import (
     TMP_CONTEST_DIR,
     TMP_REPLAYS_DIR,
     TMP_LOGS_DIR,
+    TMP_RESULTS_DIR,
+    TMP_BATCHES_DIR,
+    JOURNAL_FILE,
     CORE_CONTEST_TEAM_ZIP_FILE,
     STATS_ARCHIVE_DIR,
     CONFIG_ARCHIVE_DIR,
     LOGS_ARCHIVE_DIR,
     REPLAYS_ARCHIVE_DIR,
     ERROR_SCORE,
+    WORKER_CACHE_DIR,
+    WORKER_CACHE_KEEP,
+    WORKER_STORE_DIR,
+    TMP_PIECES_DIR,
+    GAME_SERVER_SCRIPT,
+    GAME_RESOURCES_SCRIPT,
+    BASELINE_TEAM_FILE,
+    CALIBRATION_LAYOUT,
+    CALIBRATION_STEPS,
+    CALIBRATION_MARK,
 )
 
 class ContestRunner:
@@ -47,9 +68,17 @@ class ContestRunner:
             Logs, replays, stats will be dumped there (plain and compressed versions) together with an HTML page
     """
 
-    def __init__(self, settings):
+    def __init__(self, settings, setup_tracer=None):
+        """
+        :param settings: the settings of the contest
+        :param setup_tracer: Tracer of the setup of the multi-contest (e.g., bundle zipped), reported with this contest
+        """
         self.config = settings
 
+        # times the phases of the contest (see timing.py and save_timing())
+        self.tracer = Tracer()
+        self.setup_tracer = setup_tracer
+
         self.organizer = settings["organizer"]
         self.max_steps = settings["max_steps"]
         self.contest_timestamp_id = settings["contest_timestamp_id"]
@@ -60,6 +89,28 @@ class ContestRunner:
         self.tmp_contest = os.path.join(self.tmp_dir, TMP_CONTEST_DIR)
         self.tmp_replays_dir = os.path.join(self.tmp_dir, TMP_REPLAYS_DIR)
         self.tmp_logs_dir = os.path.join(self.tmp_dir, TMP_LOGS_DIR)
+        self.tmp_results_dir = os.path.join(self.tmp_dir, TMP_RESULTS_DIR)
+        self.tmp_batches_dir = os.path.join(self.tmp_dir, TMP_BATCHES_DIR)
+        self.journal = JobJournal(os.path.join(self.tmp_dir, JOURNAL_FILE))
+        # games restored from the journal of the contest resumed, if any (None: look for their logs instead)
+        self.journaled_games = None
+
+        # cache of games already played in previous contests (same code of both teams, layout, steps, and engine)
+        self.engine_hash = settings["engine_hash"]
+        self.team_hashes = settings["team_hashes"]
+        self.result_cache = None
+        if settings["result_cache_dir"]:
+            self.result_cache = ResultCache(settings["result_cache_dir"], self.engine_hash)
+        self.cached_games = set()  # games restored from the result cache
+        self.restored_games = set()  # games not played but restored (from a previous run or the result cache)
+
+        # incremental contest: reuse the games of the previous contest between teams whose code has not changed
+        self.incremental = settings["incremental"]
+        self.reused_games = []  # games (as in stats) reused from the previous contest, to be merged in the ladder
+
+        # teams that failed to load in the smoke test: their games are not played but forfeited
+        self.failed_teams = set(settings["failed_teams"])
+        self.forfeited_games = []  # games (as in stats) forfeited, to be merged in the ladder
 
         # Set the paths of data in the WWW output (logs, replays, stats)
         self.www_dir = settings["www_dir"]
@@ -67,6 +118,9 @@ class ContestRunner:
         self.config_www_dir = os.path.join(self.www_dir, CONFIG_ARCHIVE_DIR)
         self.logs_www_dir = os.path.join(self.www_dir, LOGS_ARCHIVE_DIR)
         self.replays_www_dir = os.path.join(self.www_dir, REPLAYS_ARCHIVE_DIR)
+        # folders of this contest in the WWW output, where its single logs and replays (and per team archives) go
+        self.logs_www_contest_dir = os.path.join(self.logs_www_dir, f"logs_{self.contest_timestamp_id}")
+        self.replays_www_contest_dir = os.path.join(self.replays_www_dir, f"replays_{self.contest_timestamp_id}")
 
         self.upload_replays = settings["upload_replays"]
         self.upload_logs = settings["upload_logs"]
@@ -80,6 +134,53 @@ class ContestRunner:
         self.all_teams = self.teams + self.staff_teams
         self.layouts = settings["layouts"]
 
+        # if set, run the games in this machine with that no. of worker processes, instead of in the hosts
+        self.local_workers = settings["local_workers"]
+
+        # no. of games played (in sequence) by each job, to amortise the overhead of each job in the cluster
+        self.games_per_job = settings["games_per_job"]
+
+        # analyze each game (and stage its log and replay into WWW) as soon as its job finishes (see JobScheduler)
+        self.stream_analysis = settings["stream_analysis"]
+
+        # run second copies of straggler games in idle slots near the end of the contest (see JobScheduler)
+        self.speculative = settings["speculative"]
+
+        # measure the speed of each host with a calibration game first, and skip those slower than the min. speed
+        self.calibrate_hosts = settings["calibrate_hosts"]
+        self.min_host_speed = settings["min_host_speed"]
+
+        # parse the whole log of each game for its outcome, or just its tail (see log_parser)
+        self.log_parse_mode = settings["log_parse_mode"]
+
+        # keep plain files and per-team archives in WWW, or only the archive of all files and its index (see
+        # archive_index)
+        self.www_archives = settings["www_archives"]
+        # copy, link, or move logs and replays from the temp folders into WWW (see file_staging)
+        self.www_staging = settings["www_staging"]
+        # where to upload archives of logs and replays (if asked), and in chunks of how many bytes (0: at once)
+        self.upload_url = settings["upload_url"]
+        self.upload_chunk_bytes = settings["upload_chunk_mb"] * 1024 * 1024
+        # no. of processes that compress logs and replays into their archives (not related to the game workers)
+        self.archive_workers = settings["archive_workers"] or os.cpu_count()
+        # codec of the archives of logs and replays; unless set, each process archiving files gets its share of the
+        # CPUs as threads to compress each file (for zstd)
+        self.archive_codec = get_codec(
+            settings["archive_codec"],
+            settings["archive_level"],
+            threads=settings["archive_threads"] or max(1, os.cpu_count() // self.archive_workers),
+        )
+
+        # order in which jobs are submitted: as generated, or longest expected first (using the stats of past contests)
+        self.job_order = settings["job_order"]
+
+        # hash of the contest+teams bundle; used to unpack it only once per worker host (None: unzip in every game)
+        self.bundle_hash = settings.get("bundle_hash")
+        # pieces (hash, folder) of the bundle, if sent to the workers' content-addressed store (delta sync)
+        self.bundle_pieces = settings.get("bundle_pieces")
+        # run games through the warm game server in each worker (needs the bundle cache, where the server lives)
+        self.game_server = settings["game_server"] and self.bundle_hash is not None
+
         # Build the temp folders if they do not exist
         if os.path.exists(self.tmp_dir):
             shutil.rmtree(self.tmp_dir)
@@ -93,10 +194,20 @@ class ContestRunner:
             shutil.rmtree(self.tmp_logs_dir)
         os.makedirs(self.tmp_logs_dir)
 
+        if os.path.exists(self.tmp_results_dir):
+            shutil.rmtree(self.tmp_results_dir)
+        os.makedirs(self.tmp_results_dir)
+
+        if os.path.exists(self.tmp_batches_dir):
+            shutil.rmtree(self.tmp_batches_dir)
+        os.makedirs(self.tmp_batches_dir)
+
         self.ladder = {n: [] for n, _ in self.all_teams}
         self.games = []
         self.errors = {n: 0 for n, _ in self.all_teams}
         self.team_stats = {n: 0 for n, _ in self.all_teams}
+        self.game_resources = {}  # resources used by each game played (see worker/game_resources.py)
+        self.team_resources = {}
 
     def _generate_job(self, red_team, blue_team, layout):
         """
@@ -113,21 +224,21 @@ class ContestRunner:
 
         game_command = self._get_game_command(red_team, blue_team, layout)
 
-        deflate_command = "mkdir -p {contest_dir} ; unzip -o {zip_file} -d {contest_dir} ; chmod +x -R *".format(
-            zip_file=os.path.join("/tmp", CORE_CONTEST_TEAM_ZIP_FILE),
-            contest_dir=self.tmp_dir,
-        )
+        deflate_command = self._get_setup_command()
 
         # this will be the complex command to be execute in the worker
         # Remember SSHClient.exec_command does not automatically load the same environment variables as an interactive login shell.
         # So, do not rely on anythinfg from the shell and give all
         # commands with full paths, including the Python used!
         # https://docs.paramiko.org/en/stable/api/client.html#paramiko.client.SSHClient.exec_command
-        command = "{deflate_command} ; cd {contest_dir} ; {game_command} ; touch {replay_filename}".format(
+        # (older engines do not write the result file: an empty one is returned, and the log is parsed instead)
+        command = "{deflate_command} ; cd {contest_dir} ; {game_command} ; touch {replay_filename} {result_filename} {resources_filename}".format(
             deflate_command=deflate_command,
             contest_dir=self.tmp_dir,
             game_command=game_command,
             replay_filename="replay-0",
+            result_filename="result-0.json",
+            resources_filename="resources-0.json",
         )
 
         replay_file_name = "{red_team_name}_vs_{blue_team_name}_{layout}.replay".format(
@@ -152,19 +263,121 @@ class ContestRunner:
             local_path=os.path.join(self.tmp_logs_dir, log_file_name),
             remote_path=os.path.join(self.tmp_dir, "log-0"),
         )
+        ret_file_result = TransferableFile(
+            local_path=os.path.join(self.tmp_results_dir, f"{red_team_name}_vs_{blue_team_name}_{layout}.json"),
+            remote_path=os.path.join(self.tmp_dir, "result-0.json"),
+        )
+        ret_file_resources = TransferableFile(
+            local_path=os.path.join(self.tmp_results_dir, f"{red_team_name}_vs_{blue_team_name}_{layout}.resources.json"),
+            remote_path=os.path.join(self.tmp_dir, "resources-0.json"),
+        )
 
         return Job(
             command=command,
             required_files=[],
-            return_files=[ret_file_replay, ret_file_log],
+            return_files=[ret_file_replay, ret_file_log, ret_file_result, ret_file_resources],
             data=(red_team, blue_team, layout),
             id="{}-vs-{}-in-{}".format(red_team_name, blue_team_name, layout),
         )
 
+    def _generate_batch_job(self, games):
+        """
+        Generates a job command to play a list of games in sequence, all in the same sandbox folder. The log,
+        replay, result, and resources files of each game are renamed as per the game, and all returned in one
+        (uncompressed) tar archive.
+
+        The job data is the list of games; see _expand_batch_results() to get the results of each game.
+
+        :param games: a list of tuples (red_team, blue_team, layout)
+        :return: a Job() object with the job to be scheduled in cluster
+        """
+        batch_dir = "games-out"
+        game_commands = []
+        for red_team, blue_team, layout in games:
+            game_file_name = f"{red_team[0]}_vs_{blue_team[0]}_{layout}"
+            game_commands.append(
+                "rm -f replay-0 log-0 result-0.json resources-0.json ; {game_command} ; "
+                "touch replay-0 log-0 result-0.json resources-0.json ; "
+                "mv replay-0 {batch_dir}/{game_file_name}.replay ; mv log-0 {batch_dir}/{game_file_name}.log ; "
+                "mv result-0.json {batch_dir}/{game_file_name}.json ; "
+                "mv resources-0.json {batch_dir}/{game_file_name}.resources.json".format(
+                    game_command=self._get_game_command(red_team, blue_team, layout),
+                    batch_dir=batch_dir,
+                    game_file_name=game_file_name,
+                )
+            )
+
+        command = "{deflate_command} ; cd {contest_dir} ; mkdir -p {batch_dir} ; {game_commands} ; tar cf games.tar -C {batch_dir} .".format(
+            deflate_command=self._get_setup_command(),
+            contest_dir=self.tmp_dir,
+            batch_dir=batch_dir,
+            game_commands=" ; ".join(game_commands),
+        )
+
+        job_id = self._get_batch_id(games)
+
+        ret_file_archive = TransferableFile(
+            local_path=os.path.join(self.tmp_batches_dir, f"{job_id}.tar"),
+            remote_path=os.path.join(self.tmp_dir, "games.tar"),
+        )
+
+        return Job(
+            command=command,
+            required_files=[],
+            return_files=[ret_file_archive],
+            data=games,
+            id=job_id,
+        )
+
+    @staticmethod
+    def _get_batch_id(games):
+        (red_team_name, _), (blue_team_name, _), layout = games[0]
+        return "{}-vs-{}-in-{}-and-{}-more".format(red_team_name, blue_team_name, layout, len(games) - 1)
+
+    def _expand_batch_results(self, results):
+        """
+        Turns the result of each job that played several games into one result per game: the logs, replays, and
+        result (and resources) files of the games are extracted from the archive returned into their temp folders, as if each game had
+        been played in its own job. The time taken by the job is shared equally among its games.
+
+        :param results: list of (job.data, exit_code, result_out, result_err, job_secs_taken) from the cluster
+        :return: list of (game, exit_code, result_out, result_err, game_secs_taken), one per game
+        """
+        games_results = []
+        for result in results:
+            data, exit_code, result_out, result_err, secs_taken = result
+            if not isinstance(data, list):
+                games_results.append(result)
+                continue
+
+            archive = os.path.join(self.tmp_batches_dir, f"{self._get_batch_id(data)}.tar")
+            if os.path.exists(archive):
+                with tarfile.open(archive, "r") as tar:
+                    for member in tar.getmembers():
+                        file_name = os.path.basename(member.name)
+                        if not member.isfile():
+                            continue
+                        if file_name.endswith(".log"):
+                            folder = self.tmp_logs_dir
+                        elif file_name.endswith(".json"):
+                            folder = self.tmp_results_dir
+                        else:
+                            folder = self.tmp_replays_dir
+                        with tar.extractfile(member) as f_in, open(os.path.join(folder, file_name), "wb") as f_out:
+                            shutil.copyfileobj(f_in, f_out)
+                os.remove(archive)
+            else:
+                logging.error(f"Archive of games {archive} was not returned (exit code {exit_code})")
+
+            for game in data:
+                games_results.append((game, exit_code, result_out, result_err, secs_taken / len(data)))
+        return games_results
+
     # Generates a job to restore a game read_team vs blue_team in layout
     def _generate_empty_job(self, red_team, blue_team, layout):
         red_team_name, _ = red_team
         blue_team_name, _ = blue_team
+        self.restored_games.add(f"{red_team_name}_vs_{blue_team_name}_{layout}")
 
         command = ""
 
@@ -176,11 +389,65 @@ class ContestRunner:
             id="{}-vs-{}-in-{}".format(red_team_name, blue_team_name, layout),
         )
 
+    def _get_setup_command(self):
+        """Generate the shell command that sets up the contest folder (system + teams) in the game sandbox folder
+
+        The bundle is unzipped only once per worker host, into WORKER_CACHE_DIR/<bundle hash>, which is then made
+        read-only and shared by all the games (of all the split contests) run in that host. Each game just gets a
+        view of it in its sandbox folder: real directories populated with symlinks to the cached files. The
+        directories of the view are made writable, so agents can still create files in them, and the sandbox can be
+        removed after the game (the cached files themselves stay read-only).
+
+        Each game touches the cached bundle it uses, and only the WORKER_CACHE_KEEP most recently used bundles are
+        kept in each host: older ones are removed whenever a new one is unpacked.
+
+        The unzip is done into a private folder that is then renamed atomically, so concurrent games in the same host
+        never see a half-unpacked bundle (at worst, the first games unzip it in parallel and only one copy is kept).
+
+        With delta sync, the bundle is assembled instead from its pieces in the worker's store (see get_core_req_files).
+
+        Returns:
+            str: shell command to run in the sandbox folder before the game
+        """
+        zip_file = os.path.join("/tmp", CORE_CONTEST_TEAM_ZIP_FILE)
+
+        if self.bundle_hash is None:
+            return f"mkdir -p {self.tmp_dir} ; unzip -o {zip_file} -d {self.tmp_dir} ; chmod +x -R *"
+
+        cache_dir = os.path.join(WORKER_CACHE_DIR, self.bundle_hash)
+        unpack_dir = f"{cache_dir}.unpack.$$"
+        if self.bundle_pieces is not None:  # delta sync: assemble it from its pieces in the store
+            extract_command = f"sh {os.path.join(WORKER_STORE_DIR, self.bundle_hash)}.sh {unpack_dir}"
+        else:
+            extract_command = f"unzip -q -o {zip_file} -d {unpack_dir}"
+        unpack_command = (
+            f"mkdir -p {unpack_dir} && {extract_command} && chmod +x -R {unpack_dir} && "
+            f"{{ {PTYHON_WORKERS} -m compileall -q {unpack_dir} > /dev/null 2>&1 ; chmod -R a-w {unpack_dir} ; "
+            f"mv -T {unpack_dir} {cache_dir} 2> /dev/null || {{ chmod -R u+w {unpack_dir} ; rm -rf {unpack_dir} ; }} ; }}"
+        )
+        # bundles are the folders named by a hash (16 hex digits), not the store, sockets, or folders being unpacked
+        evict_command = (
+            f"ls -dt {WORKER_CACHE_DIR}/{'?' * 16} | tail -n +{WORKER_CACHE_KEEP + 1} | "
+            f"while read old_dir ; do chmod -R u+w $old_dir ; rm -rf $old_dir ; done"
+        )
+
+        return (
+            f"{{ [ -d {cache_dir} ] || {{ {unpack_command} ; {evict_command} ; }} ; }} ; touch -c {cache_dir} ; "
+            f"mkdir -p {self.tmp_dir} ; cp -rs {cache_dir}/. {self.tmp_dir}/ ; chmod -R u+w {self.tmp_dir}"
+        )
+
     def _get_game_command(self, red_team, blue_team, layout):
         """Generate the shell command to run one game between two teams in a layout
 
         The PYTHON_WORKERS points to the exact Python binary to use when running the game. All the environment of that Python must be properly setup
 
+        The game is wrapped to record the resources it uses (CPU time, peak memory, and signal that killed it, if any)
+        into resources-0.json; see worker/game_resources.py.
+
+        If the game server is enabled, the game is requested to the warm server of the worker host instead (started on
+        demand); the server forks a pre-loaded engine that runs the same capture.py command in the same folder, and
+        the request falls back to running capture.py directly if the server cannot be used.
+
         Args:
             red_team (tuple): red team name and path to file
             blue_team (tuple): blue team name and path to file
@@ -193,46 +460,90 @@ class ContestRunner:
         (red_team_name, red_team_path_file) = red_team
         (blue_team_name, blue_team_path_file) = blue_team
 
-        cmd = f"{PTYHON_WORKERS} capture.py -c -q --record --recordLog --delay 0.0 --fixRandomSeed"
-        cmd = cmd + " " + f'-r "{red_team_path_file}" -b "{blue_team_path_file}" -l {layout} -i {self.max_steps}'
+        options = "-c -q --record --recordLog --delay 0.0 --fixRandomSeed"
+        options = options + " " + f'-r "{red_team_path_file}" -b "{blue_team_path_file}" -l {layout} -i {self.max_steps}'
 
-        return cmd
+        if self.game_server:
+            socket_path = os.path.join(WORKER_CACHE_DIR, f"{self.bundle_hash}.sock")
+            return f"{PTYHON_WORKERS} {GAME_SERVER_SCRIPT} --socket {socket_path} --resources resources-0.json -- {options}"
+
+        return f"{PTYHON_WORKERS} {GAME_RESOURCES_SCRIPT} --output resources-0.json -- {PTYHON_WORKERS} capture.py {options}"
 
     def _analyse_all_outputs(self, games_results):
         logging.info(
             f"About to analyze game result outputs. Number of result output to analyze: {len(games_results)}")
-        for result in games_results:
+        # outcomes are read from the result files of the games; the logs of games with none are parsed all at once
+        # in a pool of processes, and then all are added to the ladder in order
+        with self.tracer.span("read_result_files") as span:
+            parsed_results = [
+                parse_game_result_file(
+                    os.path.join(self.tmp_results_dir, f"{red_team[0]}_vs_{blue_team[0]}_{layout}.json"),
+                    red_team[0],
+                    blue_team[0],
+                )
+                for (red_team, blue_team, layout), _, _, _, _ in games_results
+            ]
+            unparsed = [i for i, parsed_result in enumerate(parsed_results) if parsed_result is None]
+            span.count("games", len(games_results) - len(unparsed))
+        if unparsed:
+            logging.info(f"Parsing the logs of {len(unparsed)} games with no result file")
+        with self.tracer.span("parse_logs") as span:
+            logs_parsed_results = parse_game_logs(
+                [
+                    (
+                        os.path.join(self.tmp_logs_dir, f"{red_team[0]}_vs_{blue_team[0]}_{layout}.log"),
+                        red_team[0],
+                        blue_team[0],
+                        layout,
+                    )
+                    for (red_team, blue_team, layout), _, _, _, _ in [games_results[i] for i in unparsed]
+                ],
+                tail=self.log_parse_mode == "tail",
+            )
+            span.count("games", len(unparsed))
+        for i, parsed_result in zip(unparsed, logs_parsed_results):
+            parsed_results[i] = parsed_result
+        for result, parsed_result in zip(games_results, parsed_results):
             (red_team, blue_team, layout), exit_code, output, error, time_taken = result
             if exit_code != 0:
                 print(f"Game {red_team[0]} vs {blue_team[0]} in {layout} exited with error code {exit_code}")
             self._analyse_game_output(
-                red_team, blue_team, layout, exit_code, time_taken
+                red_team, blue_team, layout, exit_code, time_taken, parsed_result
             )
 
-    def _analyse_game_output(self, red_team, blue_team, layout, exit_code, total_secs_taken):
+    def _analyse_game_output(self, red_team, blue_team, layout, exit_code, total_secs_taken, parsed_result=None):
         """
-        Analyzes the output of a match from the log file and adds the following tuple to self.games:
+        Analyzes the output of a match from its result file (or log file, if none) and adds the following tuple to
+        self.games:
 
             (read_team, blue_team, layout, score, winner, time)
+
+        The resources used by the game, if recorded, are kept in self.game_resources.
+
+        If the outcome is known already (parsed_result, as returned by log_parser.parse_game_log()), it is not
+        read again.
         """
         red_team_name, _ = red_team
         blue_team_name, _ = blue_team
 
-        # dump the log of the game into file for the game: red vs blue in layout
-        log_file_name = f"{red_team_name}_vs_{blue_team_name}_{layout}.log"
-
-        # read log text from log file
-        with open(os.path.join(self.tmp_logs_dir, log_file_name), "r") as f:
-            try:
-                log_output = f.read()
-            except:
-                logging.error(f"Unable to read log file {log_file_name}")
-                log_output = ""
-
-        # now parse the output to get all the info: winner, etc
-        score, winner, loser, bug, total_time = self._parse_result(
-            log_output, red_team_name, blue_team_name, layout
-        )
+        if parsed_result is None:
+            parsed_result = parse_game_result_file(
+                os.path.join(self.tmp_results_dir, f"{red_team_name}_vs_{blue_team_name}_{layout}.json"),
+                red_team_name,
+                blue_team_name,
+            )
+        if parsed_result is None:
+            # dump the log of the game into file for the game: red vs blue in layout
+            log_file_name = f"{red_team_name}_vs_{blue_team_name}_{layout}.log"
+            parsed_result = parse_game_log_file(
+                os.path.join(self.tmp_logs_dir, log_file_name),
+                red_team_name,
+                blue_team_name,
+                layout,
+                tail=self.log_parse_mode == "tail",
+            )
+        self._count_errors(red_team_name, blue_team_name, parsed_result)
+        score, winner, loser, bug, total_time = parsed_result
 
         if winner is None:
             self.ladder[red_team_name].append(score)
@@ -247,115 +558,37 @@ class ContestRunner:
         # Append match game outcome to self.games
         self.games.append((red_team_name, blue_team_name, layout, score, winner, total_time))
 
+        game_file_name = f"{red_team_name}_vs_{blue_team_name}_{layout}"
+        try:
+            with open(os.path.join(self.tmp_results_dir, f"{game_file_name}.resources.json"), "r") as f:
+                self.game_resources[game_file_name] = json.load(f)
+        except (OSError, ValueError):  # e.g., not played (restored), or an empty file (not recorded)
+            pass
+
     def _parse_result(self, output, red_team_name, blue_team_name, layout):
         """
-        Parses the result log of a match to extract outcome.
+        Parses the result log of a match to extract outcome (see log_parser.parse_game_log()), and counts the errors
+        of the teams.
 
-        :param output: an iterator of the lines of the result log
+        :param output: the result log
         :param red_team_name: name of Red team
         :param blue_team_name: name of Blue team
-        :return: a tuple containing score, winner, loser and a flag signaling whether there was a bug
+        :return: a tuple containing score, winner, loser, a flag signaling whether there was a bug, and the total time
         """
-        score = 0
-        winner = None
-        loser = None
-        bug = False
-        tied = False
-        total_time = 0
-
-        try:
-            output = output.decode()  # convert byte into string
-        except:
-            pass  # it is already a string
-
-        if output.find("Traceback") != -1 or output.find("agent crashed") != -1:
-            bug = True
-            # if both teams fail to load, no one wins
-            if (
-                output.find("Red team failed to load!") != -1
-                and output.find("Blue team failed to load!") != -1
-            ):
-                self.errors[red_team_name] += 1
-                self.errors[blue_team_name] += 1
-                winner = None
-                loser = None
-                score = ERROR_SCORE
-            elif (
-                output.find("Red agent crashed") != -1
-                or output.find("redAgents = loadAgents") != -1
-                or output.find("Red team failed to load!") != -1
-            ):
-                self.errors[red_team_name] += 1
-                winner = blue_team_name
-                loser = red_team_name
-                score = 1
-            elif (
-                output.find("Blue agent crashed") != -1
-                or output.find("blueAgents = loadAgents") != -1
-                or output.find("Blue team failed to load!")
-            ):
-                self.errors[blue_team_name] += 1
-                winner = red_team_name
-                loser = blue_team_name
-                score = 1
-            else:
-                logging.error(
-                    "Note able to parse out for game {} vs {} in {} (traceback available, but couldn't get winner!)".format(
-                        red_team_name, blue_team_name, layout
-                    )
-                )
+        parsed_result = parse_game_log(output, red_team_name, blue_team_name, layout)
+        self._count_errors(red_team_name, blue_team_name, parsed_result)
+        return parsed_result
+
+    def _count_errors(self, red_team_name, blue_team_name, parsed_result):
+        """Counts the error of the team(s) that crashed in a game, given its parsed result"""
+        score, winner, loser, bug, _ = parsed_result
+        if not bug:
+            return
+        if winner is None:  # both teams failed
+            self.errors[red_team_name] += 1
+            self.errors[blue_team_name] += 1
         else:
-            for line in output.splitlines():
-                if line.find("wins by") != -1:
-                    score = abs(
-                        int(line.split("wins by")[1].split("points")[0]))
-                    if line.find("Red") != -1:
-                        winner = red_team_name
-                        loser = blue_team_name
-                    elif line.find("Blue") != -1:
-                        winner = blue_team_name
-                        loser = red_team_name
-                if line.find("The Blue team has returned at least ") != -1:
-                    score = abs(
-                        int(
-                            line.split("The Blue team has returned at least ")[1].split(
-                                " "
-                            )[0]
-                        )
-                    )
-                    winner = blue_team_name
-                    loser = red_team_name
-                elif line.find("The Red team has returned at least ") != -1:
-                    score = abs(
-                        int(
-                            line.split("The Red team has returned at least ")[1].split(
-                                " "
-                            )[0]
-                        )
-                    )
-                    winner = red_team_name
-                    loser = blue_team_name
-                elif line.find("Tie Game") != -1 or line.find("Tie game") != -1:
-                    winner = None
-                    loser = None
-                    tied = True
-
-                if line.find("Total Time Game: ") != -1:
-                    total_time = int(
-                        float(line.split("Total Time Game: ")[1].split(" ")[0])
-                    )
-
-            # signal strange case where script was unable to find outcome of game - should never happen!
-            if winner is None and loser is None and not tied:
-                logging.error(
-                    f"Note able to successfully parse output for game {red_team_name} vs {blue_team_name} in {layout}: \n {output} \n =====================================")
-                winner = None
-                loser = None
-                tied = True
-                score = -1
-                # sys.exit(1)
-
-        return score, winner, loser, bug, total_time
+            self.errors[loser] += 1
 
     def _calculate_team_stats(self):
         """
@@ -393,54 +626,88 @@ class ContestRunner:
                 sum_score,
             ]
 
+    def _calculate_team_resources(self):
+        """
+        From the resources used by each game played, compute the resources used by the games of each team and store
+        them in self.team_resources:
+
+            team -> [no. of games, avg. CPU secs, max. CPU secs, avg. peak RSS MB, max. peak RSS MB, no. killed]
+
+        CPU secs are user + sys of the whole game (both teams), and no. killed are the games killed by a signal.
+        """
+        team_games = {}
+        for red_team_name, blue_team_name, layout, _, _, _ in self.games:
+            usage = self.game_resources.get(f"{red_team_name}_vs_{blue_team_name}_{layout}")
+            if usage is None:
+                continue
+            for team in (red_team_name, blue_team_name):
+                team_games.setdefault(team, []).append(usage)
+
+        for team, usages in team_games.items():
+            if team not in self.team_stats:  # e.g., a hidden staff team
+                continue
+            cpu_secs = [usage["cpu_user"] + usage["cpu_sys"] for usage in usages]
+            rss_mb = [usage["max_rss_mb"] for usage in usages]
+            self.team_resources[team] = [
+                len(usages),
+                round(sum(cpu_secs) / len(usages), 2),
+                round(max(cpu_secs), 2),
+                round(sum(rss_mb) / len(usages), 1),
+                max(rss_mb),
+                len([usage for usage in usages if usage["signal"] is not None]),
+            ]
+
     ########################################################################
     # NOW THE API FOR THE CLASS
     ########################################################################
 
-    @staticmethod
-    def upload_file(file_full_path, remote_name=None, remove_local=False):
-        """Transfers a file to service transfer.sh
+    def _build_www_archives(self, folder, archive, kind, ext, span, on_archive=None):
+        """Builds the archive of all the files (replays or logs) of the contest, its index, and the archive of each team
 
-        Args:
-            file_full_path (str): file to be transferred
-            remote_name (str, optional): file name at remote (if different). Defaults to None.
-            remove_local (bool, optional): local has to be deleted. Defaults to False.
+        The files of each team are those of its games (as named in the contest), so a team whose name is in the name
+        of another team does not get its files; each file is compressed only once (see archive_builder.py).
 
-        Raises:
-            ValueError: error when transferring the file to remote service
+        With indexed WWW archives, the per-team archives are not built and the plain files are removed once archived:
+        single games and the files of each team are then read from the archive through its index (see
+        archive_index.py), so each file is stored only once.
 
-        Returns:
-            [str]: URL link to remote for the file
+        :param folder: the WWW folder of the contest with the files (the per-team archives are also put there)
+        :param archive: the archive of all the files
+        :param kind: "replays" or "logs", to name the per-team archives (e.g., replays_<team>.tar.gz, as per the codec)
+        :param ext: extension of the files of each game ("replay" or "log")
+        :param span: the tracer span to count the files and bytes archived
+        :param on_archive: called with the archive of all the files as soon as it is built (e.g., to upload it)
         """
-        file_name = os.path.basename(file_full_path)
-        remote_name = remote_name or file_name
-
-        logging.info(f"Transferring {file_name} to transfer.sh service...")
-
-        transfer_cmd = f"curl --upload-file {file_full_path} https://transfer.sh/{remote_name}"
-        try:
-            # This will yield a byte, not a str (at least in Python 3)
-            transfer_url = subprocess.check_output(transfer_cmd, shell=True)
-            if "Could not save metadata" in transfer_url:
-                raise ValueError(
-                    f"Transfer.sh returns incorrect url: {transfer_url}")
-            if remove_local:
-                print("rm %s" % file_full_path)
-                os.system("rm %s" % file_full_path)
-                transfer_url = transfer_url.decode()  # convert to string
-            logging.info(
-                f"File {file_name} transferred successfully to transfer.sh service; URL: {transfer_url}"
-            )
-        except Exception as e:
-            # If transfer failed, use the standard server
-            logging.error(
-                f"Transfer-url failed, using local copy to store games. Exception: {e}"
-            )
-            raise
-            # transfer_url = file_name
+        team_files = {team_name: [] for team_name in self.team_stats.keys()}
+        for red_team_name, blue_team_name, layout, *_ in self.games:
+            game_file = f"{red_team_name}_vs_{blue_team_name}_{layout}.{ext}"
+            for team_name in {red_team_name, blue_team_name}:
+                if team_name in team_files:
+                    team_files[team_name].append(game_file)
+        if self.www_archives == "indexed":
+            team_archives = {}
+        else:
+            team_archives = {
+                os.path.join(folder, f"{kind}_{team_name}{self.archive_codec.extension}"): files
+                for team_name, files in team_files.items()
+            }
+
+        index = build_archives(
+            folder,
+            archive,
+            team_archives,
+            teams=team_files,
+            no_workers=self.archive_workers,
+            codec=self.archive_codec,
+            on_archive=on_archive,
+        )
+        span.count("files", len(index))
+        span.count("bytes", os.path.getsize(archive))
 
-        return transfer_url
+        if self.www_archives == "indexed":
+            shutil.rmtree(folder)
 
+    @traced("generate_www")
     def generate_www(self):
         """Generates all the resulting files of the contest into the WWW folder
 
@@ -449,9 +716,14 @@ class ContestRunner:
             3. stats will be dumped into self.stats_www_dir (as a JSON file)
 
         Full compressed logs and replays are used by the main classical leaderboard web page.
-        Logs/replays may optionally be uploaded to transfer.sh service and linked (save space).
+        Logs/replays may optionally be uploaded to transfer.sh service (or another upload URL) and linked (save space).
+        Uploads run in the background as soon as each full archive is built, while the per-team archives are built
+        (and the other logs/replays staged and archived); stats and HTML are generated once they finish, with their
+        URLs. The local copy of an archive uploaded is then removed (with its index), unless WWW archives are indexed,
+        as then it is the only copy of the logs/replays kept (e.g., for the dashboard).
 
         Plain logs and replays, and per team compressed versions are used by the dashboard.
+        With indexed WWW archives (--www-archives indexed), only the full compressed files (and their indexes) are kept.
 
         Returns:
             [tuple]: the URL/path to the stats, replays, and logs
@@ -466,142 +738,189 @@ class ContestRunner:
             "max_steps": self.max_steps,
             "organizer": self.organizer,
             "timestamp_id": self.contest_timestamp_id,
+            "team_hashes": {team: self.team_hashes[team] for team, _ in self.all_teams},
+            "engine_hash": self.engine_hash,
+            "game_resources": self.game_resources,
+            "team_resources": self.team_resources,
         }
 
+        # full archives are uploaded in the background (see uploader), while the rest is generated
+        uploader = None
+        uploads = {}  # key of the URL in the stats -> Future of the upload
+        if self.upload_replays or self.upload_logs:
+            uploader = Uploader(self.upload_url, chunk_bytes=self.upload_chunk_bytes, tracer=self.tracer)
+
         ################################
         # 1. PROCESS REPLAYS
         ################################
 
         # The specific folder in the WWW structure for this particular contest
         # single replays and compressed per teams will go there
-        replays_folder = os.path.join(self.replays_www_dir, f'replays_{self.contest_timestamp_id}')
+        replays_folder = self.replays_www_contest_dir
 
-        # First, copy ALL the single replays from contest tmp folder to WWW replay location
-        shutil.copytree(self.tmp_replays_dir, replays_folder)
+        # First, stage ALL the single replays from contest tmp folder to WWW replay location (if not streamed already)
+        with self.tracer.span("copy_replays") as span:
+            if not self.stream_analysis:
+                for how, n in stage_tree(self.tmp_replays_dir, replays_folder, self.www_staging).items():
+                    span.count(how, n)
 
-        # Second, make a tar.gz file with all replays (optionally upload it to transfer.sh)
-        replays_archive = os.path.join(self.replays_www_dir, f"replays_{self.contest_timestamp_id}.tar.gz")
-        with tarfile.open(replays_archive, "w:gz") as tar:
-            tar.add(replays_folder, arcname="/")
+        # Second, make an archive (e.g., tar.gz) with all replays and one per team, compressing each replay once
+        replays_archive = os.path.join(
+            self.replays_www_dir, f"replays_{self.contest_timestamp_id}{self.archive_codec.extension}"
+        )
+        with self.tracer.span("replays_archives") as span:
+            on_archive = None
+            if self.upload_replays:  # upload to transfer.sh (in the background)
+                on_archive = lambda archive: uploads.update(url_replays=uploader.submit(archive))
+            self._build_www_archives(replays_folder, replays_archive, "replays", "replay", span, on_archive)
 
         # rel path to WWW dir of compressed replay file to use for linking it in WWW
         replays_file_link = os.path.relpath(replays_archive, self.www_dir)
 
-        if self.upload_replays:
-            try:
-                transfer_url = self.upload_file(
-                    replays_archive, remove_local=False
-                )
-                contest_stats["url_replays"] = transfer_url.decode()
-                replays_file_link = transfer_url
-                # TODO: I guess we must now delete replays_archive, otherwie what is the point?
-            except Exception as e:
-                logging.error(f"Exception when uploading replay file {os.path.split(replays_archive)[-1]}: {e}")
-
-        # Third, create replay compress archives for each team
-        for team_name in self.team_stats.keys():
-            replays_team_archive = os.path.join(self.replays_www_dir, f'replays_{self.contest_timestamp_id}', f'replays_{team_name}.tar.gz')
-            replay_files_to_pack = glob.glob(os.path.join(replays_folder, f"*{team_name}*"))
-            with tarfile.open(replays_team_archive, "w:gz") as tar:
-                for replay_file in replay_files_to_pack:
-                    tar.add(replay_file, arcname="/")
-
-            # do it via shell; much faster?
-            # replay_files_to_pack = ' '.join([os.path.basename(f) for f in glob.glob(os.path.join(replays_folder, f"*{team_name}*"))])
-            # os.system(
-            #     f'tar zcf {replays_team_archive} -C {replays_folder_full_path} {replay_files_to_pack}')
-
         ################################
         # 2. PROCESS LOGS
         ################################
 
         # The specific folder in the WWW structure for this particular contest
         # single logs and compressed per teams will go there
-        logs_folder = os.path.join(self.logs_www_dir, f'logs_{self.contest_timestamp_id}')
-
-        # First, copy all the logs from contest temporary folder to WWW location
-        shutil.copytree(self.tmp_logs_dir, logs_folder)
-
-        # Second, build a full compressed file with all logs that have been copied across (may be very large!)
-        logs_archive = os.path.join(self.logs_www_dir, f"logs_{self.contest_timestamp_id}.tar.gz")
-        with tarfile.open(logs_archive, "w:gz") as tar:
-            tar.add(logs_folder, arcname="/")
+        logs_folder = self.logs_www_contest_dir
+
+        # First, stage all the logs from contest temporary folder to WWW location (if not streamed already)
+        with self.tracer.span("copy_logs") as span:
+            if not self.stream_analysis:
+                for how, n in stage_tree(self.tmp_logs_dir, logs_folder, self.www_staging).items():
+                    span.count(how, n)
+
+        # Second, build a full compressed file with all logs (may be very large!) and one per team
+        logs_archive = os.path.join(self.logs_www_dir, f"logs_{self.contest_timestamp_id}{self.archive_codec.extension}")
+        with self.tracer.span("logs_archives") as span:
+            on_archive = None
+            if self.upload_logs:  # upload to transfer.sh (in the background)
+                on_archive = lambda archive: uploads.update(url_logs=uploader.submit(archive))
+            self._build_www_archives(logs_folder, logs_archive, "logs", "log", span, on_archive)
 
         # rel path to WWW dir of compressed replay file to use for linking it in WWW
         logs_file_link = os.path.relpath(logs_archive, self.www_dir)
 
-        if self.upload_logs: # Upload log to to transfer.sh
-            try:
-                transfer_url = self.upload_file(
-                    logs_archive, remove_local=False
-                )
-                contest_stats["url_logs"] = transfer_url.decode()
-                logs_file_link = transfer_url
-                # TODO: I guess we must now delete replays_archive, otherwise what is the point?
-            except Exception as e:
-                logging.error(f"Exception when uploading log file {os.path.split(logs_archive)[-1]}: {e}")
-
-        # Third, create tar.gz log archives for each team
-        # store the files without the folders
-        for team_name in self.team_stats.keys():
-            logs_team_archive = os.path.join(self.logs_www_dir, f'logs_{self.contest_timestamp_id}', f'logs_{team_name}.tar.gz')
-            logs_files_to_pack = glob.glob(os.path.join(logs_folder, f"*{team_name}*"))
-            with tarfile.open(logs_team_archive, "w:gz") as tar:
-                for log_file in logs_files_to_pack:
-                    tar.add(log_file, arcname="/")
-
-            # do it via shell; much faster?
-            # logs_files_to_pack = ' '.join([os.path.basename(f) for f in glob.glob(os.path.join(logs_folder, f"*{team_name}*"))])
-            # os.system(
-            #     f'tar zcf {logs_team_archive} -C {logs_folder_full_path} {logs_files_to_pack}')
+        ################################
+        # 3. LINK UPLOADED ARCHIVES
+        ################################
+        if uploader is not None:
+            with self.tracer.span("wait_uploads"):
+                uploader.shutdown()
+            for key, archive in [("url_replays", replays_archive), ("url_logs", logs_archive)]:
+                if key not in uploads:
+                    continue
+                try:
+                    contest_stats[key] = uploads[key].result()
+                except Exception as e:
+                    logging.error(f"Exception when uploading {key[len('url_'):]} file {os.path.basename(archive)}: {e}")
+                    continue
+                if self.www_archives != "indexed":  # uploaded, so no need to keep it (nor its index) here
+                    os.remove(archive)
+                    if os.path.exists(index_file_of(archive)):
+                        os.remove(index_file_of(archive))
+            replays_file_link = contest_stats.get("url_replays", replays_file_link)
+            logs_file_link = contest_stats.get("url_logs", logs_file_link)
 
         ################################
-        # 3. STORE STATS and CONFIG
+        # 4. STORE STATS and CONFIG
         ################################
-        stats_file_full_path = os.path.join(self.stats_www_dir, f"stats_{self.contest_timestamp_id}.json")
-        with open(stats_file_full_path, "w") as f:
-            json.dump(contest_stats, f)
-        # rel link to use in WWW
-        stats_file_link = os.path.relpath(stats_file_full_path, self.www_dir)
-
-        config_file_full_path = os.path.join(self.config_www_dir, f"config_{self.contest_timestamp_id}.json")
-        with open(config_file_full_path, "w") as f:
-            json.dump(self.config, f, sort_keys=True, indent=4, separators=(",", ": "))
-        # rel link to use in WWW
-        config_file_link = os.path.relpath(config_file_full_path, self.www_dir)
+        with self.tracer.span("stats_and_config"):
+            stats_file_full_path = os.path.join(self.stats_www_dir, f"stats_{self.contest_timestamp_id}.json")
+            with open(stats_file_full_path, "w") as f:
+                json.dump(contest_stats, f)
+            # rel link to use in WWW
+            stats_file_link = os.path.relpath(stats_file_full_path, self.www_dir)
+
+            config_file_full_path = os.path.join(self.config_www_dir, f"config_{self.contest_timestamp_id}.json")
+            with open(config_file_full_path, "w") as f:
+                json.dump(self.config, f, sort_keys=True, indent=4, separators=(",", ": "))
+            # rel link to use in WWW
+            config_file_link = os.path.relpath(config_file_full_path, self.www_dir)
 
         ################################
-        # 4. GENERATE WWW
+        # 5. GENERATE WWW
         ################################
         from pacman_html_generator import HtmlGenerator
 
-        html_generator = HtmlGenerator(self.www_dir, self.organizer, self.score_thresholds)
+        html_generator = HtmlGenerator(self.www_dir, self.organizer, self.score_thresholds, tracer=self.tracer)
         html_generator.add_run(self.contest_timestamp_id, stats_file_link, replays_file_link, logs_file_link)
 
         return config_file_link, stats_file_link, replays_file_link, logs_file_link
 
-    def run_contest_remotely(self, hosts, resume_folder=None, transfer_core=True):
-        """This is the MAIN API function to actually run a single contest in a cluster.
+    def save_timing(self):
+        """Saves the time taken by each phase of the contest (and of the setup of the multi-contest, if known) into
+        timing_<contest id>.json, next to the stats file of the contest (see timing.py)
 
-        Notice that a Multi-contest is a set of contests.
+        Returns:
+            str: the path to the timing file, relative to the WWW folder
+        """
+        timing_file = os.path.join(self.stats_www_dir, f"timing_{self.contest_timestamp_id}.json")
+        reports = {"timestamp_id": self.contest_timestamp_id}
+        if self.setup_tracer is not None:
+            reports["setup"] = self.setup_tracer.report()
+        reports["contest"] = self.tracer.report()
+        save_timing(timing_file, **reports)
+        return os.path.relpath(timing_file, self.www_dir)
+
+    def get_core_req_files(self):
+        """Returns the core files that every job needs in the worker hosts (the contest bundle)
+
+        With delta sync, these are the pieces of the bundle and its assembly script, all named by their hash in the
+        workers' store, so the executors skip those a worker already has.
+        """
+        if self.bundle_pieces is not None:
+            pieces_dir = os.path.join(TMP_DIR, TMP_PIECES_DIR)
+            # (teams with the same content share their piece)
+            piece_hashes = sorted(set(piece_hash for piece_hash, _ in self.bundle_pieces))
+            file_names = [f"{piece_hash}.zip" for piece_hash in piece_hashes] + [f"{self.bundle_hash}.sh"]
+            return [
+                TransferableFile(
+                    local_path=os.path.join(pieces_dir, file_name),
+                    remote_path=os.path.join(WORKER_STORE_DIR, file_name),
+                )
+                for file_name in file_names
+            ]
+        return [TransferableFile(
+            local_path=os.path.join(TMP_DIR, CORE_CONTEST_TEAM_ZIP_FILE),
+            remote_path=os.path.join("/tmp", CORE_CONTEST_TEAM_ZIP_FILE),
+        )]
 
-        1. First, build a (huge) list of Jobs that must be run, one per game.
-        2. Creates and runs a ClusterManager with that jobs
-        3. Process outputs and build stats
+    def get_calibration_job(self):
+        """Returns the job that calibrates a host: always the same short game between two baseline teams
 
-        Can either start a contest from scratch or resume a previous one from a folder.
+        The game is timed in the host, after setting up the contest folder, and the ms taken are printed after
+        CALIBRATION_MARK (see JobScheduler).
+
+        Returns:
+            Job: the calibration job
+        """
+        game_command = (
+            f"{PTYHON_WORKERS} capture.py -c -q --delay 0.0 --fixRandomSeed -r {BASELINE_TEAM_FILE} "
+            f"-b {BASELINE_TEAM_FILE} -l {CALIBRATION_LAYOUT} -i {CALIBRATION_STEPS} > /dev/null"
+        )
+        command = (
+            f"{self._get_setup_command()} ; cd {self.tmp_dir} ; start_ns=$(date +%s%N) ; {game_command} && "
+            f'echo "{CALIBRATION_MARK} $(( ($(date +%s%N) - start_ns) / 1000000 ))"'
+        )
+        return Job(command=command, required_files=[], return_files=[], data=None, id="calibration")
+
+    @traced("prepare_jobs")
+    def prepare_jobs(self, resume_folder=None):
+        """Prepares the local folders of the contest and builds the list of jobs to run it
 
         Args:
-            hosts (list(Host)): list of namedtuple Host to run the contest
             resume_folder (str, optional): folder with temp data of previous contest to resume. Defaults to None.
-            transfer_core (bool, optional): True to transfer core files. Defaults to True.
 
         Returns:
-            result (list(job.data, exit_code, result_out, result_err, job_secs_taken)): the results from ClusterManager
+            list(Job): the jobs to run
         """
-
         # prepare local folders to store configs, replays, logs, stats, etc. as per --www-dir
-        for d in [self.config_www_dir, self.stats_www_dir, self.replays_www_dir, self.logs_www_dir]:
+        www_dirs = [self.config_www_dir, self.stats_www_dir, self.replays_www_dir, self.logs_www_dir]
+        if self.stream_analysis:  # logs and replays are staged into WWW as games finish
+            www_dirs += [self.logs_www_contest_dir, self.replays_www_contest_dir]
+        for d in www_dirs:
             if not os.path.exists(d):
                 os.makedirs(d)
 
@@ -610,54 +929,597 @@ class ContestRunner:
             # if we are resuming, copy all logs and replays and then resume
             contest_folder = os.path.split(self.tmp_dir)[1]
             resume_folder = os.path.join(resume_folder, contest_folder)
-            shutil.rmtree(self.tmp_logs_dir)
-            shutil.copytree(os.path.join(
-                resume_folder, "logs-run"), self.tmp_logs_dir)
-            shutil.rmtree(self.tmp_replays_dir)
-            shutil.copytree(
-                os.path.join(
-                    resume_folder, "replays-run"), self.tmp_replays_dir
-            )
-            jobs = self._generate_contest_jobs(resume=True)
-
-            # when we resume we ask for confirmation before starting...
-            if input("Enter 'Yes' to continue; anything else to abort: ") != "Yes":
-                logging.error("Aborting contest...")
-                exit(1)
+            if os.path.exists(os.path.join(resume_folder, JOURNAL_FILE)):
+                # the journal says which games were done: link just their files, and no need to confirm
+                self._restore_from_journal(resume_folder)
+                jobs = self._generate_contest_jobs(resume=True)
+            else:
+                shutil.rmtree(self.tmp_logs_dir)
+                shutil.copytree(os.path.join(
+                    resume_folder, "logs-run"), self.tmp_logs_dir)
+                shutil.rmtree(self.tmp_replays_dir)
+                shutil.copytree(
+                    os.path.join(
+                        resume_folder, "replays-run"), self.tmp_replays_dir
+                )
+                if os.path.exists(os.path.join(resume_folder, TMP_RESULTS_DIR)):
+                    shutil.rmtree(self.tmp_results_dir)
+                    shutil.copytree(os.path.join(resume_folder, TMP_RESULTS_DIR), self.tmp_results_dir)
+                jobs = self._generate_contest_jobs(resume=True)
+
+                # when we resume we ask for confirmation before starting...
+                if input("Enter 'Yes' to continue; anything else to abort: ") != "Yes":
+                    logging.error("Aborting contest...")
+                    exit(1)
         else:
             jobs = self._generate_contest_jobs(resume=False)
 
+        self.tracer.count("jobs", len(jobs))
+        return jobs
+
+    def _restore_from_journal(self, resume_folder):
+        """Restores the games recorded in the journal of a previous run of the contest
+
+        The log, replay, and result file of each game in the journal are hard-linked (copied only if linking is not possible) into
+        the temp folders, and the game is recorded in the journal of this run, so it can be resumed again.
+        Games whose log is no longer in the previous run folder (e.g., deleted to re-run them) are not restored.
+
+        Args:
+            resume_folder (str): the temp folder of the contest in the previous run
+        """
+        self.journaled_games = set()
+        for game, entry in JobJournal.load(os.path.join(resume_folder, JOURNAL_FILE)).items():
+            try:
+                self._link_or_copy(
+                    os.path.join(resume_folder, TMP_LOGS_DIR, f"{game}.log"),
+                    os.path.join(self.tmp_logs_dir, f"{game}.log"),
+                )
+            except FileNotFoundError:
+                continue
+            for folder, tmp_folder, ext in [
+                (TMP_REPLAYS_DIR, self.tmp_replays_dir, "replay"),
+                (TMP_RESULTS_DIR, self.tmp_results_dir, "json"),
+                (TMP_RESULTS_DIR, self.tmp_results_dir, "resources.json"),
+            ]:
+                try:
+                    self._link_or_copy(
+                        os.path.join(resume_folder, folder, f"{game}.{ext}"),
+                        os.path.join(tmp_folder, f"{game}.{ext}"),
+                    )
+                except FileNotFoundError:
+                    pass
+            self.journal.record(game, entry["exit_code"], entry["secs"], entry["time"])
+            self.journaled_games.add(game)
+        logging.info(f"{len(self.journaled_games)} games restored from the journal in {resume_folder}")
+
+    @staticmethod
+    def _link_or_copy(src, dst):
+        stage_file(src, dst, "link")  # a reflink or a copy if a hard link is not possible (e.g., another file system)
+
+    @staticmethod
+    def _extract_from_www_archive(archive, name, dst):
+        """Writes a file of an indexed WWW archive (e.g., of a previous contest with indexed archives) into dst
+
+        Returns:
+            bool: True if the file was in the archive (and it has an index; see archive_index)
+        """
+        try:
+            data = read_file(archive, name)
+        except (OSError, KeyError, ValueError):
+            return False
+        with open(dst, "wb") as f:
+            f.write(data)
+        return True
+
+    def _is_game_restored(self, log_file, non_empty=False):
+        """Returns True if the game with log_file (in the temp logs folder) was restored from a previous run
+
+        Args:
+            log_file (str): path of the log of the game in the temp logs folder
+            non_empty (bool, optional): True if an empty log file does not count. Defaults to False.
+        """
+        if self.journaled_games is not None:
+            return os.path.basename(log_file)[:-len(".log")] in self.journaled_games
+        return os.path.isfile(log_file) and (not non_empty or os.stat(log_file).st_size != 0)
+
+    def run_contest_remotely(self, hosts, resume_folder=None, transfer_core=True, slot_limits=None):
+        """This is the MAIN API function to actually run a single contest in a cluster.
+
+        Notice that a Multi-contest is a set of contests.
+
+        1. First, build a (huge) list of Jobs that must be run, one per game.
+        2. Creates and runs a ClusterManager with that jobs
+        3. Process outputs and build stats
+
+        Can either start a contest from scratch or resume a previous one from a folder.
+
+        Jobs are run in the hosts via ClusterManager, or in this machine via LocalManager if local workers were asked.
+        With speculative execution, streaming analysis, delta sync, adaptive slots, or calibration of the hosts, they
+        are run by a JobScheduler instead (in the hosts or locally); when streaming, each job is analyzed as soon as it
+        finishes and the results have no outputs.
+
+        Each job is processed by collect_job_result() as soon as it finishes (or at the end, with ClusterManager).
+
+        Args:
+            hosts (list(Host)): list of namedtuple Host to run the contest (not used if running locally)
+            resume_folder (str, optional): folder with temp data of previous contest to resume. Defaults to None.
+            transfer_core (bool, optional): True to transfer core files. Defaults to True.
+            slot_limits (dict, optional): host name -> (min, max) no. of slots, to adapt the slots used in each host
+                to its load (see JobScheduler). Defaults to None (all slots of each host always used).
+
+        Returns:
+            result (list(job.data, exit_code, result_out, result_err, job_secs_taken)): the results from ClusterManager
+        """
+
+        jobs = self.prepare_jobs(resume_folder)
+
         # Create ClusterManager to run jobs in hosts and start it to run all jobs
         # Variable results will contain ALL outputs from every game played, to be analyzed then
-        core_req_files = None
-        if transfer_core:
-            #  This is the core package to be transferable to each host
-            core_req_files = [TransferableFile(
-                local_path=os.path.join(TMP_DIR, CORE_CONTEST_TEAM_ZIP_FILE),
-                remote_path=os.path.join("/tmp", CORE_CONTEST_TEAM_ZIP_FILE),
-            )]
-        cm = ClusterManager(hosts, jobs, core_req_files)
-        results, no_successful_job, avg_time, max_time = cm.start()
+        core_req_files = self.get_core_req_files() if transfer_core else None
+        games_results = []
+
+        def on_result(result):
+            games_results.extend(self.collect_job_result(result))
+
+        cm, results_at_end = self._build_job_manager(
+            hosts,
+            jobs,
+            core_req_files,
+            on_result,
+            use_scheduler=self.speculative or self.stream_analysis or self.calibrate_hosts,
+            speculative=self.speculative,
+            keep_outputs=not self.stream_analysis,
+            slot_limits=slot_limits,
+            calibration_job=self.get_calibration_job() if self.calibrate_hosts else None,
+            min_speed=self.min_host_speed,
+            tracer=self.tracer,
+        )
+        with self.tracer.span("run_games") as span:
+            results, no_successful_job, avg_time, max_time = cm.start()
+            span.count("jobs", len(jobs))
+        if self.calibrate_hosts:  # kept in the config of the contest, to compare hosts across contests
+            self.config["calibration"] = cm.calibration
+        if results_at_end:
+            for result in results:
+                on_result(result)
+        results = games_results
 
         # results is list of (job.data, exit_code, result_out, result_err, job_secs_taken)
         return results, no_successful_job, avg_time, max_time
 
+    def _build_job_manager(self, hosts, jobs, core_req_files, on_result, use_scheduler=False, **scheduler_options):
+        """Builds the manager that runs jobs in the hosts, or in this machine (see run_contest_remotely())
+
+        A JobScheduler is used if asked, or if delta sync or adaptive slots need it; otherwise, a LocalManager if
+        local workers were asked, or a ClusterManager.
+
+        :param hosts: list of namedtuple Host to run the jobs (not used if running locally)
+        :param jobs: the jobs to run
+        :param core_req_files: files needed by all jobs, transferred first to each host (None: already there)
+        :param on_result: function called with the result of each job as soon as it finishes
+        :param use_scheduler: run the jobs with a JobScheduler, even if not needed otherwise
+        :param scheduler_options: other options of the JobScheduler (e.g., speculative, slot_limits), if used
+        :return: the manager, and whether it only gives the results when all jobs are done (and thus on_result has to
+            be called for each of them then)
+        """
+        if use_scheduler or self.bundle_pieces is not None or scheduler_options.get("slot_limits"):
+            from job_scheduler import JobScheduler, build_executors
+
+            cm = JobScheduler(
+                build_executors(hosts, self.local_workers), jobs, core_req_files, on_result=on_result, **scheduler_options
+            )
+            return cm, False
+        if self.local_workers:
+            from local_manager import LocalManager
+
+            return LocalManager(self.local_workers, jobs, core_req_files, on_result=on_result), False
+
+        from cluster_manager.elements import ClusterManager
+
+        return ClusterManager(hosts, jobs, core_req_files), True  # only gives the results when all jobs are done
+
+    def smoke_test_teams(self, hosts, teams, transfer_core=True, slot_limits=None):
+        """Plays one short game of each team vs the baseline team, to find the teams that fail to load (e.g., their
+        myTeam.py does not import) before any game of the contest is played
+
+        The games are run as jobs in the hosts (or by the local workers), just as the games of the contest, so the
+        code of the teams is never run in this machine unless asked. Teams can be of any split contest, as all share
+        the same bundle; see set_failed_teams().
+
+        Args:
+            hosts (list(Host)): list of namedtuple Host to run the games (not used if running locally)
+            teams (list(tuple)): name and agent file of each team to test
+            transfer_core (bool, optional): True to transfer core files. Defaults to True.
+            slot_limits (dict, optional): host name -> (min, max) no. of slots (see run_contest_remotely()). Defaults
+                to None.
+
+        Returns:
+            list(str): the names of the teams that failed to load
+        """
+        layout = sorted(self.layouts)[0]
+        jobs = [self._get_smoke_test_job(team, layout) for team in teams]
+        logging.info(f"Smoke testing {len(teams)} teams vs {BASELINE_TEAM_FILE} in layout {layout}")
+
+        tracer = self.setup_tracer or self.tracer  # timed as part of the setup of the multi-contest
+        cm, _ = self._build_job_manager(
+            hosts,
+            jobs,
+            self.get_core_req_files() if transfer_core else None,
+            None,
+            slot_limits=slot_limits,
+            tracer=tracer,
+        )
+        with tracer.span("smoke_test") as span:
+            results, *_ = cm.start()
+            span.count("teams", len(teams))
+
+        failed_teams = []
+        for team_name, exit_code, result_out, result_err, _ in results:
+            if exit_code == 124:  # killed by timeout
+                logging.warning(
+                    f"Smoke test of team {team_name} timed out after {SMOKE_TEST_TIMEOUT} secs; not taken as failed"
+                )
+                continue
+            output = result_out.decode(errors="replace") + result_err.decode(errors="replace")
+            # same signs of a red team that did not load as when parsing the result of a game
+            if output.find("Red team failed to load!") != -1 or output.find("redAgents = loadAgents") != -1:
+                failed_teams.append(team_name)
+
+        if failed_teams:
+            logging.warning(f"Teams that failed to load (all their games are forfeited): {', '.join(failed_teams)}")
+        else:
+            logging.info("All teams loaded fine in the smoke test")
+        return failed_teams
+
+    def _get_smoke_test_job(self, team, layout):
+        """Returns the job of the smoke test of a team: a short game vs the baseline team, with its output returned
+
+        :param team: name and agent file of the team (e.g., ("targethdplus", "teams/targethdplus/myTeam.py"))
+        :param layout: the layout of the game
+        """
+        team_name, team_path_file = team
+        game_command = (
+            f"timeout {SMOKE_TEST_TIMEOUT} {PTYHON_WORKERS} capture.py -c -q --delay 0.0 --fixRandomSeed "
+            f'-r "{team_path_file}" -b {BASELINE_TEAM_FILE} -l {layout} -i {SMOKE_TEST_STEPS} 2>&1'
+        )
+        command = f"{self._get_setup_command()} ; cd {self.tmp_dir} ; {game_command}"
+        return Job(command=command, required_files=[], return_files=[], data=team_name, id=f"smoke-test-{team_name}")
+
+    def set_failed_teams(self, failed_teams):
+        """Sets the teams that failed to load in the smoke test, whose games are then forfeited (not played)"""
+        self.failed_teams = set(failed_teams)
+        self.config["failed_teams"] = list(failed_teams)
+
+    @traced("analyze_results")
     def analyze_results(self, results):
-        # Time to analyze all the outputs
-        self._analyse_all_outputs(results)
+        # Time to analyze all the outputs (when streaming, games have been analyzed already as they finished)
+        if not self.stream_analysis:
+            self._analyse_all_outputs(results)
+        self._merge_unplayed_games(self.reused_games + self.forfeited_games)
         self._calculate_team_stats()
+        self._calculate_team_resources()
+
+    @traced("collect_job_result")
+    def collect_job_result(self, result):
+        """Processes the result of a job as soon as it finishes
+
+        The logs and replays of its games are placed in the temp folders (see _expand_batch_results()), each game
+        with a log is recorded in the journal of the contest, and those played cleanly (see _played_cleanly()) are
+        stored in the result cache. When streaming the analysis, each game is also parsed
+        and added to the ladder, and its log and replay are staged into the WWW folders of the contest, so only the
+        final stats and archives are left to do when the last job lands; the outputs of the games are then dropped.
+
+        Args:
+            result (tuple): (job.data, exit_code, result_out, result_err, job_secs_taken) of the finished job
+
+        Returns:
+            list: (game, exit_code, result_out, result_err, game_secs_taken) results, one per game of the job
+        """
+        games_results = self._expand_batch_results([result])
+        for (red_team, blue_team, layout), exit_code, _, _, time_taken in games_results:
+            game_file_name = f"{red_team[0]}_vs_{blue_team[0]}_{layout}"
+            log_file = os.path.join(self.tmp_logs_dir, f"{game_file_name}.log")
+            journaled = self.journaled_games is not None and game_file_name in self.journaled_games
+            if not journaled and os.path.exists(log_file):
+                self.journal.record(game_file_name, exit_code, time_taken)
+
+            # games played fine are kept in the result cache for next contests
+            if (
+                self.result_cache is not None
+                and exit_code == 0
+                and game_file_name not in self.restored_games
+                and os.path.exists(log_file)
+                and self._played_cleanly(red_team[0], blue_team[0], layout)
+            ):
+                self.result_cache.store(
+                    (red_team[0], self.team_hashes[red_team[0]]),
+                    (blue_team[0], self.team_hashes[blue_team[0]]),
+                    layout,
+                    self.max_steps,
+                    log_file,
+                    os.path.join(self.tmp_replays_dir, f"{game_file_name}.replay"),
+                    os.path.join(self.tmp_results_dir, f"{game_file_name}.json"),
+                    os.path.join(self.tmp_results_dir, f"{game_file_name}.resources.json"),
+                    exit_code,
+                    time_taken,
+                )
+
+            if self.stream_analysis:
+                if exit_code != 0:
+                    print(f"Game {red_team[0]} vs {blue_team[0]} in {layout} exited with error code {exit_code}")
+                self._analyse_game_output(red_team, blue_team, layout, exit_code, time_taken)
+
+                for tmp_dir, www_dir, ext in [
+                    (self.tmp_logs_dir, self.logs_www_contest_dir, "log"),
+                    (self.tmp_replays_dir, self.replays_www_contest_dir, "replay"),
+                ]:
+                    file_path = os.path.join(tmp_dir, f"{game_file_name}.{ext}")
+                    if os.path.exists(file_path):
+                        # never moved: the files in the temp folders are needed to resume the contest if it stops
+                        stage_file(
+                            file_path,
+                            os.path.join(www_dir, f"{game_file_name}.{ext}"),
+                            "copy" if self.www_staging == "copy" else "link",
+                        )
+
+        if self.stream_analysis:
+            games_results = [(game, exit_code, b"", b"", secs) for game, exit_code, _, _, secs in games_results]
+        return games_results
+
+    def _sort_games_longest_first(self, games):
+        """Sorts games by their expected duration, longest first, as estimated from the stats of past contests
+
+        Starting the longest games first keeps them from being the last ones running when the rest of workers are
+        already idle (i.e., it shortens the whole contest). Games with no history keep their relative order.
+
+        Args:
+            games (list): list of (red_team, blue_team, layout) games, where teams are (name, path) tuples
+
+        Returns:
+            list: the same games, sorted
+        """
+        estimator = DurationEstimator.from_stats_dir(self.stats_www_dir)
+        if estimator.no_games == 0:
+            logging.warning(f"No past games found in {self.stats_www_dir} to estimate durations; jobs kept in order")
+            return games
+
+        estimates = [estimator.estimate(red_team[0], blue_team[0], layout) for red_team, blue_team, layout in games]
+        logging.info(
+            f"Jobs sorted longest-first using {estimator.no_games} past games: "
+            f"{round(sum(estimates) / 60, 1)} game-minutes expected in total"
+        )
+        order = sorted(range(len(games)), key=lambda i: -estimates[i])
+        return [games[i] for i in order]
+
+    def _load_previous_games(self):
+        """Loads the games of the previous contest (the latest in the stats archive) that can be reused
+
+        A game can be reused if the code of both teams, the engine, and the max. no. of steps are the same as in this
+        contest, and it was played cleanly (as the games kept in the result cache; see _played_cleanly()): games where
+        an agent crashed, timed out, or failed to load (ERROR_SCORE in the stats), or with no outcome found (a negative
+        score), are played again, as that may be due to a busy or slow host rather than to the code of the teams. All
+        the split contests of the previous multi-contest are considered.
+
+        Returns:
+            dict: (red team, blue team, layout) -> (game as in stats, timestamp id of the contest that played it)
+        """
+        # ids are <timestamp>-<letter of split contest>; all split contests of a multi-contest share the timestamp
+        multi_contest_id = self.contest_timestamp_id.rsplit("-", 1)[0]
+        previous_contests = {}
+        for stats_file in glob.glob(os.path.join(self.stats_www_dir, "stats_*.json")):
+            try:
+                with open(stats_file, "r") as f:
+                    data = json.load(f)
+            except (OSError, ValueError) as e:
+                logging.warning(f"Stats file {stats_file} could not be loaded: {e}")
+                continue
+            previous_id = data.get("timestamp_id", "").rsplit("-", 1)[0]
+            if previous_id < multi_contest_id:
+                previous_contests.setdefault(previous_id, []).append(data)
+        if not previous_contests:
+            logging.warning("Incremental contest: no previous contest in the stats archive; all games will be played")
+            return {}
+
+        previous_id = max(previous_contests)
+        previous_games = {}
+        not_clean = 0
+        for data in previous_contests[previous_id]:
+            if "team_hashes" not in data:
+                logging.warning(f"Incremental contest: contest {data['timestamp_id']} has no team hashes; not used")
+                continue
+            if data.get("engine_hash") != self.engine_hash or data["max_steps"] != self.max_steps:
+                logging.warning(f"Incremental contest: contest {data['timestamp_id']} used another engine or steps")
+                continue
+            unchanged_teams = set(
+                team for team, team_hash in data["team_hashes"].items() if self.team_hashes.get(team) == team_hash
+            )
+            for game in data["games"]:
+                if game[0] not in unchanged_teams or game[1] not in unchanged_teams:
+                    continue
+                if game[3] == ERROR_SCORE or game[3] < 0:
+                    not_clean += 1
+                    continue
+                previous_games[(game[0], game[1], game[2])] = (game, data["timestamp_id"])
+        logging.info(
+            f"Incremental contest: {len(previous_games)} games of contest {previous_id} can be reused "
+            f"({not_clean} not played cleanly will be played again)"
+        )
+        return previous_games
+
+    def _reuse_previous_game(self, red_team, blue_team, layout):
+        """Reuses a game of the previous contest, in either colours, if possible (see _load_previous_games())
+
+        The game outcome is merged into the ladder when analyzing results, and its log and replay (if still in the
+        WWW folder of the previous contest, or in its indexed archives) are linked (or extracted) into the temp
+        folders, so they are also in this contest.
+
+        Args:
+            red_team (tuple): red team name and path to file
+            blue_team (tuple): blue team name and path to file
+            layout (str): layout of the game
+
+        Returns:
+            bool: True if the game is reused (and thus not to be played)
+        """
+        for team1, team2 in [(red_team[0], blue_team[0]), (blue_team[0], red_team[0])]:
+            if (team1, team2, layout) in self.previous_games:
+                game, timestamp_id = self.previous_games[(team1, team2, layout)]
+                break
+        else:
+            return False
+
+        game_file_name = f"{game[0]}_vs_{game[1]}_{layout}"
+        for www_dir, tmp_dir, ext in [
+            (os.path.join(self.logs_www_dir, f"logs_{timestamp_id}"), self.tmp_logs_dir, "log"),
+            (os.path.join(self.replays_www_dir, f"replays_{timestamp_id}"), self.tmp_replays_dir, "replay"),
+        ]:
+            try:
+                self._link_or_copy(
+                    os.path.join(www_dir, f"{game_file_name}.{ext}"), os.path.join(tmp_dir, f"{game_file_name}.{ext}")
+                )
+            except FileNotFoundError:  # only in the archive of the previous contest, if indexed
+                archive = find_archive(www_dir)
+                if archive is None or not self._extract_from_www_archive(
+                    archive, f"{game_file_name}.{ext}", os.path.join(tmp_dir, f"{game_file_name}.{ext}")
+                ):
+                    continue
+            if self.stream_analysis:  # staged into WWW as games are analyzed; these are not
+                self._link_or_copy(
+                    os.path.join(tmp_dir, f"{game_file_name}.{ext}"),
+                    os.path.join(
+                        self.logs_www_contest_dir if ext == "log" else self.replays_www_contest_dir,
+                        f"{game_file_name}.{ext}",
+                    ),
+                )
+        self.reused_games.append(game)
+        return True
+
+    def _forfeit_game(self, red_team, blue_team, layout):
+        """Forfeits a game, instead of playing it, if any team failed to load in the smoke test
+
+        The game is scored as _parse_result() would do had it been played: the team that failed loses by 1 point with
+        an error (or no one wins, if both failed); it is merged into the ladder when analyzing results.
+
+        Args:
+            red_team (tuple): red team name and path to file
+            blue_team (tuple): blue team name and path to file
+            layout (str): layout of the game
+
+        Returns:
+            bool: True if the game is forfeited (and thus not to be played)
+        """
+        red_failed = red_team[0] in self.failed_teams
+        blue_failed = blue_team[0] in self.failed_teams
+        if not red_failed and not blue_failed:
+            return False
+
+        if red_failed and blue_failed:
+            winner = None
+        else:
+            winner = blue_team[0] if red_failed else red_team[0]
+        self.forfeited_games.append((red_team[0], blue_team[0], layout, ERROR_SCORE, winner, 0))
+        return True
+
+    def _merge_unplayed_games(self, games):
+        """Adds games not played in this contest (reused or forfeited) to the ladder, errors, and games
+
+        The ladder is updated exactly as _analyse_game_output() does for games played (a game with ERROR_SCORE and a
+        winner was won by 1 point because the loser crashed; with no winner, both teams failed).
+
+        Args:
+            games (list): games as in stats, (red_team, blue_team, layout, score, winner, total_time)
+        """
+        for game in games:
+            red_team_name, blue_team_name, layout, score, winner = game[:5]
+            loser = None if winner is None else (blue_team_name if winner == red_team_name else red_team_name)
+            if score == ERROR_SCORE:
+                if winner is None:
+                    self.errors[red_team_name] += 1
+                    self.errors[blue_team_name] += 1
+                else:
+                    self.errors[loser] += 1
+                    score = 1
+            if winner is None:
+                self.ladder[red_team_name].append(score)
+                self.ladder[blue_team_name].append(score)
+            else:
+                self.ladder[winner].append(score)
+                self.ladder[loser].append(-score)
+            self.games.append(tuple(game[:6]))
+
+    def _played_cleanly(self, red_team_name, blue_team_name, layout):
+        """Whether a game played has a known outcome and no agent crashed, timed out, or failed to load in it
+
+        Only those are kept in the result cache: crashes and timeouts may be due to a busy or slow host rather than to
+        the code of the teams, so they are not taken as the outcome of the game for next contests.
+
+        :param red_team_name: name of the red team
+        :param blue_team_name: name of the blue team
+        :param layout: layout of the game
+        """
+        game_file_name = f"{red_team_name}_vs_{blue_team_name}_{layout}"
+        parsed_result = parse_game_result_file(
+            os.path.join(self.tmp_results_dir, f"{game_file_name}.json"), red_team_name, blue_team_name
+        )
+        if parsed_result is None:
+            parsed_result = parse_game_log_file(
+                os.path.join(self.tmp_logs_dir, f"{game_file_name}.log"),
+                red_team_name,
+                blue_team_name,
+                layout,
+                tail=self.log_parse_mode == "tail",
+            )
+        score, _, _, bug, _ = parsed_result
+        return not bug and score >= 0  # a negative score: no outcome found in the log
+
+    def _restore_cached_game(self, red_team, blue_team, layout):
+        """Restores a game from the result cache, if there, into the temp logs, replays, and results folders
+
+        Its result and resources files are restored too, so it is analysed as when played (see _analyse_game_output()).
+
+        Args:
+            red_team (tuple): red team name and path to file
+            blue_team (tuple): blue team name and path to file
+            layout (str): layout of the game
+
+        Returns:
+            bool: True if the game was in the cache (and thus restored)
+        """
+        if self.result_cache is None:
+            return False
+        game_file_name = f"{red_team[0]}_vs_{blue_team[0]}_{layout}"
+        result = self.result_cache.restore(
+            (red_team[0], self.team_hashes[red_team[0]]),
+            (blue_team[0], self.team_hashes[blue_team[0]]),
+            layout,
+            self.max_steps,
+            os.path.join(self.tmp_logs_dir, f"{game_file_name}.log"),
+            os.path.join(self.tmp_replays_dir, f"{game_file_name}.replay"),
+            os.path.join(self.tmp_results_dir, f"{game_file_name}.json"),
+            os.path.join(self.tmp_results_dir, f"{game_file_name}.resources.json"),
+        )
+        if result is None:
+            return False
+        self.cached_games.add(game_file_name)
+        return True
 
     def _generate_contest_jobs(self, resume=False):
         """Generate a list of Jobs for the games to play
         Uses _generate_empty_job() and _generate_job() to build an actual Job
 
+        If more than one game per job has been asked, the games to play are grouped (in order, so the layouts of one
+        pairing tend to go together) into jobs of self.games_per_job games each; see _generate_batch_job()
+
         Args:
             resume (bool, optional): True if we are resuming a previous contest and some logs have been copied across already. Defaults to False.
         Returns:
-            [list(Jobs)]: list of all jobs to run, each being a game
+            [list(Jobs)]: list of all jobs to run, each being a game (or a batch of games)
         """
         jobs = []
+        games_to_play = []
         games_restored = 0
+        if self.incremental:
+            self.previous_games = self._load_previous_games()
         if self.staff_teams_vs_others_only:
             for team in self.teams:
                 for staff in self.staff_teams:
@@ -668,17 +1530,33 @@ class ContestRunner:
                         if resume:  # if game between these two in layout exist, then skip and recover it
                             log_file_name1 = os.path.join(self.tmp_logs_dir, f"{team[0]}_vs_{staff[0]}_{layout}.log")
                             log_file_name2 = os.path.join(self.tmp_logs_dir, f"{staff[0]}_vs_{team[0]}_{layout}.log")
-                            if os.path.isfile(log_file_name1) and os.stat(log_file_name1).st_size != 0:
+                            if self._is_game_restored(log_file_name1, non_empty=True):
                                 games_restored += 1
                                 print(f"Game {log_file_name1} restored (total restored: {games_restored})")
                                 jobs.append(self._generate_empty_job(team, staff, layout))
                                 continue
-                            elif os.path.isfile(log_file_name2) and os.stat(log_file_name2).st_size != 0:
+                            elif self._is_game_restored(log_file_name2, non_empty=True):
                                 games_restored += 1
                                 print(f"Game {log_file_name2} restored (total restored: {games_restored})")
                                 jobs.append(self._generate_empty_job(staff, team, layout))
                                 continue
 
+                        # a game of a team that failed to load in the smoke test is forfeited
+                        if self._forfeit_game(team, staff, layout):
+                            continue
+
+                        # a game of the previous contest with both teams unchanged is reused (incremental contest)
+                        if self.incremental and self._reuse_previous_game(team, staff, layout):
+                            continue
+
+                        # a game already played in the cache (in either colours) is restored and not played again
+                        if self._restore_cached_game(team, staff, layout):
+                            jobs.append(self._generate_empty_job(team, staff, layout))
+                            continue
+                        elif self._restore_cached_game(staff, team, layout):
+                            jobs.append(self._generate_empty_job(staff, team, layout))
+                            continue
+
                         if random.randrange(2) == 0:
                             red_team = team
                             blue_team = staff
@@ -687,31 +1565,64 @@ class ContestRunner:
                             blue_team = team
 
                         # either not resume anything or log file does not exist
-                        jobs.append(self._generate_job(
-                            red_team, blue_team, layout))
+                        games_to_play.append((red_team, blue_team, layout))
         else:
             for red_team, blue_team in combinations(self.all_teams, r=2):
                 for layout in self.layouts:
                     # remember red_team = (name of team, path of file)
                     log_file_name = f"{red_team[0]}_vs_{blue_team[0]}_{layout}.log"
-                    if resume and os.path.isfile(os.path.join(self.tmp_logs_dir, log_file_name)):
+                    if resume and self._is_game_restored(os.path.join(self.tmp_logs_dir, log_file_name)):
                         games_restored += 1
                         print(f"{games_restored} Game {log_file_name} restored")
                         jobs.append(self._generate_empty_job(
                             red_team, blue_team, layout))
                         continue
                     log_file_name = f"{blue_team[0]}_vs_{red_team[0]}_{layout}.log"
-                    if resume and os.path.isfile(os.path.join(self.tmp_logs_dir, log_file_name)):
+                    if resume and self._is_game_restored(os.path.join(self.tmp_logs_dir, log_file_name)):
                         games_restored += 1
                         print(f"{games_restored} Game {log_file_name} restored")
                         jobs.append(self._generate_empty_job(
                             blue_team, red_team, layout))
                         continue
 
+                    # a game of a team that failed to load in the smoke test is forfeited
+                    if self._forfeit_game(red_team, blue_team, layout):
+                        continue
+
+                    # a game of the previous contest with both teams unchanged is reused (incremental contest)
+                    if self.incremental and self._reuse_previous_game(red_team, blue_team, layout):
+                        continue
+
+                    # a game already played in the cache (in either colours) is restored and not played again
+                    if self._restore_cached_game(red_team, blue_team, layout):
+                        jobs.append(self._generate_empty_job(red_team, blue_team, layout))
+                        continue
+                    elif self._restore_cached_game(blue_team, red_team, layout):
+                        jobs.append(self._generate_empty_job(blue_team, red_team, layout))
+                        continue
+
                     # either not resume anything or log file does not exist
-                    jobs.append(self._generate_job(
-                        red_team, blue_team, layout))
+                    games_to_play.append((red_team, blue_team, layout))
+
+        if self.job_order == "longest-first":
+            games_to_play = self._sort_games_longest_first(games_to_play)
+
+        if self.games_per_job > 1:
+            for i in range(0, len(games_to_play), self.games_per_job):
+                jobs.append(self._generate_batch_job(games_to_play[i:i + self.games_per_job]))
+        else:
+            jobs += [self._generate_job(*game) for game in games_to_play]
+
         if games_restored > 0:
             print(
-                f'A total of {games_restored} games have been restored. Missing: {len(jobs)-games_restored}', flush=True)
+                f'A total of {games_restored} games have been restored. Missing: {len(games_to_play)}', flush=True)
+        if self.forfeited_games:
+            logging.info(
+                f"{len(self.forfeited_games)} games forfeited by teams that failed to load; {len(games_to_play)} games to play")
+        if self.incremental:
+            logging.info(
+                f"{len(self.reused_games)} games reused from the previous contest; {len(games_to_play)} games to play")
+        if self.result_cache is not None:
+            logging.info(
+                f"{len(self.cached_games)} games restored from the result cache; {len(games_to_play)} games to play")
         return jobs
@@ -13,6 +13,7 @@ from plotly.subplots import make_subplots
 
 import re
 import os
+import sys
 import json
 from datetime import datetime
 
@@ -25,6 +26,13 @@ from IPython.core.display import display, display_html, Javascript, HTML
 # import all configuration vars
 from config import SHOW_TEAMS_PROGRESS_CHECKBOX, DEPLOYED_URL, ORGANIZER, STATS_FOLDER
 
+# indexed archives of replays and logs (contests run with --www-archives indexed) are read with the contest tool
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from archive_index import index_file_of, load_index, read_file, iter_bundle, team_files
+from archive_codecs import find_archive
+
+WWW_FOLDER = os.path.dirname(os.path.normpath(STATS_FOLDER))
+
 FORMAT_DATE_FILE = '.*(\d{4}-\d{2}-\d{2}-\d{2}-\d{2}).*\.json'
 
 
@@ -46,6 +54,33 @@ def get_id_from_json(filename):
     return re.match('stats_(.*).json', filename).group(1)
 
 
+def get_archive_extension(kind, timestamp_id):
+    """
+    Returns the extension of the archives of replays or logs of a contest, as per its codec (see --archive-codec)
+    :param kind: 'replays' or 'logs'
+    :param timestamp_id: the id of the contest
+    :return: e.g., '.tar.gz' or '.tar.zst' ('.tar.gz' if its archive is not found)
+    """
+    archive_path = os.path.join(WWW_FOLDER, f'{kind}-archive', f'{kind}_{timestamp_id}')
+    archive_file = find_archive(archive_path)
+    return archive_file[len(archive_path):] if archive_file else '.tar.gz'
+
+
+def get_indexed_archive(kind, timestamp_id):
+    """
+    Returns the archive of the replays or logs of a contest and its index, if it only has the indexed archive
+    (no plain files nor per-team archives; see archive_index.py in the contest tool)
+    :param kind: 'replays' or 'logs'
+    :param timestamp_id: the id of the contest
+    :return: (archive file, index), or (None, None) if the contest has plain files
+    """
+    archive_file = os.path.join(WWW_FOLDER, f'{kind}-archive', f'{kind}_{timestamp_id}{get_archive_extension(kind, timestamp_id)}')
+    if os.path.isdir(os.path.join(WWW_FOLDER, f'{kind}-archive', f'{kind}_{timestamp_id}')) or \
+            not os.path.isfile(index_file_of(archive_file)):
+        return None, None
+    return archive_file, load_index(archive_file)
+
+
 def normalize(x, min, max, min_new, max_new):
     """
     Normalize x in range (min, max) into new range (min_new, max_new)
@@ -64,7 +99,8 @@ def main():
     max_width_layout()
 
     # Load Data
-    json_files = sorted([f for f in os.listdir(STATS_FOLDER) if os.path.isfile(
+    # (stats-archive also has the timing_<id>.json files of the contests)
+    json_files = sorted([f for f in os.listdir(STATS_FOLDER) if f.startswith('stats_') and os.path.isfile(
         os.path.join(STATS_FOLDER, f))], reverse=True)
 
     df_all_games, df_all_stats = load_data(json_files)
@@ -116,15 +152,29 @@ def main():
     team_filter = st.selectbox('Filter by your team', options=[
                                "N/A"] + list(team_names_students), index=0)
 
-    if team_filter != "N/A":
+    replays_archive, replays_index = get_indexed_archive('replays', timestamp_id)
+    logs_archive, logs_index = get_indexed_archive('logs', timestamp_id)
+    replays_ext = get_archive_extension('replays', timestamp_id)
+    logs_ext = get_archive_extension('logs', timestamp_id)
+
+    if team_filter != "N/A" and replays_index is not None:
+        # no per-team archives: stream the files of the team from the indexed archive of the contest
+        st.download_button(f'Download Replays_{team_filter}{replays_ext}', file_name=f'replays_{team_filter}{replays_ext}',
+                           data=b''.join(iter_bundle(replays_archive, team_files(replays_index, team_filter), replays_index)))
+        st.download_button(f'Download Logs_{team_filter}{logs_ext}', file_name=f'logs_{team_filter}{logs_ext}',
+                           data=b''.join(iter_bundle(logs_archive, team_files(logs_index, team_filter), logs_index)))
+        replays_link = f'## [Download All Replays{replays_ext}]({DEPLOYED_URL}/replays-archive/replays_{timestamp_id}{replays_ext})'
+        logs_link = f'## [Download All Logs{logs_ext}]({DEPLOYED_URL}/logs-archive/logs_{timestamp_id}{logs_ext})'
+        select_teams = [team_filter]
+    elif team_filter != "N/A":
         #comparison = comparison.loc[(comparison['Team1'] == team_filter) | (comparison['Team2'] == team_filter) ]
-        replays_link = f'## [Download Replays_{team_filter}.tar.gz]({DEPLOYED_URL}/replays-archive/replays_{timestamp_id}/replays_{team_filter}.tar.gz)'
-        logs_link = f'## [Download Logs_{team_filter}.tar.gz]({DEPLOYED_URL}/logs-archive/logs_{timestamp_id}/logs_{team_filter}.tar.gz)'
+        replays_link = f'## [Download Replays_{team_filter}{replays_ext}]({DEPLOYED_URL}/replays-archive/replays_{timestamp_id}/replays_{team_filter}{replays_ext})'
+        logs_link = f'## [Download Logs_{team_filter}{logs_ext}]({DEPLOYED_URL}/logs-archive/logs_{timestamp_id}/logs_{team_filter}{logs_ext})'
         select_teams = [team_filter]
 
     else:
-        replays_link = f'## [Download All Replays.tar.gz]({DEPLOYED_URL}/replays-archive/replays_{timestamp_id}.tar.gz)'
-        logs_link = f'## [Download All Logs.tar.gz]({DEPLOYED_URL}/logs-archive/logs_{timestamp_id}.tar.gz)'
+        replays_link = f'## [Download All Replays{replays_ext}]({DEPLOYED_URL}/replays-archive/replays_{timestamp_id}{replays_ext})'
+        logs_link = f'## [Download All Logs{logs_ext}]({DEPLOYED_URL}/logs-archive/logs_{timestamp_id}{logs_ext})'
         select_teams = []
 
     st.markdown(replays_link)
@@ -162,6 +212,18 @@ def main():
 
     if games_checkbox:
         st.markdown('## Games Table')
+        if replays_index is not None:
+            # no plain files to link in the table: read the replay and log of a game from the indexed archives
+            game = st.selectbox('Download replay and log of game', options=list(comparison.index),
+                                format_func=lambda i: f"{comparison.loc[i, 'Team1']} vs {comparison.loc[i, 'Team2']} in {comparison.loc[i, 'Layout']}")
+            if game is not None:
+                game_file_name = f"{comparison.loc[game, 'Team1']}_vs_{comparison.loc[game, 'Team2']}_{comparison.loc[game, 'Layout']}"
+                for kind, archive_file, index, ext in [('Replay', replays_archive, replays_index, 'replay'),
+                                                       ('Log', logs_archive, logs_index, 'log')]:
+                    if f'{game_file_name}.{ext}' in index['files']:
+                        st.download_button(f'Download {kind}', file_name=f'{game_file_name}.{ext}',
+                                           data=read_file(archive_file, f'{game_file_name}.{ext}', index))
+            comparison = comparison.drop(columns=['ReplayFile', 'LogFile'])
         html_objects = show(comparison)
         components.html(html_objects, height=3800)
 
@@ -10,7 +10,7 @@ import re
 DATA_URL = '/mnt/ssardina-pacman/cosc1125-1127-AI/www/feedback-final/'
 
 def main():
-    json_files = sorted([f for f in os.listdir(f'{DATA_URL}/stats-archive/') if os.path.isfile(os.path.join(DATA_URL,'stats-archive', f))], reverse=True)
+    json_files = sorted([f for f in os.listdir(f'{DATA_URL}/stats-archive/') if f.startswith('stats_') and os.path.isfile(os.path.join(DATA_URL,'stats-archive', f))], reverse=True)
 
     print(f'{DATA_URL}/stats-archive/')
     print(json_files)
@@ -36,6 +36,11 @@ def main():
             print('\t .. exist already, skipping')
             continue
 
+        # Indexed archives (--www-archives indexed) are read by the dashboard as they are
+        if os.path.exists(replays_archive_full_path + '.index.json'):
+            print('\t .. indexed archive, skipping')
+            continue
+
         os.system(f'mkdir {replays_folder_full_path}')
         os.system(f'tar zxf {replays_archive_full_path} -C {replays_folder_full_path}')
 
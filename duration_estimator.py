@@ -0,0 +1,111 @@
+"""
+Estimates how long games will take from the stats of previous contests, so jobs can be submitted longest-first.
+
+Each stats_<id>.json file in the stats archive of the www folder has, in its "games" list, one
+(red_team, blue_team, layout, score, winner, total_time) entry per game played, with total_time in seconds.
+
+The duration of a game (red, blue, layout) is estimated as:
+
+    - the mean duration of the same pairing (any colour) in the same layout, if it has been played before; or
+    - mean * factor(red) * factor(blue) * factor(layout) otherwise, where mean is the mean duration of all games and
+      the factor of a team (or layout) is the mean duration of its games relative to the overall mean (1 if unknown).
+
+All random layouts (RANDOMxxx) are taken as one layout for their factor, as each seed is rarely played twice.
+"""
+import os
+import glob
+import json
+import logging
+from collections import defaultdict
+
+from config import ERROR_SCORE
+
+
+class DurationEstimator:
+    def __init__(self, games=None):
+        """
+        :param games: list of (red_team, blue_team, layout, score, winner, total_time) games already played
+        """
+        # each is a [total secs, no. of games] pair
+        self._pairing_times = defaultdict(lambda: [0, 0])
+        self._team_times = defaultdict(lambda: [0, 0])
+        self._layout_times = defaultdict(lambda: [0, 0])
+        self._all_times = [0, 0]
+
+        for game in games or []:
+            self.add_game(game)
+
+    @classmethod
+    def from_stats_dir(cls, stats_dir):
+        """Builds an estimator with all the games in the stats files (stats_*.json) of a stats archive folder"""
+        estimator = cls()
+        for stats_file in sorted(glob.glob(os.path.join(stats_dir, "stats_*.json"))):
+            try:
+                with open(stats_file, "r") as f:
+                    games = json.load(f)["games"]
+            except (OSError, ValueError, KeyError) as e:
+                logging.warning(f"Stats file {stats_file} could not be used to estimate game durations: {e}")
+                continue
+            for game in games:
+                estimator.add_game(game)
+        return estimator
+
+    @staticmethod
+    def _layout_key(layout):
+        return "RANDOM" if layout.startswith("RANDOM") else layout
+
+    @staticmethod
+    def _pairing_key(team1, team2, layout):
+        return tuple(sorted([team1, team2])) + (layout,)
+
+    def add_game(self, game):
+        """Adds a game (red_team, blue_team, layout, score, winner, total_time) to the history"""
+        if len(game) < 6:  # stats of old versions did not record the time of games
+            return
+        red_team, blue_team, layout, score, _, total_time = game[:6]
+        if score == ERROR_SCORE or total_time is None:  # crashed games say nothing about duration
+            return
+
+        for times in (
+            self._pairing_times[self._pairing_key(red_team, blue_team, layout)],
+            self._team_times[red_team],
+            self._team_times[blue_team],
+            self._layout_times[self._layout_key(layout)],
+            self._all_times,
+        ):
+            times[0] += total_time
+            times[1] += 1
+
+    @property
+    def no_games(self):
+        return self._all_times[1]
+
+    @staticmethod
+    def _factor(times, mean):
+        return times[0] / times[1] / mean if times and mean > 0 else 1
+
+    def estimate(self, red_team, blue_team, layout):
+        """Returns the expected duration (in seconds) of a game, or None if there is no history at all
+
+        Args:
+            red_team (str): name of the red team
+            blue_team (str): name of the blue team
+            layout (str): name of the layout
+
+        Returns:
+            float: the expected duration in seconds
+        """
+        if self.no_games == 0:
+            return None
+
+        pairing_times = self._pairing_times.get(self._pairing_key(red_team, blue_team, layout))
+        if pairing_times:
+            return pairing_times[0] / pairing_times[1]
+
+        mean = self._all_times[0] / self._all_times[1]
+        return (
+            mean
+            * self._factor(self._team_times.get(red_team), mean)
+            * self._factor(self._team_times.get(blue_team), mean)
+            * self._factor(self._layout_times.get(self._layout_key(layout)), mean)
+        )
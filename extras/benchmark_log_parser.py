@@ -0,0 +1,231 @@
+"""
+Benchmark of the log parser (log_parser.py) against the parser ContestRunner used before (one str.find() per sign of
+the outcome over the whole log, then a split of the log in lines), on a corpus of real game logs; the log parser is
+run in full mode (serial and in a pool) and in tail mode (in a pool).
+
+Logs are named <red>_vs_<blue>_<layout>.log, as in the logs folders of the www folder (logs-archive/logs_<id>/) or of
+a contest temp folder (tmp/contest-a/logs-run/). Both parsers must give the same outcome for every log.
+
+To emulate chatty agents, --chatty-mb pads every log with that many MB of agent prints (before its outcome lines).
+
+    $ python extras/benchmark_log_parser.py www/logs-archive/logs_2025-03-01-10-00-a --chatty-mb 5 --workers 8
+"""
+import os
+import sys
+import glob
+import time
+import shutil
+import argparse
+import tempfile
+import logging
+from collections import defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import ERROR_SCORE
+from log_parser import parse_game_log, parse_game_logs
+
+CHATTY_LINE = "Agent 1 at (12, 7) evaluating successors: {'North': 3.25, 'South': -1.5, 'Stop': -100}\n"
+
+
+def legacy_parse_result(output, red_team_name, blue_team_name, layout, errors):
+    """
+    Parses the result log of a match to extract outcome.
+
+    :param output: an iterator of the lines of the result log
+    :param red_team_name: name of Red team
+    :param blue_team_name: name of Blue team
+    :return: a tuple containing score, winner, loser and a flag signaling whether there was a bug
+    """
+    score = 0
+    winner = None
+    loser = None
+    bug = False
+    tied = False
+    total_time = 0
+
+    try:
+        output = output.decode()  # convert byte into string
+    except:
+        pass  # it is already a string
+
+    if output.find("Traceback") != -1 or output.find("agent crashed") != -1:
+        bug = True
+        # if both teams fail to load, no one wins
+        if (
+            output.find("Red team failed to load!") != -1
+            and output.find("Blue team failed to load!") != -1
+        ):
+            errors[red_team_name] += 1
+            errors[blue_team_name] += 1
+            winner = None
+            loser = None
+            score = ERROR_SCORE
+        elif (
+            output.find("Red agent crashed") != -1
+            or output.find("redAgents = loadAgents") != -1
+            or output.find("Red team failed to load!") != -1
+        ):
+            errors[red_team_name] += 1
+            winner = blue_team_name
+            loser = red_team_name
+            score = 1
+        elif (
+            output.find("Blue agent crashed") != -1
+            or output.find("blueAgents = loadAgents") != -1
+            or output.find("Blue team failed to load!")
+        ):
+            errors[blue_team_name] += 1
+            winner = red_team_name
+            loser = blue_team_name
+            score = 1
+        else:
+            logging.error(
+                "Note able to parse out for game {} vs {} in {} (traceback available, but couldn't get winner!)".format(
+                    red_team_name, blue_team_name, layout
+                )
+            )
+    else:
+        for line in output.splitlines():
+            if line.find("wins by") != -1:
+                score = abs(
+                    int(line.split("wins by")[1].split("points")[0]))
+                if line.find("Red") != -1:
+                    winner = red_team_name
+                    loser = blue_team_name
+                elif line.find("Blue") != -1:
+                    winner = blue_team_name
+                    loser = red_team_name
+            if line.find("The Blue team has returned at least ") != -1:
+                score = abs(
+                    int(
+                        line.split("The Blue team has returned at least ")[1].split(
+                            " "
+                        )[0]
+                    )
+                )
+                winner = blue_team_name
+                loser = red_team_name
+            elif line.find("The Red team has returned at least ") != -1:
+                score = abs(
+                    int(
+                        line.split("The Red team has returned at least ")[1].split(
+                            " "
+                        )[0]
+                    )
+                )
+                winner = red_team_name
+                loser = blue_team_name
+            elif line.find("Tie Game") != -1 or line.find("Tie game") != -1:
+                winner = None
+                loser = None
+                tied = True
+
+            if line.find("Total Time Game: ") != -1:
+                total_time = int(
+                    float(line.split("Total Time Game: ")[1].split(" ")[0])
+                )
+
+        # signal strange case where script was unable to find outcome of game - should never happen!
+        if winner is None and loser is None and not tied:
+            logging.error(
+                f"Note able to successfully parse output for game {red_team_name} vs {blue_team_name} in {layout}: \n {output} \n =====================================")
+            winner = None
+            loser = None
+            tied = True
+            score = -1
+            # sys.exit(1)
+
+    return score, winner, loser, bug, total_time
+
+
+def game_of(log_file):
+    """Returns (red_team_name, blue_team_name, layout) of a log file <red>_vs_<blue>_<layout>.log"""
+    red_team_name, rest = os.path.basename(log_file)[: -len(".log")].split("_vs_", 1)
+    blue_team_name, layout = rest.rsplit("_", 1)
+    return red_team_name, blue_team_name, layout
+
+
+def pad_logs(log_files, chatty_mb, tmp_dir):
+    """Copies the logs into tmp_dir, with chatty_mb MB of agent prints before their last 20 lines"""
+    chatter = CHATTY_LINE * (chatty_mb * 2 ** 20 // len(CHATTY_LINE))
+    padded_files = []
+    for log_file in log_files:
+        with open(log_file, "r", errors="replace") as f:
+            lines = f.readlines()
+        padded_file = os.path.join(tmp_dir, os.path.basename(log_file))
+        with open(padded_file, "w") as f:
+            f.writelines(lines[:-20])
+            f.write(chatter)
+            f.writelines(lines[-20:])
+        padded_files.append(padded_file)
+    return padded_files
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the log parser against the previous one")
+    parser.add_argument("logs_dirs", nargs="+", help="folders with the logs of games (*.log)")
+    parser.add_argument("--chatty-mb", type=int, default=0, help="MB of agent prints to pad each log with")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="processes to parse logs in a batch")
+    args = parser.parse_args()
+    logging.disable(logging.ERROR)  # both parsers report unparseable logs, in full
+
+    log_files = sorted(f for logs_dir in args.logs_dirs for f in glob.glob(os.path.join(logs_dir, "*.log")))
+    if not log_files:
+        print("No logs found")
+        sys.exit(1)
+
+    tmp_dir = tempfile.mkdtemp(prefix="benchmark_log_parser_")
+    try:
+        if args.chatty_mb > 0:
+            log_files = pad_logs(log_files, args.chatty_mb, tmp_dir)
+        games = [(log_file,) + game_of(log_file) for log_file in log_files]
+        total_mb = sum(os.path.getsize(f) for f in log_files) / 2 ** 20
+        print(f"{len(log_files)} logs, {round(total_mb, 2)} MB")
+
+        # what ContestRunner did before: read each log, then parse it, one after the other
+        start = time.time()
+        errors = defaultdict(int)
+        legacy_results = []
+        for log_file, red_team_name, blue_team_name, layout in games:
+            with open(log_file, "r", errors="replace") as f:
+                legacy_results.append(legacy_parse_result(f.read(), red_team_name, blue_team_name, layout, errors))
+        legacy_secs = time.time() - start
+
+        start = time.time()
+        serial_results = []
+        for log_file, red_team_name, blue_team_name, layout in games:
+            with open(log_file, "r", errors="replace") as f:
+                serial_results.append(parse_game_log(f.read(), red_team_name, blue_team_name, layout))
+        serial_secs = time.time() - start
+
+        start = time.time()
+        pool_results = parse_game_logs(games, args.workers)
+        pool_secs = time.time() - start
+
+        start = time.time()
+        tail_results = parse_game_logs(games, args.workers, tail=True)
+        tail_secs = time.time() - start
+
+        for name, secs in [
+            ("previous parser", legacy_secs),
+            ("log_parser, serial", serial_secs),
+            (f"log_parser, {args.workers} processes", pool_secs),
+            (f"log_parser tail, {args.workers} processes", tail_secs),
+        ]:
+            print(f"{name:>35}: {round(secs, 3):>8} secs ({round(total_mb / secs, 1) if secs > 0 else '-'} MB/s)")
+
+        mismatches = [
+            (game[0], legacy, new)
+            for game, legacy, new, pooled, tailed in zip(games, legacy_results, serial_results, pool_results, tail_results)
+            if legacy != new or new != pooled or new != tailed
+        ]
+        for log_file, legacy, new in mismatches:
+            print(f"MISMATCH in {log_file}: previous parser {legacy}, log_parser {new}")
+        print(f"{len(games) - len(mismatches)}/{len(games)} logs parsed the same by both parsers")
+        sys.exit(1 if mismatches else 0)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+Staging of the logs and replays of a contest from its temp folders into the WWW folders, without copying their
+contents when source and destination are in the same file system (device):
+
+    - copy: always copy the files (as shutil.copytree() did).
+    - link: hard-link each file (no extra space nor I/O); if not possible (e.g., no hard links allowed), reflink it
+        (a copy-on-write clone, in file systems like Btrfs or XFS), and else copy it.
+    - move: rename each file (the temp folders are wiped on the next run anyway).
+
+When source and destination are in different devices, files are always copied (and then removed, if moved).
+
+A file already at the destination is replaced atomically, never written over: each new file is first created with a
+temp name next to it and then renamed into place. So a destination that is a hard link of the source (e.g., staged
+already) or of another file (e.g., an entry of the result cache) is never truncated.
+"""
+import os
+import uuid
+import shutil
+import fcntl
+from collections import Counter
+
+FICLONE = 0x40049409  # ioctl to reflink a file in Linux (from linux/fs.h)
+
+
+def _temp_path(dst):
+    """Returns a new temp name for a file next to dst (same folder, so it can be renamed into place)"""
+    return os.path.join(os.path.dirname(dst), f".{os.path.basename(dst)}.{uuid.uuid4().hex[:8]}.tmp")
+
+
+def _replace_with(dst, create):
+    """Creates a file with create(path) in a temp path, and then renames it into dst (replacing it, if there)"""
+    tmp = _temp_path(dst)
+    try:
+        create(tmp)
+        os.replace(tmp, dst)
+    except BaseException:
+        if os.path.lexists(tmp):
+            os.remove(tmp)
+        raise
+
+
+def _reflink_new(src, dst):
+    with open(src, "rb") as f_src, open(dst, "xb") as f_dst:
+        fcntl.ioctl(f_dst.fileno(), FICLONE, f_src.fileno())
+    shutil.copystat(src, dst)
+
+
+def reflink(src, dst):
+    """Clones file src as dst sharing its data blocks (copy-on-write); raises OSError if not supported"""
+    _replace_with(dst, lambda tmp: _reflink_new(src, tmp))
+
+
+def hardlink(src, dst):
+    """Hard-links file src as dst"""
+    _replace_with(dst, lambda tmp: os.link(src, tmp))
+
+
+def copy(src, dst):
+    """Copies file src (and its metadata) as dst"""
+    _replace_with(dst, lambda tmp: shutil.copy2(src, tmp))
+
+
+def stage_file(src, dst, mode="copy", same_device=None):
+    """Stages file src as dst (see the modes above); raises FileNotFoundError if src does not exist
+
+    Args:
+        src (str): the file to stage
+        dst (str): where to stage it (a file path, not a folder)
+        mode (str, optional): copy, link, or move. Defaults to "copy".
+        same_device (bool, optional): whether src and dst are in the same device, if known; files in different
+            devices are copied right away. Defaults to None (just try).
+
+    Returns:
+        str: how the file was staged: "copy", "link", "reflink", or "move"
+    """
+    if os.path.lexists(dst) and os.path.samefile(src, dst):  # staged already (e.g., linked by a previous run)
+        if mode == "move":
+            os.remove(src)
+            return "move"
+        return "link"
+
+    if mode == "move":
+        if same_device is not False:
+            try:
+                os.replace(src, dst)
+                return "move"
+            except FileNotFoundError:
+                raise
+            except OSError:  # e.g., in another file system
+                pass
+        copy(src, dst)
+        os.remove(src)
+        return "copy"
+
+    if mode == "link" and same_device is not False:
+        try:
+            hardlink(src, dst)
+            return "link"
+        except FileNotFoundError:
+            raise
+        except OSError:  # e.g., in another file system, or too many links
+            pass
+        try:
+            reflink(src, dst)
+            return "reflink"
+        except OSError:
+            pass
+    copy(src, dst)
+    return "copy"
+
+
+def stage_tree(src_dir, dst_dir, mode="copy"):
+    """Stages all files in folder src_dir (and its sub-folders) into folder dst_dir, created if needed
+
+    Args:
+        src_dir (str): the folder with the files to stage
+        dst_dir (str): where to stage them
+        mode (str, optional): copy, link, or move (see stage_file()). Defaults to "copy".
+
+    Returns:
+        Counter: no. of files staged in each way (e.g., {"link": 380})
+    """
+    os.makedirs(dst_dir, exist_ok=True)
+    same_device = os.stat(src_dir).st_dev == os.stat(dst_dir).st_dev
+    staged = Counter()
+    for entry in os.scandir(src_dir):
+        dst = os.path.join(dst_dir, entry.name)
+        if entry.is_dir(follow_symlinks=False):
+            staged.update(stage_tree(entry.path, dst, mode))
+        else:
+            staged[stage_file(entry.path, dst, mode, same_device)] += 1
+    return staged
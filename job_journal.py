@@ -0,0 +1,64 @@
+"""
+Append-only journal of the games of a contest, kept as a JSONL file in its temp folder (tmp/contest-x/journal.jsonl).
+
+One line is appended (and flushed to disk) as soon as each game's log has landed in the temp folder:
+
+    {"game": "<red>_vs_<blue>_<layout>", "exit_code": 0, "secs": 12.3, "time": "2025-03-01T10:00:00"}
+
+where "game" is also the name (without extension) of its log and replay files. When a contest is resumed, the journal
+of the previous run says which games were completed, so they are not searched for in the logs folder, and the
+journal survives a crash of the script at any point (at worst, the last line is incomplete and ignored).
+"""
+import os
+import json
+import logging
+import datetime
+
+
+class JobJournal:
+    def __init__(self, journal_file):
+        """
+        :param journal_file: the JSONL file to append to (created if it does not exist)
+        """
+        self.journal_file = journal_file
+
+    def record(self, game, exit_code, secs, time=None):
+        """Appends the entry of a completed game and makes sure it is on disk
+
+        Args:
+            game (str): the game id, red_vs_blue_layout (as in its log and replay file names)
+            exit_code (int): the exit code of the game
+            secs (float): the secs taken by the game
+            time (str, optional): when the game was completed, in ISO format. Defaults to now.
+        """
+        entry = {
+            "game": game,
+            "exit_code": exit_code,
+            "secs": round(secs, 2),
+            "time": time or datetime.datetime.now().isoformat(timespec="seconds"),
+        }
+        with open(self.journal_file, "a") as f:
+            f.write(json.dumps(entry) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    @staticmethod
+    def load(journal_file):
+        """Loads the entries of a journal
+
+        Args:
+            journal_file (str): the JSONL journal file
+
+        Returns:
+            dict: game id -> entry (the last one, if a game was recorded more than once)
+        """
+        entries = {}
+        with open(journal_file, "r") as f:
+            for line_no, line in enumerate(f, start=1):
+                try:
+                    entry = json.loads(line)
+                except ValueError:  # e.g., the last line was being written when the script died
+                    logging.warning(f"Line {line_no} of journal {journal_file} is incomplete; ignored")
+                    continue
+                entries[entry["game"]] = entry
+        return entries
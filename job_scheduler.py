@@ -0,0 +1,610 @@
+"""
+Scheduler that runs cluster jobs from one shared queue on a set of executors (remote hosts or this machine).
+
+Unlike cluster_manager's ClusterManager, which takes a fixed list of jobs and only returns when all of them are done,
+JobScheduler hands each result to a callback (in the calling thread) as soon as its job finishes. This allows, for
+example, to run the jobs of several contests on the same hosts at once and process each contest when its last
+job lands.
+
+Jobs are run by executors, each with a number of slots (jobs run at the same time):
+
+    - SSHExecutor: runs jobs in a remote host (one persistent ssh connection per slot, a sandbox folder per job).
+    - LocalExecutor: runs jobs in this machine, as LocalManager does.
+
+Results are the same (job.data, exit_code, result_out, result_err, job_secs_taken) tuples that ClusterManager returns.
+
+With speculative execution on, once no job is left in the queue, idle slots run a second copy of the job that has
+been running the longest (preferably in another executor), provided it has already taken longer than the average
+job. Whichever copy finishes first is kept and the other one is cancelled (killed). Each copy returns its files to
+its own local path, so only the files of the winning copy are moved into place. Games are run with a fixed random
+seed, so both copies play the same game.
+
+With adaptive slots (slot limits given for an executor), the no. of slots in use in each executor is not fixed: every
+LOAD_CHECK_INTERVAL secs the load average and free memory of its host are measured (over the ssh connection already
+open) and one slot is taken off if the host is overloaded, or given back (up to its max.) if it has room for another
+job, so games do not time out on hosts shared with other users, nor hosts sit idle when those users leave.
+
+With a calibration job, each executor first runs it (a fixed game) to measure its speed relative to the fastest
+executor, and executors slower than a min. speed are not used. Then, the faster an executor, the closer to the front
+of the queue its slots take jobs from, so when jobs are queued longest-first, the longest games go to the fastest
+hosts (and the shortest to the slowest ones).
+"""
+import os
+import time
+import uuid
+import queue
+import select
+import logging
+import threading
+import subprocess
+from collections import deque
+
+from cluster_manager.config import Job, TransferableFile
+
+from config import WORKER_STORE_DIR, CALIBRATION_MARK
+from local_manager import run_job, install_core_files, summarize_results
+from timing import Tracer
+
+MAX_JOB_ATTEMPTS = 3  # times a job is tried when its executor fails (not when the job itself fails)
+MAX_JOB_COPIES = 2  # copies of a job running at the same time, with speculative execution
+SPECULATION_CHECK_INTERVAL = 1  # secs between checks for stragglers by idle slots
+
+# adaptive slots: a host is overloaded if its load per CPU is above MAX_LOAD_PER_CPU or it has less free memory than
+# MIN_FREE_MEMORY_MB; it has room for one more job if it would still be under both limits with one more CPU busy
+LOAD_CHECK_INTERVAL = 30  # secs between measures of the load of the hosts
+MAX_LOAD_PER_CPU = 1.0
+MIN_FREE_MEMORY_MB = 512
+LOAD_COMMAND = "cat /proc/loadavg ; nproc ; grep MemAvailable /proc/meminfo"
+
+
+def parse_load(output):
+    """Parses the output of LOAD_COMMAND
+
+    Returns:
+        tuple: (load average of the last minute, no. of CPUs, free memory in MB)
+    """
+    lines = output.decode().splitlines()
+    return float(lines[0].split()[0]), int(lines[1]), int(lines[2].split()[1]) // 1024
+
+
+class LocalExecutor:
+    """Runs jobs in this machine, each in its own sandbox folder"""
+
+    def __init__(self, no_slots):
+        self.name = "localhost"
+        self.no_slots = no_slots
+
+    def setup(self, core_req_files):
+        install_core_files(core_req_files)
+
+    def run(self, job, cancel=None):
+        return run_job(job, cancel=cancel)
+
+    def measure_load(self):
+        return parse_load(subprocess.run(LOAD_COMMAND, shell=True, capture_output=True, check=True).stdout)
+
+    def close(self):
+        pass
+
+
+class SSHExecutor:
+    """Runs jobs in a remote host via ssh, each in its own sandbox folder /tmp/cluster_instance_xxxx
+
+    Each slot keeps its own ssh connection open across jobs, and every job is a new channel in it; files are
+    transferred with sftp over the same connection.
+    """
+
+    def __init__(self, host):
+        self.host = host
+        self.name = host.hostname
+        self.no_slots = host.no_cpu
+        self._local = threading.local()
+        self._clients = []
+        self._lock = threading.Lock()
+
+    def _get_client(self):
+        """Returns the (open) ssh connection of the calling slot, connecting it if needed"""
+        import paramiko
+
+        client = getattr(self._local, "client", None)
+        if client is not None and client.get_transport() is not None and client.get_transport().is_active():
+            return client
+
+        client = paramiko.SSHClient()
+        client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        client.connect(
+            hostname=self.host.hostname,
+            username=self.host.username,
+            password=self.host.password,
+            key_filename=self.host.key_filename,
+            passphrase=self.host.key_password,
+        )
+        self._local.client = client
+        with self._lock:
+            self._clients.append(client)
+        return client
+
+    def execute(self, command, cancel=None, client=None):
+        """Executes a shell command in the host
+
+        Args:
+            command (str): the shell command
+            cancel (threading.Event, optional): if given and set while running, stop waiting for the command
+            client (paramiko.SSHClient, optional): the ssh connection to use. Defaults to that of the calling slot.
+
+        Returns:
+            tuple: (exit_code, result_out, result_err), the outputs as bytes; exit_code is -1 if cancelled
+        """
+        channel = (client or self._get_client()).get_transport().open_session()
+        try:
+            channel.exec_command(command)
+            out, err = [], []
+            # read both streams as they come, so the remote command never blocks on a full channel window
+            while True:
+                if cancel is not None and cancel.is_set():
+                    return -1, b"".join(out), b"".join(err)
+                select.select([channel], [], [], 1.0)
+                while channel.recv_ready():
+                    out.append(channel.recv(1 << 16))
+                while channel.recv_stderr_ready():
+                    err.append(channel.recv_stderr(1 << 16))
+                if channel.exit_status_ready() and not channel.recv_ready() and not channel.recv_stderr_ready():
+                    break
+            exit_code = channel.recv_exit_status()
+        finally:
+            channel.close()
+        return exit_code, b"".join(out), b"".join(err)
+
+    def setup(self, core_req_files):
+        """Transfers the core files to the host; those in the content-addressed store are sent only if missing"""
+        if not core_req_files:
+            return
+        remote_dirs = sorted(set(os.path.dirname(f.remote_path) for f in core_req_files))
+        self.execute(f"mkdir -p {' '.join(remote_dirs)}")
+
+        sftp = self._get_client().open_sftp()
+        try:
+            stored = set(sftp.listdir(WORKER_STORE_DIR)) if WORKER_STORE_DIR in remote_dirs else set()
+            skipped_bytes = 0
+            for f in core_req_files:
+                if os.path.dirname(f.remote_path) == WORKER_STORE_DIR and os.path.basename(f.remote_path) in stored:
+                    skipped_bytes += os.path.getsize(f.local_path)
+                    continue
+                tmp_remote_path = f"{f.remote_path}.{uuid.uuid4().hex[:8]}"
+                sftp.put(f.local_path, tmp_remote_path)
+                sftp.posix_rename(tmp_remote_path, f.remote_path)
+            if skipped_bytes > 0:
+                logging.info(f"Host {self.name} already had {round(skipped_bytes / 2 ** 20, 2)} MB of core files")
+        finally:
+            sftp.close()
+
+    def run(self, job, cancel=None):
+        start_time = time.time()
+        sandbox = f"/tmp/cluster_instance_{uuid.uuid4().hex[:12]}"
+        client = self._get_client()
+
+        sftp = client.open_sftp()
+        try:
+            sftp.mkdir(sandbox)
+            for f in job.required_files:
+                sftp.put(f.local_path, os.path.join(sandbox, f.remote_path))
+
+            # the remote shell leads its own session (sshd makes it so), so its id allows to kill the whole job
+            exit_code, result_out, result_err = self.execute(f"cd {sandbox} ; echo $$ > .session ; {job.command}", cancel)
+            if cancel is not None and cancel.is_set():
+                self.execute(f"pkill -KILL -s $(cat {sandbox}/.session)")
+                return job.data, exit_code, result_out, result_err, time.time() - start_time
+
+            for f in job.return_files:
+                try:
+                    sftp.get(os.path.join(sandbox, f.remote_path), f.local_path)
+                except IOError as e:
+                    logging.error(f"File {f.remote_path} of job {job.id} could not be returned from {self.name}: {e}")
+        finally:
+            sftp.close()
+            self.execute(f"rm -rf {sandbox}")
+
+        return job.data, exit_code, result_out, result_err, time.time() - start_time
+
+    def measure_load(self):
+        """Returns (load average of the last minute, no. of CPUs, free memory in MB) of the host
+
+        The command runs in a new channel of a connection already open by a slot (if any), so no new connection is
+        made each time the load is measured.
+        """
+        with self._lock:
+            clients = [c for c in self._clients if c.get_transport() is not None and c.get_transport().is_active()]
+        exit_code, out, err = self.execute(LOAD_COMMAND, client=clients[0] if clients else None)
+        if exit_code != 0:
+            raise RuntimeError(err.decode())
+        return parse_load(out)
+
+    def close(self):
+        with self._lock:
+            for client in self._clients:
+                client.close()
+            self._clients = []
+
+
+def build_executors(hosts, local_workers=None):
+    """Builds the executors to run jobs: the local machine if local_workers is set, otherwise the given hosts"""
+    if local_workers:
+        return [LocalExecutor(local_workers)]
+    return [SSHExecutor(host) for host in hosts]
+
+
+class _JobRun:
+    """One copy of a job running in an executor"""
+
+    def __init__(self, job, attempt, executor):
+        self.job = job
+        self.attempt = attempt
+        self.executor = executor
+        self.start_time = time.time()
+        self.cancel = threading.Event()
+        self.job_copy = job
+
+
+class JobScheduler:
+    """Runs jobs from a shared queue on a set of executors, reporting each result as soon as its job finishes"""
+
+    def __init__(
+        self,
+        executors,
+        jobs,
+        core_req_files=None,
+        on_result=None,
+        speculative=False,
+        keep_outputs=True,
+        slot_limits=None,
+        calibration_job=None,
+        min_speed=None,
+        tracer=None,
+    ):
+        """
+        :param executors: list of executors (e.g., SSHExecutor, LocalExecutor) to run the jobs
+        :param jobs: list of Job to run, in order of submission
+        :param core_req_files: list of TransferableFile needed by all jobs (transferred once to each executor)
+        :param on_result: function called (in the thread calling start()) with the result tuple of each job
+        :param speculative: run second copies of straggler jobs in idle slots once the queue is empty
+        :param keep_outputs: keep the outputs of each job in the results returned; otherwise they are dropped right
+            after on_result, so memory does not grow with the no. of jobs
+        :param slot_limits: executor name -> (min, max) no. of slots, for executors whose slots adapt to the load of
+            their host; the others always use all their slots
+        :param calibration_job: Job run first in each executor to measure its speed; it must print a line with
+            CALIBRATION_MARK and the ms taken
+        :param min_speed: executors with a speed (relative to the fastest one) below this are not used
+        :param tracer: Tracer to time the setup (transfer of core files) and calibration of executors (see timing.py)
+        """
+        self.executors = executors
+        self.jobs = jobs
+        self.core_req_files = core_req_files
+        self.on_result = on_result
+        self.speculative = speculative
+        self.keep_outputs = keep_outputs
+        self.slot_limits = slot_limits or {}
+        self.calibration_job = calibration_job
+        self.min_speed = min_speed
+        self.tracer = tracer if tracer is not None else Tracer()
+        self.calibration = {}  # executor name -> {"secs": secs of calibration job, "speed": relative to fastest}
+
+        self._ready_executors = []
+        self._condition = threading.Condition()
+        self._jobs_queue = deque()  # (job, attempt) to run
+        self._running = {}  # job id -> list of _JobRun
+        self._last_copy = {}  # job id -> no. of its last copy started, retries included (suffix of its returned files)
+        self._finished = set()  # ids of jobs with a result
+        self._finished_secs = [0, 0]  # total secs and no. of jobs finished, to spot stragglers
+        self._closed = False
+        self._results_queue = queue.Queue()
+        self._active_slots = {}  # executor -> no. of slots that can run jobs now
+        self._busy_slots = {}  # executor -> no. of slots running jobs
+        self._stopped = threading.Event()
+        self._speed_ranks = {}  # executor -> 0 (fastest) to 1 (slowest), with calibration
+
+    def _setup_executors(self):
+        """Sets up all executors in parallel and returns those that are ready to run jobs"""
+        ready = []
+
+        def setup(executor):
+            try:
+                executor.setup(self.core_req_files)
+                ready.append(executor)
+                logging.info(f"Executor {executor.name} ready with {executor.no_slots} slots")
+            except Exception as e:
+                logging.error(f"Executor {executor.name} could not be set up and will not be used: {e}")
+
+        threads = [threading.Thread(target=setup, args=(executor,)) for executor in self.executors]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return ready
+
+    def _calibrate_executors(self, executors):
+        """Runs the calibration job in all executors in parallel and returns those fast enough to run jobs
+
+        The speed of each executor is the secs taken by the fastest one over the secs it took; executors where the
+        calibration job fails are not used either.
+        """
+        secs = {}
+
+        def calibrate(executor):
+            try:
+                _, exit_code, result_out, result_err, _ = executor.run(self.calibration_job)
+                for line in result_out.decode(errors="replace").splitlines():
+                    if line.startswith(CALIBRATION_MARK):
+                        secs[executor] = int(line[len(CALIBRATION_MARK):]) / 1000
+                        break
+                else:
+                    raise RuntimeError(f"exit code {exit_code}: {result_err.decode(errors='replace')[-500:]}")
+            except Exception as e:
+                logging.error(f"Executor {executor.name} could not be calibrated and will not be used: {e}")
+
+        threads = [threading.Thread(target=calibrate, args=(executor,)) for executor in executors]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        calibrated = []
+        for executor in executors:
+            if executor not in secs:
+                self.calibration[executor.name] = {"secs": None, "speed": None}
+                continue
+            speed = round(min(secs.values()) / secs[executor], 2) if secs[executor] > 0 else 1.0
+            self.calibration[executor.name] = {"secs": secs[executor], "speed": speed}
+            if self.min_speed is not None and speed < self.min_speed:
+                logging.warning(
+                    f"Executor {executor.name} took {secs[executor]} secs in the calibration game (speed {speed}), "
+                    f"below the min. speed {self.min_speed}; it will not be used"
+                )
+                continue
+            logging.info(f"Executor {executor.name} took {secs[executor]} secs in the calibration game (speed {speed})")
+            calibrated.append(executor)
+
+        calibrated.sort(key=lambda executor: self.calibration[executor.name]["speed"], reverse=True)
+        for i, executor in enumerate(calibrated):
+            self._speed_ranks[executor] = i / (len(calibrated) - 1) if len(calibrated) > 1 else 0
+        return calibrated
+
+    def _pop_job(self, executor):
+        """Takes the next job for a slot of executor out of the queue (called with the condition held)
+
+        Executors take jobs from the front of the queue, unless calibrated: then the slower they are, the further
+        back in the queue they take jobs from (the slowest executor, from the back).
+        """
+        i = round(self._speed_ranks.get(executor, 0) * (len(self._jobs_queue) - 1))
+        job, attempt = self._jobs_queue[i]
+        del self._jobs_queue[i]
+        return job, attempt
+
+    def _start_run(self, job, attempt, executor):
+        """Registers a new copy of job to run in executor (called with the condition held)"""
+        run = _JobRun(job, attempt, executor)
+        self._last_copy[job.id] = self._last_copy.get(job.id, 0) + 1
+        self._busy_slots[executor] += 1
+        if self.speculative:
+            # each copy returns its files to its own path; those of the copy that finishes first are moved into place
+            run.job_copy = Job(
+                command=job.command,
+                required_files=job.required_files,
+                return_files=[
+                    TransferableFile(local_path=f"{f.local_path}.copy{self._last_copy[job.id]}", remote_path=f.remote_path)
+                    for f in job.return_files
+                ],
+                data=job.data,
+                id=job.id,
+            )
+        self._running.setdefault(job.id, []).append(run)
+        return run
+
+    def _find_straggler(self, executor):
+        """Returns the run of the job running for longest that is worth a second copy in executor, if any"""
+        if self._finished_secs[1] == 0:
+            return None
+        min_secs = self._finished_secs[0] / self._finished_secs[1]
+        now = time.time()
+        candidates = [
+            runs[0]
+            for job_id, runs in self._running.items()
+            if len(runs) < MAX_JOB_COPIES  # copies running now (a job retried before may get a second copy too)
+            and now - runs[0].start_time > min_secs
+            and (runs[0].executor is not executor or len(self._ready_executors) == 1)
+        ]
+        if not candidates:
+            return None
+        straggler = min(candidates, key=lambda run: run.start_time)
+        logging.info(
+            f"Job {straggler.job.id} running for {round(now - straggler.start_time, 2)} secs in {straggler.executor.name} "
+            f"(average: {round(min_secs, 2)} secs); starting a second copy in {executor.name}"
+        )
+        return straggler
+
+    def _next_run(self, executor):
+        """Waits for the next job to run in a slot of executor; returns None when there is nothing left to run"""
+        with self._condition:
+            while not self._closed:
+                if self._busy_slots[executor] >= self._active_slots[executor]:  # slot not in use now (adaptive)
+                    self._condition.wait()
+                    continue
+                if self._jobs_queue:
+                    job, attempt = self._pop_job(executor)
+                    return self._start_run(job, attempt, executor)
+                if self.speculative:
+                    straggler = self._find_straggler(executor)
+                    if straggler is not None:
+                        return self._start_run(straggler.job, straggler.attempt, executor)
+                    self._condition.wait(SPECULATION_CHECK_INTERVAL)
+                else:
+                    self._condition.wait()
+            return None
+
+    def _end_run(self, run, result, error):
+        """Processes the end of a job copy: reports it if it is the first one to finish, and discards it otherwise"""
+        job = run.job
+        with self._condition:
+            self._busy_slots[run.executor] -= 1
+            self._running[job.id].remove(run)
+            other_runs = self._running[job.id]
+            if not other_runs:
+                del self._running[job.id]
+
+            if job.id in self._finished or run.cancel.is_set():
+                self._remove_copy_files(run)
+                return
+
+            if error is not None:
+                if other_runs:  # another copy is still running; let it finish the job
+                    logging.warning(f"Copy of job {job.id} failed in {run.executor.name}: {error}")
+                    return
+                if run.attempt < MAX_JOB_ATTEMPTS:
+                    logging.warning(f"Job {job.id} failed in {run.executor.name} (attempt {run.attempt}): {error}. Re-queued.")
+                    self._jobs_queue.appendleft((job, run.attempt + 1))
+                    self._condition.notify()
+                    return
+                logging.error(f"Job {job.id} failed in {run.executor.name} (attempt {run.attempt}): {error}. Giving up.")
+                result = (job.data, -1, b"", str(error).encode(), 0)
+
+            self._finished.add(job.id)
+            self._finished_secs[0] += result[4]
+            self._finished_secs[1] += 1
+            for other_run in other_runs:
+                other_run.cancel.set()
+            if run.job_copy is not job:
+                for f, f_copy in zip(job.return_files, run.job_copy.return_files):
+                    if os.path.exists(f_copy.local_path):
+                        os.replace(f_copy.local_path, f.local_path)
+            if other_runs:
+                logging.info(f"Job {job.id} finished first in {run.executor.name}; cancelling its other copy")
+        self._results_queue.put((job, run.executor, result))
+
+    def _adapt_slots(self, executor):
+        """Takes a slot off executor if its host is overloaded, or gives one back if it has room for another job"""
+        min_slots, max_slots = self.slot_limits[executor.name]
+        try:
+            load, no_cpus, free_memory_mb = executor.measure_load()
+        except Exception as e:
+            logging.warning(f"Load of {executor.name} could not be measured: {e}")
+            return
+
+        with self._condition:
+            active_slots = self._active_slots[executor]
+            if load > no_cpus * MAX_LOAD_PER_CPU or free_memory_mb < MIN_FREE_MEMORY_MB:
+                new_active_slots = max(active_slots - 1, min_slots)
+            elif (
+                load + 1 <= no_cpus * MAX_LOAD_PER_CPU
+                and free_memory_mb >= 2 * MIN_FREE_MEMORY_MB
+                and self._busy_slots[executor] == active_slots  # all in use, so another slot would be used
+            ):
+                new_active_slots = min(active_slots + 1, max_slots)
+            else:
+                new_active_slots = active_slots
+            if new_active_slots != active_slots:
+                logging.info(
+                    f"Executor {executor.name} has load {load} in {no_cpus} CPUs and {free_memory_mb} MB free: "
+                    f"slots changed from {active_slots} to {new_active_slots}"
+                )
+                self._active_slots[executor] = new_active_slots
+                self._condition.notify_all()
+
+    def _monitor_loop(self, executors):
+        """Adapts the slots of executors to the load of their hosts until all jobs are done"""
+        while not self._stopped.wait(LOAD_CHECK_INTERVAL):
+            for executor in executors:
+                self._adapt_slots(executor)
+
+    @staticmethod
+    def _remove_copy_files(run):
+        if run.job_copy is not run.job:
+            for f in run.job_copy.return_files:
+                if os.path.exists(f.local_path):
+                    os.remove(f.local_path)
+
+    def _slot_loop(self, executor):
+        """Runs jobs in executor until there is nothing left to run"""
+        while True:
+            run = self._next_run(executor)
+            if run is None:
+                return
+            result, error = None, None
+            try:
+                result = executor.run(run.job_copy, run.cancel)
+            except Exception as e:
+                error = e
+                time.sleep(1)
+            self._end_run(run, result, error)
+
+    def start(self):
+        """Runs all the jobs and waits for them to finish, calling on_result for each result as it arrives
+
+        Returns:
+            tuple: (results, no_successful_job, avg_time, max_time) as ClusterManager does; times in seconds
+        """
+        with self.tracer.span("setup_executors"):
+            self._ready_executors = self._setup_executors()
+        if self.calibration_job is not None:
+            with self.tracer.span("calibrate_executors"):
+                self._ready_executors = self._calibrate_executors(self._ready_executors)
+        if not self._ready_executors and any(job.command for job in self.jobs):
+            raise RuntimeError("No executor available to run the jobs")
+
+        # jobs with no command (e.g., games restored) need no executor
+        pending = 0
+        for job in self.jobs:
+            if job.command:
+                self._jobs_queue.append((job, 1))
+            else:
+                self._results_queue.put((job, None, (job.data, 0, b"", b"", 0)))
+            pending += 1
+
+        # adaptive executors get one thread per slot they may ever use; only the active slots take jobs
+        slots = []
+        for executor in self._ready_executors:
+            no_threads = executor.no_slots
+            self._active_slots[executor] = executor.no_slots
+            if executor.name in self.slot_limits:
+                min_slots, max_slots = self.slot_limits[executor.name]
+                no_threads = max_slots
+                self._active_slots[executor] = min(max(executor.no_slots, min_slots), max_slots)
+            self._busy_slots[executor] = 0
+            slots += [
+                threading.Thread(target=self._slot_loop, args=(executor,), daemon=True) for _ in range(no_threads)
+            ]
+        for t in slots:
+            t.start()
+
+        adaptive_executors = [executor for executor in self._ready_executors if executor.name in self.slot_limits]
+        if adaptive_executors:
+            threading.Thread(target=self._monitor_loop, args=(adaptive_executors,), daemon=True).start()
+
+        logging.info(f"Running {pending} jobs in {len(slots)} slots of {len(self._ready_executors)} executors")
+        results = []
+        try:
+            while pending > 0:
+                job, executor, result = self._results_queue.get()
+                pending -= 1
+                if executor is not None:
+                    logging.info(
+                        f"Job {job.id} finished in {executor.name} with exit code {result[1]} in {round(result[4], 2)} secs ({len(results) + 1}/{len(self.jobs)})"
+                    )
+                if self.on_result is not None:
+                    self.on_result(result)
+                if not self.keep_outputs:
+                    data, exit_code, _, _, secs_taken = result
+                    result = (data, exit_code, b"", b"", secs_taken)
+                results.append(result)
+        finally:
+            self._stopped.set()
+            with self._condition:
+                self._closed = True
+                for runs in self._running.values():
+                    for run in runs:
+                        run.cancel.set()
+                self._condition.notify_all()
+            for t in slots:
+                t.join()
+            for executor in self._ready_executors:
+                executor.close()
+
+        return (results,) + summarize_results(results)
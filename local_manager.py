@@ -0,0 +1,146 @@
+"""
+Runs cluster jobs in the local machine, with a pool of worker processes, instead of sending them to hosts via ssh.
+
+LocalManager offers the same interface as cluster_manager's ClusterManager (build it with the jobs and then start()
+it to get the results), so a contest can be run in a single host without paramiko, ssh connections, or file
+transfers: each job runs its command in its own sandbox folder (as it would in a worker host) and the files to
+return are moved, not copied, to their local destination.
+"""
+import os
+import time
+import shutil
+import signal
+import logging
+import tempfile
+import subprocess
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+CANCEL_CHECK_INTERVAL = 0.5  # secs between checks of whether a cancellable job has been cancelled
+
+
+def run_job(job, sandbox_root=None, cancel=None):
+    """Runs a job in a fresh sandbox folder and collects its return files
+
+    Args:
+        job (Job): the job to run; remote paths are relative to the sandbox folder
+        sandbox_root (str, optional): folder where to create the sandbox. Defaults to the system temp folder.
+        cancel (threading.Event, optional): if given and set while running, the job is killed (and no file returned)
+
+    Returns:
+        tuple: (job.data, exit_code, result_out, result_err, job_secs_taken), as ClusterManager does
+    """
+    if not job.command:  # e.g., a game restored from a previous run
+        return job.data, 0, b"", b"", 0
+
+    start_time = time.time()
+    sandbox = tempfile.mkdtemp(prefix="cluster_instance_", dir=sandbox_root)
+    try:
+        for f in job.required_files:
+            remote_path = os.path.join(sandbox, f.remote_path)
+            os.makedirs(os.path.dirname(remote_path), exist_ok=True)
+            shutil.copy(f.local_path, remote_path)
+
+        if cancel is None:
+            process = subprocess.run(job.command, shell=True, cwd=sandbox, capture_output=True)
+            returncode, result_out, result_err = process.returncode, process.stdout, process.stderr
+        else:
+            returncode, result_out, result_err = _run_cancellable(job.command, sandbox, cancel)
+            if cancel.is_set():
+                return job.data, returncode, result_out, result_err, time.time() - start_time
+
+        for f in job.return_files:
+            remote_path = os.path.join(sandbox, f.remote_path)
+            if os.path.exists(remote_path):
+                shutil.move(remote_path, f.local_path)
+            else:
+                logging.error(f"File {f.remote_path} to return not produced by job {job.id}")
+    finally:
+        shutil.rmtree(sandbox, ignore_errors=True)
+
+    return job.data, returncode, result_out, result_err, time.time() - start_time
+
+
+def _run_cancellable(command, cwd, cancel):
+    """Runs a shell command in its own session, killing it (and all its processes) as soon as cancel is set"""
+    process = subprocess.Popen(
+        command, shell=True, cwd=cwd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, start_new_session=True
+    )
+    while True:
+        try:
+            result_out, result_err = process.communicate(timeout=CANCEL_CHECK_INTERVAL)
+            break
+        except subprocess.TimeoutExpired:
+            if cancel.is_set():
+                try:
+                    os.killpg(process.pid, signal.SIGKILL)
+                except ProcessLookupError:
+                    pass
+                result_out, result_err = process.communicate()
+                break
+    return process.returncode, result_out, result_err
+
+
+def install_core_files(core_req_files):
+    """Makes the core files available at their "remote" path in this machine, via symlinks (no copy)"""
+    for f in core_req_files or []:
+        local_path = os.path.abspath(f.local_path)
+        if os.path.abspath(f.remote_path) == local_path:
+            continue
+        os.makedirs(os.path.dirname(os.path.abspath(f.remote_path)), exist_ok=True)
+        tmp_link = f"{f.remote_path}.{os.getpid()}"
+        os.symlink(local_path, tmp_link)
+        os.replace(tmp_link, f.remote_path)
+
+
+def summarize_results(results):
+    """Returns (no_successful_job, avg_time, max_time) of a list of job results; times in seconds"""
+    times = [secs for (_, exit_code, _, _, secs) in results if exit_code == 0]
+    no_successful_job = len(times)
+    avg_time = round(sum(times) / no_successful_job, 2) if no_successful_job > 0 else 0
+    max_time = round(max(times), 2) if times else 0
+    return no_successful_job, avg_time, max_time
+
+
+class LocalManager:
+    """Runs a list of jobs with a pool of local worker processes; drop-in replacement for ClusterManager"""
+
+    def __init__(self, no_workers, jobs, core_req_files=None, on_result=None):
+        """
+        :param no_workers: no. of jobs to run at the same time
+        :param jobs: list of Job to run
+        :param core_req_files: list of TransferableFile needed by all jobs (made available once, before any job)
+        :param on_result: function called with the result tuple of each job as soon as it finishes
+        """
+        self.no_workers = no_workers
+        self.jobs = jobs
+        self.core_req_files = core_req_files
+        self.on_result = on_result
+
+    def start(self):
+        """Runs all the jobs and waits for them to finish
+
+        Returns:
+            tuple: (results, no_successful_job, avg_time, max_time) where results is the list of
+                (job.data, exit_code, result_out, result_err, job_secs_taken), one per job, and times are in seconds
+        """
+        install_core_files(self.core_req_files)
+
+        logging.info(f"Running {len(self.jobs)} jobs locally with {self.no_workers} worker processes")
+        results = []
+        with ProcessPoolExecutor(max_workers=self.no_workers) as executor:
+            futures = {executor.submit(run_job, job): job for job in self.jobs}
+            for future in as_completed(futures):
+                job = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    logging.error(f"Job {job.id} could not be run: {e}")
+                    result = (job.data, -1, b"", str(e).encode(), 0)
+                results.append(result)
+                logging.info(
+                    f"Job {job.id} finished with exit code {result[1]} in {round(result[4], 2)} secs ({len(results)}/{len(self.jobs)})"
+                )
+                if self.on_result is not None:
+                    self.on_result(result)
+
+        return (results,) + summarize_results(results)
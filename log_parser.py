@@ -0,0 +1,292 @@
+"""
+Parser of the logs of games (the output of capture.py), to get their outcome in a single pass over each log.
+
+The lines that tell the outcome of a game are found by one compiled pattern of their keywords, scanned once over the
+log:
+
+    - signs of a bug: "Traceback", "agent crashed", "<Red|Blue> team failed to load!", "<red|blue>Agents = loadAgents"
+    - outcome: "... wins by <n> points", "The <Red|Blue> team has returned at least <n> ...", "Tie game"
+    - "Total Time Game: <secs>"
+
+and only those lines are then looked into, in order, to work out the outcome exactly as ContestRunner did before with
+one str.find() per sign over the whole log and then a pass over all its lines.
+
+Logs of chatty agents can be of many MB, so parse_game_logs() parses a batch of log files in a pool of processes,
+each one reading its logs itself (only the outcomes travel back). See extras/benchmark_log_parser.py.
+
+The outcome lines are printed by capture.py at the very end of the log, so log files can also be parsed in tail mode:
+only their last TAIL_BYTES are read and parsed. The whole log is parsed only if its tail has a sign of a bug (to tell
+which team crashed, as the full parse does) or no outcome at all, and then it is read in chunks of STREAM_CHUNK_BYTES,
+so memory stays bounded even for logs of 100s of MB. Unlike the full parse, a Traceback printed by an agent that then
+goes on playing (e.g., one it caught itself) does not make the game count as crashed in tail mode.
+
+Engines that write the result file of each game (result-0.json, next to replay-0; see saveResult() in capture.py)
+need no parsing at all: parse_game_result_file() reads the outcome from it. Logs are then only parsed for games with
+no (valid) result file, e.g., those played by older engines. The outcome is the same as the parse of the log, but for
+bugs: in the result file, only a team that failed to load or an agent that crashed (or timed out) as recorded by the
+engine is a bug, blamed on its team; a Traceback in the log is not (e.g., one caught and printed by an agent), while
+the parse of the log takes it as a bug and blames it on the blue team, unless a red agent crashed. Games restored from
+the result cache bring their result file, so they get the same outcome as when played.
+"""
+import os
+import re
+import json
+import logging
+import functools
+from concurrent.futures import ProcessPoolExecutor
+
+from config import ERROR_SCORE
+
+# keywords of the lines that tell the outcome; grouped by first letter, so fewer branches are tried at each position
+_OUTCOME_KEYWORDS = re.compile(
+    r"T(?:raceback|ie [Gg]ame|otal Time Game: )"
+    r"|a(?:gent crashed)"
+    r"|t(?:eam failed to load!)"
+    r"|A(?:gents = loadAgents)"
+    r"|w(?:ins by)"
+    r"|h(?:as returned at least )"
+)
+
+CHUNK_SIZE = 16  # logs sent at once to each process of the pool
+TAIL_BYTES = 8 * 1024  # bytes at the end of a log read in tail mode
+STREAM_CHUNK_BYTES = 1024 * 1024  # bytes read at once when a whole log file is parsed in chunks
+MAX_LINE_BYTES = 64 * 1024  # longer lines (chatty agents) are cut when parsed in chunks; only their end is kept
+
+
+class _Outcome:
+    """The outcome of a game, worked out as the text of its log is scanned (in one go or in pieces of whole lines)"""
+
+    def __init__(self):
+        self.bug = False
+        self.red_crashed = False  # the red team crashed or failed to load
+        self.red_failed_to_load = False
+        self.blue_failed_to_load = False
+        self.score = 0
+        self.winner = None  # "Red", "Blue", or None
+        self.tied = False
+        self.total_time = 0
+
+    def scan(self, text):
+        """Looks into the lines of text with keywords of the outcome, in order (text must be whole lines)"""
+        last_line_start = -1
+        for match in _OUTCOME_KEYWORDS.finditer(text):
+            line_start = text.rfind("\n", 0, match.start()) + 1
+            if line_start == last_line_start:  # all keywords in a line are looked for at once
+                continue
+            last_line_start = line_start
+            line_end = text.find("\n", match.end())
+            self._look_into(text[line_start:] if line_end == -1 else text[line_start:line_end])
+
+    def _look_into(self, line):
+        # signs of a bug
+        if line.find("Traceback") != -1 or line.find("agent crashed") != -1:
+            self.bug = True
+        if line.find("Red team failed to load!") != -1:
+            self.red_failed_to_load = True
+        if line.find("Blue team failed to load!") != -1:
+            self.blue_failed_to_load = True
+        if (
+            line.find("Red agent crashed") != -1
+            or line.find("redAgents = loadAgents") != -1
+            or line.find("Red team failed to load!") != -1
+        ):
+            self.red_crashed = True
+
+        # outcome (only used if there was no bug)
+        if line.find("wins by") != -1:
+            try:
+                self.score = abs(int(line.split("wins by")[1].split("points")[0]))
+            except ValueError:  # e.g., printed by an agent
+                return
+            if line.find("Red") != -1:
+                self.winner = "Red"
+            elif line.find("Blue") != -1:
+                self.winner = "Blue"
+        if line.find("The Blue team has returned at least ") != -1:
+            self.score = abs(int(line.split("The Blue team has returned at least ")[1].split(" ")[0]))
+            self.winner = "Blue"
+        elif line.find("The Red team has returned at least ") != -1:
+            self.score = abs(int(line.split("The Red team has returned at least ")[1].split(" ")[0]))
+            self.winner = "Red"
+        elif line.find("Tie Game") != -1 or line.find("Tie game") != -1:
+            self.winner = None
+            self.tied = True
+
+        if line.find("Total Time Game: ") != -1:
+            self.total_time = int(float(line.split("Total Time Game: ")[1].split(" ")[0]))
+
+    def is_known(self):
+        """Whether the outcome is known without a bug to classify"""
+        return not self.bug and (self.winner is not None or self.tied)
+
+    def result(self, red_team_name, blue_team_name, layout, log_description):
+        """Returns (score, winner, loser, bug, total_time), as parse_game_log()"""
+        if self.bug:  # a Traceback or a crashed agent in the log
+            if self.red_failed_to_load and self.blue_failed_to_load:  # both teams failed to load: no one wins
+                return ERROR_SCORE, None, None, True, 0
+            if self.red_crashed:
+                return 1, blue_team_name, red_team_name, True, 0
+            # any other crash is blamed on the blue team
+            return 1, red_team_name, blue_team_name, True, 0
+
+        # signal strange case where script was unable to find outcome of game - should never happen!
+        if self.winner is None and not self.tied:
+            logging.error(
+                f"Note able to successfully parse output for game {red_team_name} vs {blue_team_name} in {layout}: \n {log_description} \n =====================================")
+            return -1, None, None, False, self.total_time
+
+        if self.winner == "Red":
+            return self.score, red_team_name, blue_team_name, False, self.total_time
+        if self.winner == "Blue":
+            return self.score, blue_team_name, red_team_name, False, self.total_time
+        return self.score, None, None, False, self.total_time
+
+
+def parse_game_log(output, red_team_name, blue_team_name, layout):
+    """Parses the log of a game to get its outcome
+
+    Args:
+        output (str or bytes): the log of the game
+        red_team_name (str): name of the red team
+        blue_team_name (str): name of the blue team
+        layout (str): layout of the game (only to report logs that cannot be parsed)
+
+    Returns:
+        tuple: (score, winner, loser, bug, total_time); if bug, the loser (or both teams, if score is ERROR_SCORE and
+            there is no winner) had an error
+    """
+    if isinstance(output, bytes):
+        output = output.decode(errors="replace")
+    outcome = _Outcome()
+    outcome.scan(output)
+    return outcome.result(red_team_name, blue_team_name, layout, output)
+
+
+def _scan_in_chunks(f, outcome):
+    """Scans a (binary) log file from its current position in chunks of whole lines, with bounded memory"""
+    carry = b""  # incomplete last line of the previous chunk
+    while True:
+        chunk = f.read(STREAM_CHUNK_BYTES)
+        if not chunk:
+            break
+        chunk = carry + chunk
+        last_newline = chunk.rfind(b"\n")
+        if last_newline == -1:  # a line longer than the chunk: keep (only) its end
+            carry = chunk[-MAX_LINE_BYTES:]
+            continue
+        outcome.scan(chunk[: last_newline + 1].decode(errors="replace"))
+        carry = chunk[last_newline + 1:][-MAX_LINE_BYTES:]
+    outcome.scan(carry.decode(errors="replace"))
+
+
+def parse_game_log_file(log_file, red_team_name, blue_team_name, layout, tail=False):
+    """Parses the log file of a game (see parse_game_log()); a log that cannot be read is parsed as empty
+
+    Args:
+        log_file (str): the log file of the game
+        red_team_name (str): name of the red team
+        blue_team_name (str): name of the blue team
+        layout (str): layout of the game
+        tail (bool, optional): parse only the end of the log, unless needed (see tail mode above). Defaults to False.
+
+    Returns:
+        tuple: (score, winner, loser, bug, total_time), as parse_game_log()
+    """
+    if not tail:
+        try:
+            with open(log_file, "r", errors="replace") as f:
+                output = f.read()
+        except OSError:
+            logging.error(f"Unable to read log file {log_file}")
+            output = ""
+        return parse_game_log(output, red_team_name, blue_team_name, layout)
+
+    outcome = _Outcome()
+    try:
+        with open(log_file, "rb") as f:
+            size = f.seek(0, os.SEEK_END)
+            f.seek(max(size - TAIL_BYTES, 0))
+            tail_text = f.read().decode(errors="replace")
+            if size > TAIL_BYTES:  # the first line of the tail is not whole
+                tail_text = tail_text[tail_text.find("\n") + 1:]
+            outcome.scan(tail_text)
+            if size > TAIL_BYTES and not outcome.is_known():  # a crash to classify, or no outcome: parse it all
+                outcome = _Outcome()
+                f.seek(0)
+                _scan_in_chunks(f, outcome)
+    except OSError:
+        logging.error(f"Unable to read log file {log_file}")
+    return outcome.result(red_team_name, blue_team_name, layout, f"(log file {log_file})")
+
+
+def parse_game_result(result, red_team_name, blue_team_name):
+    """Gets the outcome of a game from its result, as written by capture.py in result-0.json
+
+    Only the teams that failed to load and the agents that crashed (or timed out) make a bug; unlike the parse of the
+    log (see _Outcome.result()), other Tracebacks (e.g., caught by an agent) are not taken as a crash of the blue team.
+
+    Args:
+        result (dict): the result of the game
+        red_team_name (str): name of the red team
+        blue_team_name (str): name of the blue team
+
+    Returns:
+        tuple: (score, winner, loser, bug, total_time), as parse_game_log()
+    """
+    red_failed_to_load, blue_failed_to_load = result["failed_to_load"]
+    if red_failed_to_load or blue_failed_to_load or any(result["crashed"]):
+        if red_failed_to_load and blue_failed_to_load:  # both teams failed to load: no one wins
+            return ERROR_SCORE, None, None, True, 0
+        red_crashed = red_failed_to_load or any(result["crashed"][0::2])  # red agents have even indexes
+        if red_crashed:
+            return 1, blue_team_name, red_team_name, True, 0
+        return 1, red_team_name, blue_team_name, True, 0
+
+    total_time = int(round(result["wall_time"]))
+    # the score of a win by returning food is the food needed to win (as printed in the log)
+    score = int(result["food_to_win"]) if result["won_by_food"] else abs(result["score"])
+    if result["winner"] == "Red":
+        return score, red_team_name, blue_team_name, False, total_time
+    if result["winner"] == "Blue":
+        return score, blue_team_name, red_team_name, False, total_time
+    return 0, None, None, False, total_time
+
+
+def parse_game_result_file(result_file, red_team_name, blue_team_name):
+    """Gets the outcome of a game from its result file (see parse_game_result())
+
+    Args:
+        result_file (str): the result file of the game
+        red_team_name (str): name of the red team
+        blue_team_name (str): name of the blue team
+
+    Returns:
+        tuple: (score, winner, loser, bug, total_time), as parse_game_log(); None if there is no valid result file
+            (e.g., an older engine that does not write it, or a game that crashed the engine), so the log is parsed
+    """
+    try:
+        with open(result_file, "r") as f:
+            return parse_game_result(json.load(f), red_team_name, blue_team_name)
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+
+def _parse_game_log_file(args, tail=False):
+    return parse_game_log_file(*args, tail=tail)
+
+
+def parse_game_logs(games, no_workers=None, tail=False):
+    """Parses the log files of a batch of games in a pool of processes
+
+    Args:
+        games (list): (log_file, red_team_name, blue_team_name, layout) of each game
+        no_workers (int, optional): no. of processes. Defaults to the no. of CPUs.
+        tail (bool, optional): parse the log files in tail mode (see parse_game_log_file()). Defaults to False.
+
+    Returns:
+        list(tuple): (score, winner, loser, bug, total_time) of each game, in the same order
+    """
+    if len(games) <= 1:
+        return [parse_game_log_file(*game, tail=tail) for game in games]
+    with ProcessPoolExecutor(max_workers=min(no_workers or os.cpu_count(), len(games))) as executor:
+        return list(executor.map(functools.partial(_parse_game_log_file, tail=tail), games, chunksize=CHUNK_SIZE))
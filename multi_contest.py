@@ -1,4 +1,5 @@
 import copy
+import hashlib
 import shutil
 from typing import List
 import zipfile
@@ -16,18 +17,21 @@ from config import (
     TMP_DIR,
     TMP_CONTEST_DIR,
     DIR_SCRIPT,
+    DIR_WORKER,
     CONTEST_ZIP_FILE,
     STAFF_TEAM_FILENAME_PATTERN,
     SUBMISSION_FILENAME_PATTERN,
     DEFAULT_CONFIG_FILE,
     CORE_CONTEST_TEAM_ZIP_FILE,
-    TIMEZONE
+    TIMEZONE,
+    PYCACHE_DIR,
 )
 
 from string import ascii_lowercase
 
 from config import *
 from contest_runner import ContestRunner
+from timing import Tracer, traced
 
 
 def list_partition(list_in, n):
@@ -36,6 +40,63 @@ def list_partition(list_in, n):
     return [list_in[i::n] for i in range(n)]
 
 
+def file_hash(file_path, block_size=1 << 20):
+    """returns the (short) SHA-256 hex digest of the content of a file"""
+    sha = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            sha.update(block)
+    return sha.hexdigest()[:16]
+
+
+def dir_hash(src_dir, exclude=()):
+    """returns the (short) SHA-256 hex digest of the content of a folder (relative paths and contents of its files)
+
+    Compiled Python files (in __pycache__ folders) are left out, as they change whenever the code is compiled again.
+
+    Args:
+        src_dir (str): the folder
+        exclude (tuple, optional): names of top-level entries of src_dir to leave out. Defaults to ().
+    """
+    sha = hashlib.sha256()
+    for root, dirs, files in os.walk(src_dir):
+        if root == src_dir:
+            dirs[:] = [d for d in dirs if d not in exclude]
+            files = [f for f in files if f not in exclude]
+        dirs[:] = sorted(d for d in dirs if d != PYCACHE_DIR)
+        for file_name in sorted(files):
+            file_path = os.path.join(root, file_name)
+            sha.update(os.path.relpath(file_path, src_dir).encode() + b"\0")
+            sha.update(file_hash(file_path).encode())
+    return sha.hexdigest()[:16]
+
+
+def deterministic_zip(src_dir, zip_path, exclude=()):
+    """Zips the content of src_dir so that the same content always gives the same zip file (and hash)
+
+    Files are added in sorted order, with a fixed timestamp and only their permission bits. Compiled Python files (in
+    __pycache__ folders) are left out, as in dir_hash().
+
+    Args:
+        src_dir (str): the folder to zip
+        zip_path (str): the zip file to create
+        exclude (tuple, optional): names of top-level entries of src_dir to leave out. Defaults to ().
+    """
+    with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED) as zf:
+        for root, dirs, files in os.walk(src_dir):
+            if root == src_dir:
+                dirs[:] = [d for d in dirs if d not in exclude]
+                files = [f for f in files if f not in exclude]
+            dirs[:] = sorted(d for d in dirs if d != PYCACHE_DIR)
+            for file_name in sorted(files):
+                file_path = os.path.join(root, file_name)
+                info = zipfile.ZipInfo(os.path.relpath(file_path, src_dir), date_time=(1980, 1, 1, 0, 0, 0))
+                info.external_attr = (os.stat(file_path).st_mode & 0o777) << 16
+                info.compress_type = zipfile.ZIP_DEFLATED
+                with open(file_path, "rb") as f:
+                    zf.writestr(info, f.read())
+
+
 def get_agent_factory(team_name):
     """returns the agent factory for a given team"""
     return os.path.join(TEAMS_SUBDIR, team_name, AGENT_FILE_NAME)
@@ -47,6 +108,7 @@ class MultiContest:
         self.split = settings["split"]
         self.settings = settings
         self.team_names = None
+        self.tracer = Tracer()  # times the phases of the setup, reported with those of each contest (see timing.py)
 
         if not os.path.exists(os.path.join(DIR_SCRIPT, CONTEST_ZIP_FILE)):
             logging.error(
@@ -105,45 +167,63 @@ class MultiContest:
         self.staff_teams = []
         self.submission_times = {}
 
-        # settings["teams_roots"] is a list of folders
-        for team_root in settings["teams_roots"]:
-            for submission_file in os.listdir(team_root):
-                submission_path = os.path.join(team_root, submission_file)
-                if submission_file.endswith(".zip") or os.path.isdir(submission_path):
-                    self._setup_team(
-                        submission_path,
-                        teams_dir,
-                        is_staff_team=False,
-                    )
-
-        # Include staff teams if available (ones with pattern STAFF_TEAM_FILENAME_PATTERN)
-        if settings["include_staff_team"]:
-            for staff_teams_root in settings["staff_teams_roots"]:
-                for staff_team_path in os.listdir(staff_teams_root):
-                    match = re.match(
-                        STAFF_TEAM_FILENAME_PATTERN,
-                        os.path.basename(staff_team_path),
-                    )
-                    if match:
-                        submission_path = os.path.join(
-                            staff_teams_root, staff_team_path
+        with self.tracer.span("setup_teams") as span:
+            # settings["teams_roots"] is a list of folders
+            for team_root in settings["teams_roots"]:
+                for submission_file in os.listdir(team_root):
+                    submission_path = os.path.join(team_root, submission_file)
+                    if submission_file.endswith(".zip") or os.path.isdir(submission_path):
+                        self._setup_team(
+                            submission_path,
+                            teams_dir,
+                            is_staff_team=False,
                         )
-                        if staff_team_path.endswith(".zip") or os.path.isdir(
-                            submission_path
-                        ):
-                            self._setup_team(
-                                submission_path,
-                                teams_dir,
-                                ignore_file_name_format=True,
-                                is_staff_team=True,
-                            )
 
-        # zip directory for transfer to remote workers; zip goes into temp directory
-        shutil.make_archive(
-            os.path.join(TMP_DIR, CORE_CONTEST_TEAM_ZIP_FILE[:-4]),
-            "zip",
-            self.tmp_contest_dir,
-        )
+            # Include staff teams if available (ones with pattern STAFF_TEAM_FILENAME_PATTERN)
+            if settings["include_staff_team"]:
+                for staff_teams_root in settings["staff_teams_roots"]:
+                    for staff_team_path in os.listdir(staff_teams_root):
+                        match = re.match(
+                            STAFF_TEAM_FILENAME_PATTERN,
+                            os.path.basename(staff_team_path),
+                        )
+                        if match:
+                            submission_path = os.path.join(
+                                staff_teams_root, staff_team_path
+                            )
+                            if staff_team_path.endswith(".zip") or os.path.isdir(
+                                submission_path
+                            ):
+                                self._setup_team(
+                                    submission_path,
+                                    teams_dir,
+                                    ignore_file_name_format=True,
+                                    is_staff_team=True,
+                                )
+            span.count("teams", len(self.teams) + len(self.staff_teams))
+
+        # teams that fail to load in a short game vs the baseline team forfeit all their games (not played); the
+        # smoke test is run as jobs in the workers, once the contests are created (see ContestRunner.smoke_test_teams)
+        self.settings["failed_teams"] = []
+
+        with self.tracer.span("hash_code"):
+            # hashes of the code of each team and of the engine, which identify games across contests
+            # (e.g., to take them from the result cache, or to reuse them in an incremental contest)
+            self.settings["engine_hash"] = dir_hash(self.tmp_contest_dir, exclude=(TEAMS_SUBDIR,))
+            self.settings["team_hashes"] = {team: dir_hash(os.path.join(teams_dir, team)) for team in os.listdir(teams_dir)}
+
+        if settings["delta_sync"]:
+            # bundle sent as pieces (engine + one per team); the hash of its manifest identifies it in the workers
+            self.settings["bundle_pieces"], self.settings["bundle_hash"] = self._build_bundle_pieces()
+        else:
+            with self.tracer.span("zip_bundle") as span:
+                # zip directory for transfer to remote workers; zip goes into temp directory
+                # (deterministic, so the same contest and teams give the same bundle hash, reused in the workers)
+                deterministic_zip(self.tmp_contest_dir, os.path.join(TMP_DIR, CORE_CONTEST_TEAM_ZIP_FILE))
+                # the hash identifies the bundle in the workers, where it is unpacked once and shared by all games/splits
+                self.settings["bundle_pieces"] = None
+                self.settings["bundle_hash"] = file_hash(os.path.join(TMP_DIR, CORE_CONTEST_TEAM_ZIP_FILE))
+                span.count("bytes", os.path.getsize(os.path.join(TMP_DIR, CORE_CONTEST_TEAM_ZIP_FILE)))
 
     def create_contests(self) -> List[ContestRunner]:
         """Builds a list of ContestRunner objects, one per split contest
@@ -181,7 +261,7 @@ class MultiContest:
             settings["contest_timestamp_id"] = (
                 f"{self.contest_timestamp_id}-{ascii_lowercase[i]}"
             )
-            contests.append(ContestRunner(settings))
+            contests.append(ContestRunner(settings, setup_tracer=self.tracer))
 
         return contests
 
@@ -201,6 +281,7 @@ class MultiContest:
         else:
             return list_partition(self.teams, self.split)
 
+    @traced("prepare_platform")
     def _prepare_platform(
         self,
         contest_zip_file_path,
@@ -228,6 +309,11 @@ class MultiContest:
         layouts_zip_file = zipfile.ZipFile(layouts_zip_file_path)
         layouts_zip_file.extractall(os.path.join(destination, "layouts"))
 
+        # worker-side scripts (e.g., game server) go next to capture.py
+        for worker_file in os.listdir(DIR_WORKER):
+            if worker_file.endswith(".py"):
+                shutil.copy(os.path.join(DIR_WORKER, worker_file), destination)
+
         # Pick no_fixed_layouts layouts from the given set in the layout zip file
         #   if layout seeds have been given use them
         layouts_available = set(
@@ -277,6 +363,47 @@ class MultiContest:
         while len(self.layouts) < no_random_layouts + no_fixed_layouts:
             self.layouts.add("RANDOM%s" % str(random.randint(1, 9999)))
 
+    @traced("build_bundle_pieces")
+    def _build_bundle_pieces(self):
+        """Splits the contest folder (system + teams) into pieces to be sent to the workers' content-addressed store
+
+        There is one piece for the engine (all but the teams) and one per team, each a deterministic zip named by
+        its hash, so unchanged pieces keep their name across runs and are not sent again to workers that have them.
+        A script to assemble the bundle from its pieces (in the workers) is also generated.
+
+        Returns:
+            tuple: list of pieces as (hash, folder where it goes in the bundle), and hash of the whole bundle
+        """
+        pieces_dir = os.path.join(TMP_DIR, TMP_PIECES_DIR)
+        if os.path.exists(pieces_dir):
+            shutil.rmtree(pieces_dir)
+        os.makedirs(pieces_dir)
+
+        teams_dir = os.path.join(self.tmp_contest_dir, TEAMS_SUBDIR)
+        sources = [(self.tmp_contest_dir, ".", (TEAMS_SUBDIR,))] + [
+            (os.path.join(teams_dir, team), os.path.join(TEAMS_SUBDIR, team), ())
+            for team in sorted(os.listdir(teams_dir))
+        ]
+        pieces = []
+        for src_dir, bundle_path, exclude in sources:
+            piece_file = os.path.join(pieces_dir, "piece.zip")
+            deterministic_zip(src_dir, piece_file, exclude)
+            piece_hash = file_hash(piece_file)
+            os.replace(piece_file, os.path.join(pieces_dir, f"{piece_hash}.zip"))
+            pieces.append((piece_hash, bundle_path))
+
+        # script (run in the workers) to assemble the bundle into the folder given; its hash identifies the bundle
+        script = "#!/bin/sh\n# assembles a contest bundle into folder $1 from its pieces in the store\nset -e\n"
+        for piece_hash, bundle_path in pieces:
+            script += f'mkdir -p "$1/{bundle_path}"\n'
+            script += f'unzip -q -o {os.path.join(WORKER_STORE_DIR, piece_hash)}.zip -d "$1/{bundle_path}"\n'
+        bundle_hash = hashlib.sha256(script.encode()).hexdigest()[:16]
+        with open(os.path.join(pieces_dir, f"{bundle_hash}.sh"), "w") as f:
+            f.write(script)
+
+        logging.info(f"Contest bundle {bundle_hash} split into {len(pieces)} pieces for delta sync to workers")
+        return pieces, bundle_hash
+
     def log_layouts(self):
         logging.info("Layouts to be played: %s" % self.layouts)
         random_layouts_selected = set(
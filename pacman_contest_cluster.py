@@ -26,9 +26,9 @@ import datetime
 # from dataclasses import dataclass
 import cluster_manager
 
-from cluster_manager.config import Host
+from cluster_manager.config import Host, Job
 from contest_runner import ContestRunner
-from multi_contest import MultiContest
+from multi_contest import MultiContest, get_agent_factory
 from config import *
 import copy
 
@@ -78,6 +78,12 @@ def load_settings():
     )
     parser.add_argument("--www-dir", help="www output directory.")
     parser.add_argument("--workers-file", help="json file with workers details.")
+    parser.add_argument(
+        "--local-workers",
+        help="run all games in this machine with this no. of worker processes, instead of in the hosts "
+        "of the workers file (no ssh or file transfers involved).",
+        type=int,
+    )
     parser.add_argument(
         "--teams-roots",
         nargs="+",
@@ -145,6 +151,18 @@ def load_settings():
         help="uploads logs and replays into https://transfer.sh.",
         action="store_true",
     )
+    parser.add_argument(
+        "--upload-url",
+        help="service to upload logs and replays to (with --upload-*), with HTTP PUT to <url>/<archive name>; uploads "
+        "run in the background while the www content is generated, and failed ones are retried (default: "
+        f"{DEFAULT_UPLOAD_URL}; see uploader.py for a local server to test it).",
+    )
+    parser.add_argument(
+        "--upload-chunk-mb",
+        help="upload each archive in chunks of this many MB (with Content-Range), so only failed chunks are sent "
+        "again; the service must support it (transfer.sh does not) (default: 0, the whole archive at once).",
+        type=int,
+    )
     parser.add_argument(
         "--split",
         help=f"split contest into n leagues (default: {DEFAULT_NO_SPLIT}).",
@@ -162,6 +180,131 @@ def load_settings():
         help="Score thresholds to be highlighted in final leaderboard table, "
         "e.g., 5 8 10 20 50",
     )
+    parser.add_argument(
+        "--games-per-job",
+        help="no. of games played in sequence by each job sent to the workers, to amortise the per-job overhead "
+        f"(ssh, setup, transfers) when games are short (default: {DEFAULT_GAMES_PER_JOB}).",
+        type=int,
+    )
+    parser.add_argument(
+        "--job-order",
+        choices=JOB_ORDERS,
+        help="order in which jobs are submitted to the workers: as generated, or longest-first, with game durations "
+        f"estimated from the stats of past contests in the www folder (default: {DEFAULT_JOB_ORDER}).",
+    )
+    parser.add_argument(
+        "--log-parse-mode",
+        choices=LOG_PARSE_MODES,
+        help="how the log of each game is parsed for its outcome: all of it, or just its tail (where the outcome is), "
+        "parsing it all (in chunks) only if a crash must be told apart; tail keeps memory bounded for huge logs of "
+        f"chatty agents (default: {DEFAULT_LOG_PARSE_MODE}).",
+    )
+    parser.add_argument(
+        "--www-archives",
+        choices=WWW_ARCHIVES_MODES,
+        help="what to keep in the www folder of the logs and replays of each contest: plain files, the archive of all "
+        "of them, and per-team archives; or (indexed) only the archive of all of them and its index, from which single "
+        f"games and per-team bundles are read with byte ranges, so each file is stored once (default: "
+        f"{DEFAULT_WWW_ARCHIVES}).",
+    )
+    parser.add_argument(
+        "--www-staging",
+        choices=WWW_STAGING_MODES,
+        help="how the logs and replays of each contest are put from its temp folder into the www folder: copied; "
+        "hard-linked (or reflinked) when in the same file system, so they take no extra space nor I/O; or moved, as "
+        f"the temp folder is wiped on the next run anyway (default: {DEFAULT_WWW_STAGING}).",
+    )
+    parser.add_argument(
+        "--archive-workers",
+        help="no. of processes that compress the logs and replays into their archives in the www folder (default: no. "
+        "of CPUs of this machine).",
+        type=int,
+    )
+    parser.add_argument(
+        "--archive-codec",
+        choices=ARCHIVE_CODECS,
+        help="compression of the archives of logs and replays in the www folder: gzip (.tar.gz), zstd (.tar.zst; much "
+        "faster, with several threads; needs the zstandard library or the zstd command), xz (.tar.xz; smaller but "
+        f"slower), or none (.tar) (default: {DEFAULT_ARCHIVE_CODEC}).",
+    )
+    parser.add_argument(
+        "--archive-level",
+        help="compression level of the archives of logs and replays (default: that of the codec: 9 for gzip, 3 for "
+        "zstd, and 6 for xz).",
+        type=int,
+    )
+    parser.add_argument(
+        "--archive-threads",
+        help="no. of threads that compress each file into the archives of logs and replays, for codecs that support "
+        "it (zstd) (default: the CPUs of this machine shared among the --archive-workers).",
+        type=int,
+    )
+    parser.add_argument(
+        "--result-cache-dir",
+        help="folder of a cache of games shared across contests: games already played with the same code of both "
+        "teams, layout, max. steps, and contest engine are taken from there instead of played again (and new games "
+        "are added to it).",
+    )
+    parser.add_argument(
+        "--adaptive-slots",
+        help="adapt the no. of games run at once in each host to its load average and free memory, measured every "
+        "now and then, between the min_cpu and max_cpu of the host in the workers file (by default, 1 and no_cpu).",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--calibrate-hosts",
+        help="first play the same short game between baseline teams in each host to measure its speed (kept in the "
+        "contest config); the faster a host, the longer the games it gets (if jobs are ordered longest-first).",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--min-host-speed",
+        help="with --calibrate-hosts, hosts with a speed below this fraction of the fastest host (e.g., 0.5 for half "
+        "as fast) are not used.",
+        type=float,
+    )
+    parser.add_argument(
+        "--smoke-test",
+        help="before the contest, play one short game of each team vs the baseline team (as jobs in the workers, as the "
+        "games); teams that fail to load forfeit all their games, which are not sent to the workers.",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--incremental",
+        help="play only the games involving teams whose code changed since the previous contest (the latest in the "
+        "stats archive of the www folder); the other games are reused from it and merged into the new ladder.",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--delta-sync",
+        help="send the contest bundle to the workers as pieces (engine and one per team) named by their content hash, "
+        "which each worker keeps; pieces a worker already has (e.g., teams unchanged since last run) are not sent.",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--stream-analysis",
+        help="analyze each game, and copy its log and replay to the www folder, as soon as its job finishes (outputs of "
+        "games are not kept in memory), so only the final stats and archives are left when the last game ends.",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--speculative",
+        help="when no game is left to start, run a second copy of the games that are taking longer than average "
+        "(preferably in another host) in the idle slots, and keep the copy that finishes first.",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--concurrent-splits",
+        help="run the games of all split contests at once in the same workers (one shared queue of jobs), instead of "
+        "one split contest after the other; each split is analyzed and published as soon as its last game finishes.",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--game-server",
+        help="run games through a warm game server in each worker host, which forks a pre-loaded game engine per game "
+        "instead of starting a new Python interpreter (falls back to the standard command if the server is not usable).",
+        action="store_true",
+    )
     args = vars(parser.parse_args())
 
     # If no arguments are given, stop
@@ -183,8 +326,31 @@ def load_settings():
     settings_default["staff_teams_vs_others_only"] = False
     settings_default["upload_replays"] = False
     settings_default["upload_logs"] = False
+    settings_default["upload_url"] = DEFAULT_UPLOAD_URL
+    settings_default["upload_chunk_mb"] = 0
     settings_default["hide_staff_teams"] = False
     settings_default["score_thresholds"] = None
+    settings_default["game_server"] = False
+    settings_default["games_per_job"] = DEFAULT_GAMES_PER_JOB
+    settings_default["local_workers"] = None
+    settings_default["concurrent_splits"] = False
+    settings_default["job_order"] = DEFAULT_JOB_ORDER
+    settings_default["log_parse_mode"] = DEFAULT_LOG_PARSE_MODE
+    settings_default["www_archives"] = DEFAULT_WWW_ARCHIVES
+    settings_default["www_staging"] = DEFAULT_WWW_STAGING
+    settings_default["archive_workers"] = None
+    settings_default["archive_codec"] = DEFAULT_ARCHIVE_CODEC
+    settings_default["archive_level"] = None
+    settings_default["archive_threads"] = None
+    settings_default["speculative"] = False
+    settings_default["stream_analysis"] = False
+    settings_default["delta_sync"] = False
+    settings_default["result_cache_dir"] = None
+    settings_default["incremental"] = False
+    settings_default["smoke_test"] = False
+    settings_default["adaptive_slots"] = False
+    settings_default["calibrate_hosts"] = False
+    settings_default["min_host_speed"] = None
 
     # Then set the settings from config file, if any provided
     settings_json = {}
@@ -275,12 +441,161 @@ def load_settings():
 # ----------------------------------------------------------------------------------------------------------------------
 
 
+def finish_contest(runner, results, no_successful_job, avg_time, max_time, start_time_contest):
+    """Analyzes the results of a split contest whose games have all been played and generates its web pages
+
+    Args:
+        runner (ContestRunner): the split contest
+        results (list): the results of its games, as returned by ContestRunner.run_contest_remotely()
+        no_successful_job (int): no. of jobs that finished successfully
+        avg_time (float): average time per job, in seconds
+        max_time (float): time of the longest job, in seconds
+        start_time_contest (datetime.datetime): time when the split contest started
+    """
+    logging.info(
+        f"########## GAMES IN SPLIT CONTEST COMPLETED: {no_successful_job} jobs done; {avg_time} avg time/game; {max_time} longest game"
+    )
+
+    logging.info(
+        f"########## NOW ANALYZING OUTPUTS (may take time...): {runner.contest_timestamp_id}"
+    )
+    runner.analyze_results(results)
+
+    # After it has run, we produce all the WWW content
+    logging.info(
+        f"########## ANALYZES OF SPLIT CONTEST DONE, now generating its web page: {runner.contest_timestamp_id}"
+    )
+    config_file_url, stats_file_url, replays_file_url, logs_file_url = (
+        runner.generate_www()
+    )
+    timing_file_url = runner.save_timing()
+    logging.info(f"Config location: {config_file_url}")
+    logging.info(f"Stats location: {stats_file_url}")
+    logging.info(f"Replays location: {replays_file_url}")
+    logging.info(f"Logs location: {logs_file_url}")
+    logging.info(f"Timing location: {timing_file_url}")
+
+    logging.info(
+        f"########## WEB PAGES GENERATED for the split contest: {runner.contest_timestamp_id}"
+    )
+    logging.info(
+        f"########## END OF SPLIT CONTEST {runner.contest_timestamp_id} - TIME TAKEN: {datetime.datetime.now() - start_time_contest}"
+    )
+
+
+def run_contests_concurrently(
+    runners,
+    hosts,
+    resume_folder=None,
+    local_workers=None,
+    speculative=False,
+    slot_limits=None,
+    calibrate=False,
+    transfer_core=True,
+):
+    """Runs the games of all split contests in one shared queue of jobs, so workers never idle between splits
+
+    Jobs are queued contest after contest, so the first splits finish first and are analyzed and published
+    while the games of the others are still being played. Finished splits are analyzed and published one at a time
+    in a separate thread, so the results of the games of the other splits keep being collected meanwhile.
+
+    Args:
+        runners (list(ContestRunner)): the split contests to run
+        hosts (list(Host)): the hosts to run the games (not used if running locally)
+        resume_folder (str, optional): folder with temp data of previous contest to resume. Defaults to None.
+        local_workers (int, optional): run games in this machine with this no. of workers. Defaults to None.
+        speculative (bool, optional): run second copies of straggler games near the end. Defaults to False.
+        slot_limits (dict, optional): host name -> (min, max) no. of slots, to adapt to the load of each host.
+            Defaults to None.
+        calibrate (bool, optional): measure the speed of each host first (see ContestRunner.get_calibration_job()).
+            Defaults to False.
+        transfer_core (bool, optional): True to transfer core files. Defaults to True.
+    """
+    from contextlib import ExitStack
+    from concurrent.futures import ThreadPoolExecutor
+    from job_scheduler import JobScheduler, build_executors
+    from local_manager import summarize_results
+
+    start_time_contest = datetime.datetime.now()
+    jobs = []
+    runner_results = [[] for _ in runners]  # results of each game
+    runner_jobs_results = [[] for _ in runners]  # results of each job (without outputs), for the summary
+    runner_pending = []
+    for i, runner in enumerate(runners):
+        logging.info(f"########## STARTING SPLIT CONTEST: {runner.contest_timestamp_id}")
+        runner_jobs = runner.prepare_jobs(resume_folder)
+        runner_pending.append(len(runner_jobs))
+        # tag each job with its contest, to route its result back
+        jobs += [
+            Job(
+                command=job.command,
+                required_files=job.required_files,
+                return_files=job.return_files,
+                data=(i, job.data),
+                id=f"{runner.contest_timestamp_id}-{job.id}",
+            )
+            for job in runner_jobs
+        ]
+
+    def finish(i):
+        if calibrate:  # kept in the config of each contest
+            runners[i].config["calibration"] = scheduler.calibration
+        no_successful_job, avg_time, max_time = summarize_results(runner_jobs_results[i])
+        finish_contest(runners[i], runner_results[i], no_successful_job, avg_time, max_time, start_time_contest)
+        runner_results[i] = None  # free the outputs of the games, already analyzed
+
+    # each contest times its games from the start of the scheduler until its last result (as when run on its own)
+    run_games_spans = [ExitStack() for _ in runners]
+    finisher = ThreadPoolExecutor(max_workers=1, thread_name_prefix="finish")
+    finished = []
+
+    def games_done(i):
+        run_games_spans[i].close()
+        finished.append(finisher.submit(finish, i))
+
+    def on_result(result):
+        (i, data), exit_code, result_out, result_err, secs = result
+        runner_results[i] += runners[i].collect_job_result((data, exit_code, result_out, result_err, secs))
+        runner_jobs_results[i].append((data, exit_code, b"", b"", secs))
+        runner_pending[i] -= 1
+        if runner_pending[i] == 0:
+            games_done(i)
+
+    logging.info(f"########## RUNNING {len(jobs)} JOBS OF {len(runners)} SPLIT CONTESTS CONCURRENTLY")
+    scheduler = JobScheduler(
+        build_executors(hosts, local_workers),
+        jobs,
+        runners[0].get_core_req_files() if transfer_core else None,  # all split contests share the same bundle
+        on_result=on_result,
+        speculative=speculative,
+        keep_outputs=False,  # results are kept per contest by on_result
+        slot_limits=slot_limits,
+        calibration_job=runners[0].get_calibration_job() if calibrate else None,
+        min_speed=runners[0].min_host_speed,
+    )
+    try:
+        for i, pending in enumerate(runner_pending):
+            span = run_games_spans[i].enter_context(runners[i].tracer.span("run_games"))
+            span.count("jobs", pending)
+            if pending == 0:
+                games_done(i)
+        scheduler.start()
+    finally:
+        finisher.shutdown(wait=True)
+    for future in finished:
+        future.result()  # raises the exception of a contest that failed to finish, if any
+
+
 if __name__ == "__main__":
     settings = load_settings()
 
-    with open(settings["workers_file"], "r") as f:
-        workers_details = json.load(f)["workers"]
-        logging.info("Host workers details to be used: {}".format(workers_details))
+    if settings["local_workers"]:
+        workers_details = []
+        logging.info(f"Games will be run in this machine with {settings['local_workers']} worker processes")
+    else:
+        with open(settings["workers_file"], "r") as f:
+            workers_details = json.load(f)["workers"]
+            logging.info("Host workers details to be used: {}".format(workers_details))
 
     hosts = [
         Host(
@@ -295,6 +610,16 @@ if __name__ == "__main__":
     ]
     # del settings["workers_file"]
 
+    # with adaptive slots, each host uses between min_cpu and max_cpu slots (optional in the workers file; by default,
+    # between 1 and no_cpu), depending on its load
+    slot_limits = None
+    if settings["adaptive_slots"]:
+        if settings["local_workers"]:
+            slot_limits = {"localhost": (1, settings["local_workers"])}
+        else:
+            slot_limits = {w["hostname"]: (w.get("min_cpu", 1), w.get("max_cpu", w["no_cpu"])) for w in workers_details}
+        logging.info(f"Slots of each host will adapt to its load within: {slot_limits}")
+
     resume_contest_folder = settings["resume_contest_folder"]
     del settings["resume_contest_folder"]
 
@@ -316,47 +641,48 @@ if __name__ == "__main__":
         f"########## STARTING MULTI-CONTEST AT: {start_time.astimezone(TIMEZONE).strftime('%Y-%m-%d-%H-%M')}"
     )
 
-    # we go over each contest in the multi-contest list and 
-    # run them one by one
-    runner: ContestRunner
-    for runner in multi_contest.create_contests():
-        start_time_contest = datetime.datetime.now()
-
-        logging.info(
-            f"########## STARTING SPLIT CONTEST: {runner.contest_timestamp_id}"
-        )
-        # !!! MAIN RUN OF A SINGLE CONTEST!!!
-        results, no_successful_job, avg_time, max_time = runner.run_contest_remotely(
-            hosts, resume_contest_folder, transfer_core_packages
-        )
-        logging.info(
-            f"########## GAMES IN SPLIT CONTEST COMPLETED: {no_successful_job} jobs done; {avg_time} avg time/game; {max_time} longest game"
+    runners = multi_contest.create_contests()
+    if settings["smoke_test"]:
+        # one short game of each team (of all split contests) vs the baseline team, run in the workers as the games
+        failed_teams = runners[0].smoke_test_teams(
+            hosts,
+            [(team, get_agent_factory(team)) for team in multi_contest.teams + multi_contest.staff_teams],
+            transfer_core_packages,
+            slot_limits,
         )
-
-        logging.info(
-            f"########## NOW ANALYZING OUTPUTS (may take time...): {runner.contest_timestamp_id}"
-        )
-        runner.analyze_results(results)
-        transfer_core_packages = False  # next contests do not need to transfer core packages again; they are in hosts
-
-        # After it has run, we produce all the WWW content
-        logging.info(
-            f"########## ANALYZES OF SPLIT CONTEST DONE, now generating its web page: {runner.contest_timestamp_id}"
+        for runner in runners:
+            runner.set_failed_teams(failed_teams)
+        transfer_core_packages = False  # the core packages are in the hosts already
+
+    if settings["concurrent_splits"]:
+        # all split contests share the workers; each is finished as soon as its last game is done
+        run_contests_concurrently(
+            runners,
+            hosts,
+            resume_contest_folder,
+            settings["local_workers"],
+            settings["speculative"],
+            slot_limits,
+            settings["calibrate_hosts"],
+            transfer_core_packages,
         )
-        config_file_url, stats_file_url, replays_file_url, logs_file_url = (
-            runner.generate_www()
-        )
-        logging.info(f"Config location: {config_file_url}")
-        logging.info(f"Stats location: {stats_file_url}")
-        logging.info(f"Replays location: {replays_file_url}")
-        logging.info(f"Logs location: {logs_file_url}")
+    else:
+        # we go over each contest in the multi-contest list and
+        # run them one by one
+        runner: ContestRunner
+        for runner in runners:
+            start_time_contest = datetime.datetime.now()
+
+            logging.info(
+                f"########## STARTING SPLIT CONTEST: {runner.contest_timestamp_id}"
+            )
+            # !!! MAIN RUN OF A SINGLE CONTEST!!!
+            results, no_successful_job, avg_time, max_time = runner.run_contest_remotely(
+                hosts, resume_contest_folder, transfer_core_packages, slot_limits
+            )
+            transfer_core_packages = False  # next contests do not need to transfer core packages again; they are in hosts
 
-        logging.info(
-            f"########## WEB PAGES GENERATED for the split contest: {runner.contest_timestamp_id}"
-        )
-        logging.info(
-            f"########## END OF SPLIT CONTEST {runner.contest_timestamp_id} - TIME TAKEN: {datetime.datetime.now() - start_time_contest}"
-        )
+            finish_contest(runner, results, no_successful_job, avg_time, max_time, start_time_contest)
 
     end_time = datetime.datetime.now()
     logging.info(
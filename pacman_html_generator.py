@@ -15,8 +15,12 @@ import shutil
 import zipfile
 import logging
 import re
+import html
 import datetime
 from pytz import timezone
+from timing import Tracer
+from archive_index import load_index
+from archive_codecs import CODECS, find_archive
 from config import (
     DIR_ASSETS,
     STATS_ARCHIVE_DIR,
@@ -101,12 +105,13 @@ def load_settings():
 
 
 class HtmlGenerator:
-    def __init__(self, www_dir, organizer, score_thresholds=None):
+    def __init__(self, www_dir, organizer, score_thresholds=None, tracer=None):
         """
         Initializes this generator.
 
         :param www_dir: the output path
         :param organizer: the name of the organizer of the tournament (e.g., XX University)
+        :param tracer: Tracer to time the generation of the HTML (e.g., that of the contest; see timing.py)
         """
 
         # path that contains files that make-up a html navigable web folder
@@ -115,6 +120,7 @@ class HtmlGenerator:
         # just used in html as a readable string
         self.organizer = organizer
         self.score_thresholds = score_thresholds
+        self.tracer = tracer if tracer is not None else Tracer()
 
     def _close(self):
         pass
@@ -130,8 +136,10 @@ class HtmlGenerator:
         (Re)Generates the HTML for the given run and updates the HTML index.
         :return:
         """
-        self._save_run_html(run_id, stats_dir, replays_dir, logs_dir)
-        self._generate_main_html()
+        with self.tracer.span("run_html"):
+            self._save_run_html(run_id, stats_dir, replays_dir, logs_dir)
+        with self.tracer.span("main_html"):
+            self._generate_main_html()
 
     def _save_run_html(self, run_id, stats_file, replays_file, logs_file):
         """
@@ -176,6 +184,7 @@ class HtmlGenerator:
         team_stats = data["team_stats"]
         random_layouts = data["random_layouts"]
         fixed_layouts = data["fixed_layouts"]
+        team_resources = data.get("team_resources")  # not in stats of older contests
         if "organizer" in data.keys():
             organizer = data["organizer"]
         else:
@@ -191,6 +200,10 @@ class HtmlGenerator:
         if "url_logs" in data:
             logs_file = data["url_logs"]
 
+        # indexes of the archives (if local), to download single games and per-team bundles from them
+        replays_index = self._load_archive_index(replays_file)
+        logs_index = self._load_archive_index(logs_file)
+
         if not os.path.exists(self.www_dir):
             os.makedirs(self.www_dir)
         contest_zip_file = zipfile.ZipFile(FILE_FONTS)
@@ -209,12 +222,26 @@ class HtmlGenerator:
             stats_file,
             replays_file,
             logs_file,
+            team_resources,
+            replays_index,
+            logs_index,
         )
 
         html_full_path = os.path.join(self.www_dir, f"results_{run_id}.html")
         with open(html_full_path, "w") as f:
             print(run_html, file=f)
 
+    def _load_archive_index(self, archive_file):
+        """
+        Returns the index of a local archive of replays or logs (see archive_index.py), or None if it has none.
+        """
+        if not archive_file or archive_file.startswith("http"):
+            return None
+        try:
+            return load_index(os.path.join(self.www_dir, archive_file))
+        except (OSError, ValueError):
+            return None
+
     def _generate_main_html(self):
         """
         Generates the index HTML, containing links to the HTML files of all the runs.
@@ -250,9 +277,15 @@ class HtmlGenerator:
         stats_dir,
         replays_dir,
         logs_dir,
+        team_resources=None,
+        replays_index=None,
+        logs_index=None,
     ):
         """
-        Generates the HTML of the report of the run.
+        Generates the HTML of the report of the run (with the resources used by the games of each team, if given).
+
+        If the indexes of the archives of replays and logs are given, single games and the files of each team can be
+        downloaded from the archives with HTTP range requests (see archive_index.py).
         """
 
         if organizer is None:
@@ -358,6 +391,9 @@ class HtmlGenerator:
                 output += """</tr>\n"""
             output += "</table>"
 
+            if team_resources:
+                output += self._generate_resources_output(team_resources)
+
             # Second, print each game result
             output += "\n\n<br/><br/><h2>Games</h2>\n"
 
@@ -381,6 +417,10 @@ class HtmlGenerator:
                 output += """<a href="%s">DOWNLOAD LOGS</a><br/>\n""" % logs_dir
             if stats_dir:
                 output += """<a href="%s">DOWNLOAD STATS</a><br/>\n\n""" % stats_dir
+            if replays_index or logs_index:
+                output += self._generate_archive_downloads_output(
+                    team_stats, replays_dir, replays_index, logs_dir, logs_index
+                )
             output += """<table border="1">"""
             output += """<tr>"""
             output += """<th>Team 1</th>"""
@@ -389,6 +429,8 @@ class HtmlGenerator:
             output += """<th>Time</th>"""
             output += """<th>Score</th>"""
             output += """<th>Winner</th>"""
+            if replays_index or logs_index:
+                output += """<th>Files</th>"""
             output += """</tr>\n"""
             for n1, n2, layout, score, winner, time_taken in games:
                 output += """<tr>"""
@@ -432,12 +474,118 @@ class HtmlGenerator:
                     output += """<td>%d</td>""" % score
                     output += """<td><b>%s</b></td>""" % winner
 
+                # Replay and log of the game, from the archives
+                if replays_index or logs_index:
+                    game_file_name = f"{n1}_vs_{n2}_{layout}"
+                    output += """<td>"""
+                    output += self._archive_download_link(
+                        "replay",
+                        replays_dir,
+                        replays_index,
+                        [f"{game_file_name}.replay"],
+                        f"{game_file_name}.replay",
+                    )
+                    output += " "
+                    output += self._archive_download_link(
+                        "log", logs_dir, logs_index, [f"{game_file_name}.log"], f"{game_file_name}.log"
+                    )
+                    output += """</td>"""
+
                 output += """</tr>\n"""
 
         output += "\n\n</table></body></html>"
 
         return output
 
+    @staticmethod
+    def _archive_download_link(text, archive_file, index, names, download_name):
+        """
+        Generates a link that downloads some files of an indexed archive as an archive (download_name plus the extension
+        of its codec, e.g., .tar.gz), fetching the byte ranges of their members (plus the end member) with
+        downloadRanges(); empty if none of the files is in the archive.
+        """
+        if not index:
+            return ""
+        ranges = [index["files"][name] for name in names if name in index["files"]]
+        if not ranges:
+            return ""
+        onclick = "downloadRanges(%s, %s, %s); return false;" % (
+            json.dumps(archive_file),
+            json.dumps(ranges + [index["end"]]),
+            json.dumps(download_name + CODECS[index.get("codec", "gzip")].extension),
+        )
+        return """<a href="#" onclick="%s">%s</a>""" % (html.escape(onclick), text)
+
+    def _generate_archive_downloads_output(self, team_stats, replays_dir, replays_index, logs_dir, logs_index):
+        """
+        Generates the script to download files from the indexed archives of replays and logs with HTTP range requests,
+        and the table with the downloads of the files of each team.
+        """
+        output = """<script>
+async function downloadRanges(url, ranges, name) {
+    const parts = [];
+    for (const [offset, length] of ranges) {
+        const response = await fetch(url, {headers: {Range: `bytes=${offset}-${offset + length - 1}`}});
+        if (response.status !== 206) {
+            alert("The web server does not support range requests: download the whole archive instead.");
+            return;
+        }
+        parts.push(await response.blob());
+    }
+    const link = document.createElement("a");
+    link.href = URL.createObjectURL(new Blob(parts, {type: "application/octet-stream"}));
+    link.download = name;
+    link.click();
+    setTimeout(() => URL.revokeObjectURL(link.href), 60000);
+}
+</script>\n"""
+        output += """<h3>Downloads per team</h3>\n"""
+        output += """<table border="1">"""
+        output += """<tr><th>Team</th><th>Replays</th><th>Logs</th></tr>\n"""
+        for team in sorted(team_stats):
+            output += """<tr>"""
+            output += """<td>%s</td>""" % team
+            for kind, archive_file, index in [("replays", replays_dir, replays_index), ("logs", logs_dir, logs_index)]:
+                names = index["teams"].get(team, []) if index else []
+                output += """<td>%s</td>""" % self._archive_download_link(
+                    kind, archive_file, index, names, f"{kind}_{team}"
+                )
+            output += """</tr>\n"""
+        output += """</table><br/>\n"""
+        return output
+
+    @staticmethod
+    def _generate_resources_output(team_resources):
+        """
+        Generates the HTML table of the resources used by the games of each team, most CPU hungry first.
+        """
+        output = "\n\n<br/><br/><h2>Resources used</h2>\n"
+        output += "<p>CPU time (user + sys) and peak memory (RSS) of the games of each team (both teams in each game).</p>\n"
+        output += """<table border="1">"""
+        output += """<tr>"""
+        output += """<th>Team</th>"""
+        output += """<th>Games</th>"""
+        output += """<th>Avg. CPU secs</th>"""
+        output += """<th>Max. CPU secs</th>"""
+        output += """<th>Avg. peak MB</th>"""
+        output += """<th>Max. peak MB</th>"""
+        output += """<th>KILLED</th>"""
+        output += """</tr>\n"""
+        for key, (games, avg_cpu, max_cpu, avg_rss, max_rss, killed) in sorted(
+            team_resources.items(), key=lambda v: v[1][1], reverse=True
+        ):
+            output += """<tr>"""
+            output += """<td>%s</td>""" % key
+            output += """<td>%d</td>""" % games
+            output += """<td>%.1f</td>""" % avg_cpu
+            output += """<td>%.1f</td>""" % max_cpu
+            output += """<td>%.1f</td>""" % avg_rss
+            output += """<td>%.1f</td>""" % max_rss
+            output += """<td>%d</td>""" % killed
+            output += """</tr>\n"""
+        output += "</table>"
+        return output
+
 
 if __name__ == "__main__":
     settings = load_settings()
@@ -472,23 +620,26 @@ if __name__ == "__main__":
             # Extract the id for that particular content from the stat file stats_<ID-TIMESTAMP>
             run_id = match.group(1)
 
-            replays_file_name = f"replays_{run_id}.tar"
-            logs_file_name = f"logs_{run_id}.tar"
+            replays_file_name = f"replays_{run_id}"
+            logs_file_name = f"logs_{run_id}"
 
             stats_file_full_path = os.path.join(stats_dir, stats_file_name)
-            replays_file_full_path = (
-                os.path.join(replays_dir, replays_file_name) if replays_dir else None
-            )
-            logs_file_full_path = (
-                os.path.join(logs_dir, logs_file_name) if logs_dir else None
-            )
 
-            replays_file_full_path += (
-                ".gz" if not os.path.exists(replays_file_full_path) else ""
-            )
-            logs_file_full_path += (
-                ".gz" if not os.path.exists(logs_file_full_path) else ""
-            )
+            # archives may be .tar, .tar.gz, .tar.zst, or .tar.xz (see archive_codecs.py); .tar.gz if not found
+            replays_file_full_path = None
+            if replays_dir:
+                archive = find_archive(os.path.join(www_dir, replays_dir, replays_file_name))
+                replays_file_full_path = (
+                    os.path.relpath(archive, www_dir)
+                    if archive
+                    else os.path.join(replays_dir, f"{replays_file_name}.tar.gz")
+                )
+            logs_file_full_path = None
+            if logs_dir:
+                archive = find_archive(os.path.join(www_dir, logs_dir, logs_file_name))
+                logs_file_full_path = (
+                    os.path.relpath(archive, www_dir) if archive else os.path.join(logs_dir, f"{logs_file_name}.tar.gz")
+                )
 
             html_generator.add_run(
                 run_id,
@@ -0,0 +1,157 @@
+"""
+Cache of played games shared across contests, so games whose outcome is already known are not played again.
+
+Games are deterministic (they run with a fixed random seed) for the same code of both teams, layout (or random seed),
+max. no. of steps, and contest engine. So a game is identified by the key:
+
+    (red team name, red team code hash, blue team name, blue team code hash, layout, max_steps, engine hash)
+
+and each game in the cache is a folder named by the hash of its key, with its log, replay, result file (as written by
+the engine), resources file, and result of the job (exit code and secs taken). Team names are part of the key because
+they appear in logs. The key also has the version of the cache (CACHE_VERSION), so entries of older versions (e.g.,
+without the result files) are not used, and are pruned in time.
+
+The cache is just a folder (e.g., shared by all nightly feedback contests); entries are written to a temp folder and
+then renamed into place, so concurrent contests never see half-written entries.
+
+Only games played cleanly (no agent crashed, timed out, or failed to load) are meant to be stored, as those problems
+may be due to a busy or slow host rather than to the code of the teams (see ContestRunner.collect_job_result()).
+Each restore marks the game as used, and entries not used in RESULT_CACHE_MAX_AGE_DAYS are removed when the cache is
+opened, and then the least recently used ones to keep at most RESULT_CACHE_MAX_ENTRIES (see prune()).
+"""
+import os
+import json
+import time
+import shutil
+import logging
+import hashlib
+import tempfile
+
+from config import RESULT_CACHE_MAX_AGE_DAYS, RESULT_CACHE_MAX_ENTRIES
+from file_staging import stage_file
+
+CACHE_VERSION = 2  # bumped whenever what is stored changes
+RESULT_FILE = "result.json"
+LOG_FILE = "game.log"
+REPLAY_FILE = "game.replay"
+GAME_RESULT_FILE = "game.json"
+RESOURCES_FILE = "game.resources.json"
+
+
+class ResultCache:
+    def __init__(
+        self, cache_dir, engine_hash, max_age_days=RESULT_CACHE_MAX_AGE_DAYS, max_entries=RESULT_CACHE_MAX_ENTRIES
+    ):
+        """
+        :param cache_dir: the folder of the cache (created if it does not exist)
+        :param engine_hash: hash of the contest engine (all the contest files but the teams)
+        :param max_age_days: games not used in this many days are removed (see prune())
+        :param max_entries: max. no. of games kept, the least recently used being removed (see prune())
+        """
+        self.cache_dir = cache_dir
+        self.engine_hash = engine_hash
+        self.max_age_days = max_age_days
+        self.max_entries = max_entries
+        os.makedirs(cache_dir, exist_ok=True)
+        self.prune()
+
+    def prune(self):
+        """Removes the games not used in max_age_days, and then the least recently used beyond max_entries
+
+        Returns:
+            int: no. of games removed
+        """
+        entries = []  # (last used, entry folder)
+        for entry in os.scandir(self.cache_dir):
+            if entry.name.startswith(".") or not entry.is_dir(follow_symlinks=False):
+                continue
+            try:
+                entries.append((os.stat(os.path.join(entry.path, RESULT_FILE)).st_mtime, entry.path))
+            except OSError:  # e.g., removed by another contest meanwhile
+                continue
+        entries.sort(reverse=True)
+
+        oldest_time = time.time() - self.max_age_days * 24 * 3600
+        kept = [entry for entry in entries[: self.max_entries] if entry[0] >= oldest_time]
+        for _, entry_dir in entries[len(kept):]:
+            shutil.rmtree(entry_dir, ignore_errors=True)
+        if len(entries) > len(kept):
+            logging.info(f"Removed {len(entries) - len(kept)} old games from the result cache {self.cache_dir}")
+        return len(entries) - len(kept)
+
+    def _entry_dir(self, red_team, blue_team, layout, max_steps):
+        """Returns the folder of a game in the cache; teams are (name, code hash) tuples"""
+        key = json.dumps([CACHE_VERSION, red_team, blue_team, layout, max_steps, self.engine_hash])
+        return os.path.join(self.cache_dir, hashlib.sha256(key.encode()).hexdigest()[:24])
+
+    def restore(self, red_team, blue_team, layout, max_steps, log_file, replay_file, result_file, resources_file):
+        """Restores a game from the cache, if there, by placing its log, replay, and result files at the paths given
+
+        Args:
+            red_team (tuple): red team name and code hash
+            blue_team (tuple): blue team name and code hash
+            layout (str): layout of the game
+            max_steps (int): max. no. of steps of the game
+            log_file (str): where to place the log of the game
+            replay_file (str): where to place the replay of the game
+            result_file (str): where to place the result file of the game (result-0.json of the engine)
+            resources_file (str): where to place the resources file of the game
+
+        Returns:
+            dict: the result of the game (exit_code, secs) if in the cache, None otherwise
+        """
+        entry_dir = self._entry_dir(red_team, blue_team, layout, max_steps)
+        try:
+            with open(os.path.join(entry_dir, RESULT_FILE), "r") as f:
+                result = json.load(f)
+            os.utime(os.path.join(entry_dir, RESULT_FILE))  # used now (see prune())
+
+            for src, dst in [
+                (LOG_FILE, log_file),
+                (REPLAY_FILE, replay_file),
+                (GAME_RESULT_FILE, result_file),
+                (RESOURCES_FILE, resources_file),
+            ]:
+                src = os.path.join(entry_dir, src)
+                if os.path.exists(src):
+                    stage_file(src, dst, "link")  # a copy if in another file system
+        except (OSError, ValueError):  # e.g., not in the cache, or removed by another contest meanwhile
+            return None
+        return result
+
+    def store(
+        self, red_team, blue_team, layout, max_steps, log_file, replay_file, result_file, resources_file, exit_code, secs
+    ):
+        """Stores a game played (its log, replay, and results) in the cache, unless it is there already
+
+        Args:
+            red_team (tuple): red team name and code hash
+            blue_team (tuple): blue team name and code hash
+            layout (str): layout of the game
+            max_steps (int): max. no. of steps of the game
+            log_file (str): the log of the game
+            replay_file (str): the replay of the game
+            result_file (str): the result file of the game (result-0.json of the engine)
+            resources_file (str): the resources file of the game
+            exit_code (int): exit code of the game
+            secs (float): secs taken by the game
+        """
+        entry_dir = self._entry_dir(red_team, blue_team, layout, max_steps)
+        if os.path.exists(entry_dir):
+            return
+
+        tmp_dir = tempfile.mkdtemp(dir=self.cache_dir, prefix=".tmp-")
+        try:
+            shutil.copy2(log_file, os.path.join(tmp_dir, LOG_FILE))
+            for src, dst in [
+                (replay_file, REPLAY_FILE),
+                (result_file, GAME_RESULT_FILE),
+                (resources_file, RESOURCES_FILE),
+            ]:
+                if os.path.exists(src):
+                    shutil.copy2(src, os.path.join(tmp_dir, dst))
+            with open(os.path.join(tmp_dir, RESULT_FILE), "w") as f:
+                json.dump({"exit_code": exit_code, "secs": round(secs, 2)}, f)
+            os.rename(tmp_dir, entry_dir)
+        except OSError:  # e.g., stored by another contest meanwhile
+            shutil.rmtree(tmp_dir, ignore_errors=True)
@@ -0,0 +1,126 @@
+"""
+Lightweight timing of the phases of a contest (preparing the platform, zipping the bundle, running the games, analyzing
+their outputs, archiving logs and replays, generating the HTML, etc.), to know where the time of a contest goes.
+
+Each phase is a span of a Tracer, timed with a context manager (or the @traced decorator for methods of objects with a
+tracer attribute); spans opened inside another span are nested into it, separately in each thread:
+
+    tracer = Tracer()
+    with tracer.span("generate_www"):
+        with tracer.span("replays_archive") as span:
+            span.count("files", len(replay_files))
+            ...
+
+A span entered several times (e.g., once per job result) accumulates its secs and no. of calls. The report is a tree
+of nested spans, e.g., saved by ContestRunner.save_timing() into timing_<contest id>.json, next to the stats file:
+
+    {"name": "generate_www", "secs": 12.3, "calls": 1, "counts": {}, "children": [
+        {"name": "replays_archive", "secs": 4.5, "calls": 1, "counts": {"files": 380}, "children": []}, ...]}
+"""
+import json
+import time
+import functools
+import threading
+from contextlib import contextmanager
+
+
+class Span:
+    """A phase timed by a Tracer: its total secs and no. of calls, counts of things done, and nested spans"""
+
+    def __init__(self, name, lock):
+        self.name = name
+        self.secs = 0
+        self.calls = 0
+        self.counts = {}
+        self.children = {}  # name -> Span, in order of first call
+        self._lock = lock
+
+    def count(self, name, n=1):
+        """Adds n to the count of name (e.g., no. of games or bytes) in this span"""
+        with self._lock:
+            self.counts[name] = self.counts.get(name, 0) + n
+
+    def child(self, name):
+        with self._lock:
+            if name not in self.children:
+                self.children[name] = Span(name, self._lock)
+            return self.children[name]
+
+    def report(self):
+        """Returns the span and its nested spans as a JSON-friendly dict"""
+        return {
+            "name": self.name,
+            "secs": round(self.secs, 3),
+            "calls": self.calls,
+            "counts": dict(self.counts),
+            "children": [child.report() for child in list(self.children.values())],
+        }
+
+
+class Tracer:
+    """Times nested spans (phases); each thread nests its spans separately, under the same root"""
+
+    def __init__(self):
+        self.start_time = time.time()
+        self._lock = threading.Lock()
+        self._root = Span("total", self._lock)
+        self._local = threading.local()
+
+    def _stack(self):
+        if not hasattr(self._local, "stack"):
+            self._local.stack = [self._root]
+        return self._local.stack
+
+    @contextmanager
+    def span(self, name):
+        """Times the code in the with block as span name, nested in the span open in this thread (if any)
+
+        Args:
+            name (str): name of the span
+
+        Yields:
+            Span: the span, to add counts to it
+        """
+        stack = self._stack()
+        span = stack[-1].child(name)
+        stack.append(span)
+        start = time.perf_counter()
+        try:
+            yield span
+        finally:
+            secs = time.perf_counter() - start
+            stack.pop()
+            with self._lock:
+                span.secs += secs
+                span.calls += 1
+
+    def count(self, name, n=1):
+        """Adds n to the count of name in the span open in this thread (or the root span, if none)"""
+        self._stack()[-1].count(name, n)
+
+    def report(self):
+        """Returns all the spans timed (nested) and the secs since the tracer was created as a JSON-friendly dict"""
+        report = self._root.report()
+        report["secs"] = round(time.time() - self.start_time, 3)
+        report["calls"] = 1
+        return report
+
+
+def traced(name):
+    """Decorator that times each call of a method as span name of the tracer of its object (self.tracer)"""
+
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            with self.tracer.span(name):
+                return method(self, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def save_timing(timing_file, **reports):
+    """Saves the reports of some tracers (e.g., setup=..., contest=...) into a JSON file"""
+    with open(timing_file, "w") as f:
+        json.dump(reports, f, indent=2)
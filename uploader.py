@@ -0,0 +1,251 @@
+"""
+Uploads of the archives of a contest (e.g., of all its logs) to a file service with HTTP PUT, in the background.
+
+Each file is PUT to <upload url>/<file name> (as curl --upload-file does), and the service answers with the URL to
+download it from (e.g., https://transfer.sh). Files are streamed from disk, never read whole into memory. Uploads run
+in a pool of threads, so ContestRunner.generate_www() can go on building the per-team archives and the HTML while the
+archives are being uploaded:
+
+    uploader = Uploader("https://transfer.sh")
+    future = uploader.submit("www/logs-archive/logs_<id>.tar.gz")
+    ...  # other work
+    url = future.result()
+    uploader.shutdown()
+
+Failed uploads (connection errors, timeouts, and 5xx, 408, and 429 answers) are retried with exponential backoff. With
+a chunk size, each file is PUT in chunks, each with header Content-Range: bytes <first>-<last>/<size>, so only the
+chunk that failed is sent again (the service must support it, as the local server below does; transfer.sh does not).
+
+For testing without internet, this script also runs a tiny local server that stores what is PUT into a folder (and
+serves it back with GET):
+
+    python uploader.py --serve /tmp/uploads --port 8000
+    python pacman_contest_cluster.py ... --upload-all --upload-url http://localhost:8000
+"""
+import os
+import re
+import time
+import logging
+import argparse
+import threading
+import http.client
+import http.server
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+
+from config import UPLOAD_WORKERS, UPLOAD_RETRIES, UPLOAD_BACKOFF_SECS, UPLOAD_TIMEOUT_SECS
+
+SEND_BUFFER_BYTES = 1024 * 1024
+RETRY_STATUSES = {408, 429}  # and 5xx
+
+
+class UploadError(Exception):
+    pass
+
+
+def _put_range(url, file_path, start, length, size, chunked, timeout):
+    """PUTs bytes [start, start + length) of a file to url and returns the text answered by the server"""
+    parts = urllib.parse.urlsplit(url)
+    connection_class = http.client.HTTPSConnection if parts.scheme == "https" else http.client.HTTPConnection
+    connection = connection_class(parts.netloc, timeout=timeout)
+    try:
+        connection.putrequest("PUT", parts.path + (f"?{parts.query}" if parts.query else ""))
+        connection.putheader("Content-Length", str(length))
+        if chunked:
+            connection.putheader("Content-Range", f"bytes {start}-{start + length - 1}/{size}")
+        connection.endheaders()
+        with open(file_path, "rb") as f:
+            f.seek(start)
+            left = length
+            while left > 0:
+                data = f.read(min(SEND_BUFFER_BYTES, left))
+                if not data:
+                    raise UploadError(f"File {file_path} is shorter than expected")
+                connection.send(data)
+                left -= len(data)
+        response = connection.getresponse()
+        text = response.read().decode(errors="replace")
+    finally:
+        connection.close()
+    if response.status >= 400:
+        error = f"HTTP {response.status} {response.reason}"  # the body may be a whole HTML page
+        if response.status >= 500 or response.status in RETRY_STATUSES:
+            raise ConnectionError(error)
+        raise UploadError(error)
+    return text
+
+
+def put_file(
+    file_path,
+    url,
+    chunk_bytes=0,
+    retries=UPLOAD_RETRIES,
+    backoff_secs=UPLOAD_BACKOFF_SECS,
+    timeout=UPLOAD_TIMEOUT_SECS,
+):
+    """Uploads a file with HTTP PUT, retrying failed requests with exponential backoff
+
+    Args:
+        file_path (str): the file to upload
+        url (str): the URL to PUT the file to (e.g., https://transfer.sh/logs.tar.gz)
+        chunk_bytes (int, optional): PUT the file in chunks of this size, with Content-Range. Defaults to 0 (at once).
+        retries (int, optional): no. of times a failed request is retried. Defaults to UPLOAD_RETRIES.
+        backoff_secs (float, optional): wait before the first retry, doubled at each retry. Defaults to
+            UPLOAD_BACKOFF_SECS.
+        timeout (float, optional): timeout of each socket operation. Defaults to UPLOAD_TIMEOUT_SECS.
+
+    Raises:
+        UploadError: if the file could not be uploaded (or the server answered a 4xx error)
+
+    Returns:
+        str: the URL to download the file, as answered by the server (url, if it answered nothing)
+    """
+    size = os.path.getsize(file_path)
+    chunked = 0 < chunk_bytes < size
+    if chunked:
+        ranges = [(start, min(chunk_bytes, size - start)) for start in range(0, size, chunk_bytes)]
+    else:
+        ranges = [(0, size)]
+
+    text = ""
+    for start, length in ranges:
+        for attempt in range(retries + 1):
+            try:
+                text = _put_range(url, file_path, start, length, size, chunked, timeout)
+                break
+            except (OSError, http.client.HTTPException) as e:  # e.g., connection reset, timeout, or 5xx
+                if attempt == retries:
+                    raise UploadError(f"Upload of {file_path} to {url} failed after {retries + 1} attempts: {e}")
+                wait = backoff_secs * 2 ** attempt
+                logging.warning(
+                    f"Upload of {file_path} (bytes {start}-{start + length - 1}) failed ({e}); "
+                    f"retrying in {wait:.0f} secs"
+                )
+                time.sleep(wait)
+
+    # transfer.sh answers 200 with this message when it could not store the file
+    if "Could not save metadata" in text:
+        raise UploadError(f"Upload service returned an incorrect URL for {file_path}: {text.strip()}")
+    return text.strip() or url
+
+
+class Uploader:
+    """Uploads files with HTTP PUT to a file service in a pool of background threads"""
+
+    def __init__(self, upload_url, workers=UPLOAD_WORKERS, chunk_bytes=0, tracer=None):
+        """
+        :param upload_url: the URL of the service; each file is PUT to <upload_url>/<file name>
+        :param workers: no. of files uploaded at once
+        :param chunk_bytes: PUT each file in chunks of this size (0: at once; see put_file())
+        :param tracer: Tracer to time the uploads (see timing.py), if any
+        """
+        self.upload_url = upload_url.rstrip("/")
+        self.chunk_bytes = chunk_bytes
+        self.tracer = tracer
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="upload")
+
+    def _upload(self, file_path, remote_name):
+        url = f"{self.upload_url}/{urllib.parse.quote(remote_name)}"
+        logging.info(f"Uploading {file_path} to {url}...")
+        start_time = time.time()
+        if self.tracer is None:
+            download_url = put_file(file_path, url, self.chunk_bytes)
+        else:
+            with self.tracer.span("upload") as span:
+                download_url = put_file(file_path, url, self.chunk_bytes)
+                span.count("bytes", os.path.getsize(file_path))
+        secs = max(time.time() - start_time, 1e-3)
+        logging.info(
+            f"File {os.path.basename(file_path)} uploaded in {secs:.1f} secs "
+            f"({os.path.getsize(file_path) / 2 ** 20 / secs:.1f} MB/s); URL: {download_url}"
+        )
+        return download_url
+
+    def submit(self, file_path, remote_name=None):
+        """Starts uploading a file in the background
+
+        Args:
+            file_path (str): the file to upload
+            remote_name (str, optional): the name of the file in the service. Defaults to None (its name).
+
+        Returns:
+            Future: its result is the URL to download the file; it raises UploadError if the upload failed
+        """
+        return self._executor.submit(self._upload, file_path, remote_name or os.path.basename(file_path))
+
+    def shutdown(self):
+        """Waits for all uploads to finish and stops the threads"""
+        self._executor.shutdown(wait=True)
+
+
+class _PutHandler(http.server.SimpleHTTPRequestHandler):
+    """Stores the files PUT (whole or in chunks with Content-Range) into the folder served"""
+
+    def do_PUT(self):
+        path = self.translate_path(self.path)
+        length = int(self.headers.get("Content-Length", 0))
+        start = 0
+        content_range = self.headers.get("Content-Range")
+        if content_range:
+            match = re.match(r"bytes (\d+)-(\d+)/(\d+)", content_range)
+            if not match:
+                self.send_error(400, "Bad Content-Range")
+                return
+            start = int(match.group(1))
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "r+b" if start > 0 and os.path.exists(path) else "wb") as f:
+            f.seek(start)
+            left = length
+            while left > 0:
+                data = self.rfile.read(min(SEND_BUFFER_BYTES, left))
+                if not data:
+                    break
+                f.write(data)
+                left -= len(data)
+
+        host, port = self.server.server_address[:2]
+        body = f"http://{host}:{port}{self.path}\n".encode()
+        self.send_response(201)
+        self.send_header("Content-Type", "text/plain")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def serve(directory, port=0, host="127.0.0.1"):
+    """Starts a local upload server (files PUT are stored in directory) in a background thread
+
+    Args:
+        directory (str): the folder where to store the files
+        port (int, optional): the port to listen to. Defaults to 0 (any free port).
+        host (str, optional): the address to listen to. Defaults to "127.0.0.1".
+
+    Returns:
+        ThreadingHTTPServer: the server (its URL is http://<host>:<server.server_address[1]>); stop it with shutdown()
+    """
+    os.makedirs(directory, exist_ok=True)
+
+    class Handler(_PutHandler):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, directory=directory, **kwargs)
+
+    server = http.server.ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local server to test uploads (stores the files PUT into a folder).")
+    parser.add_argument("--serve", required=True, help="folder where to store the files uploaded.")
+    parser.add_argument("--port", help="port to listen to (default: %(default)s).", type=int, default=8000)
+    parser.add_argument("--host", help="address to listen to (default: %(default)s).", default="127.0.0.1")
+    args = parser.parse_args()
+
+    logging.basicConfig(format="%(asctime)s %(levelname)-8s %(message)s", level=logging.INFO)
+    upload_server = serve(args.serve, args.port, args.host)
+    logging.info(f"Serving uploads into {args.serve} at http://{args.host}:{args.port} (Ctrl-C to stop)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        upload_server.shutdown()
@@ -0,0 +1,87 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+Records the resources used by a game in a worker host: CPU time (user + sys), peak memory (RSS), and how it ended.
+
+This script is shipped inside the contest bundle (next to capture.py) and wraps the command of each game:
+
+    python game_resources.py --output resources-0.json -- python capture.py <capture.py options>
+
+It runs the command as a child process, waits for it with wait4(), and writes the resources used by the whole process
+tree of the game (the child and all its descendants that were waited for, e.g., agents' worker processes) as JSON:
+
+    {"cpu_user": 40.1, "cpu_sys": 1.3, "max_rss_mb": 210.4, "exit_code": 0, "signal": null}
+
+where max_rss_mb is the peak RSS of the largest process of the tree, and signal is the signal that killed the game
+(e.g., 9 if killed by the OOM killer), if any. The game server (game_server.py) reports the same usage of the games it
+forks, as they are not in the process tree of the job.
+"""
+import os
+import sys
+import json
+import signal
+import argparse
+import subprocess
+
+
+def get_usage(rusage, wait_status):
+    """Returns the resources used by a process (and its descendants waited for) as a JSON-friendly dict
+
+    Args:
+        rusage (resource.struct_rusage): the resource usage of the process, as given by os.wait4()
+        wait_status (int): the wait status of the process, as given by os.wait4()
+
+    Returns:
+        dict: cpu_user and cpu_sys (secs), max_rss_mb (MB), exit_code, and signal (None if not killed by a signal)
+    """
+    return {
+        "cpu_user": round(rusage.ru_utime, 2),
+        "cpu_sys": round(rusage.ru_stime, 2),
+        "max_rss_mb": round(rusage.ru_maxrss / 1024, 1),  # ru_maxrss is in KB in Linux
+        "exit_code": os.waitstatus_to_exitcode(wait_status),
+        "signal": os.WTERMSIG(wait_status) if os.WIFSIGNALED(wait_status) else None,
+    }
+
+
+def save_usage(usage, output_file):
+    """Writes the resources used by a game (see get_usage()) into output_file"""
+    with open(output_file, "w") as f:
+        json.dump(usage, f)
+
+
+def run_and_record(command, output_file):
+    """Runs a command, waits for it, and writes the resources it used into output_file
+
+    Args:
+        command (list(str)): the command to run (its stdin/stdout/stderr are those of this process)
+        output_file (str): the JSON file where to write the resources used
+
+    Returns:
+        int: exit code for this process: the exit code of the command, or 128 + the signal that killed it
+    """
+    sys.stdout.flush()
+    sys.stderr.flush()
+    process = subprocess.Popen(command)
+    # the job may be killed (e.g., cancelled); pass it on to the game
+    signal.signal(signal.SIGTERM, lambda signum, frame: process.send_signal(signum))
+    _, wait_status, rusage = os.wait4(process.pid, 0)
+    process.returncode = os.waitstatus_to_exitcode(wait_status)
+
+    usage = get_usage(rusage, wait_status)
+    save_usage(usage, output_file)
+    return 128 + usage["signal"] if usage["signal"] is not None else usage["exit_code"]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Records the CPU time and peak memory used by a game (command).")
+    parser.add_argument("--output", required=True, help="JSON file where to write the resources used.")
+    parser.add_argument("command", nargs=argparse.REMAINDER, help="-- followed by the command of the game.")
+    args = parser.parse_args()
+
+    command = args.command
+    if command and command[0] == "--":
+        command = command[1:]
+    if not command:
+        parser.error("no command given")
+
+    sys.exit(run_and_record(command, args.output))
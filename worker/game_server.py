@@ -0,0 +1,317 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+Warm game server for worker hosts: runs Pacman CTF games without paying the interpreter + engine start-up per game.
+
+This script is shipped inside the contest bundle (next to capture.py) and has two roles:
+
+    1. SERVER (--serve): a long-lived process that pre-imports the game engine (game, capture, layout, util,
+       distanceCalculator, etc.) and then forks one child per game request received in a local (AF_UNIX) socket.
+       The child runs capture.py as __main__ in the folder of the game, so it produces the same log-0/replay-0
+       files that a normal "python capture.py ..." run would.
+
+    2. CLIENT (default): used in place of "python capture.py <options>" by each game job:
+
+        python game_server.py --socket /tmp/pacman-contest-cache/<bundle>.sock -- <capture.py options>
+
+       It sends the game request (its current folder, the capture.py options, and its stdin/stdout/stderr file
+       descriptors) to the server, waits for the game to finish, and exits with the game exit code. If no server is
+       listening it starts one; if the server still cannot be used, it falls back to exec'ing capture.py directly.
+       With --resources FILE, the resources used by the game (see game_resources.py) are written into FILE.
+
+Protocol (one game per connection): the client sends one JSON line {"version", "cwd", "argv"} together with its
+fds 0, 1, 2 (SCM_RIGHTS); the server answers with one JSON line {"status": <exit code>, "resources": <usage>} when
+the game ends. If the client goes away (e.g., the ssh connection is dropped) the game is killed.
+
+Requires Python 3.9+ (socket.send_fds/recv_fds) in the worker hosts.
+"""
+import os
+import sys
+import json
+import time
+import types
+import select
+import signal
+import socket
+import argparse
+import subprocess
+import traceback
+
+import game_resources
+
+PROTOCOL_VERSION = 1
+
+# modules of the game engine that are imported once by the server (and thus shared by all the games it forks)
+PRELOAD_MODULES = [
+    "util",
+    "game",
+    "layout",
+    "distanceCalculator",
+    "mazeGenerator",
+    "captureAgents",
+    "textDisplay",
+    "keyboardAgents",
+    "capture",
+]
+
+SERVER_START_TIMEOUT = 10  # secs to wait for a server just started to accept requests
+SERVER_IDLE_TIMEOUT = 30 * 60  # secs without requests before the server exits
+
+ENGINE_DIR = os.path.dirname(os.path.realpath(__file__))
+
+
+####################################################################################
+# SERVER SIDE
+####################################################################################
+
+
+def serve(socket_path, idle_timeout=SERVER_IDLE_TIMEOUT):
+    """Runs the game server listening in socket_path until it is idle for idle_timeout seconds
+
+    Args:
+        socket_path (str): path of the AF_UNIX socket to listen to
+        idle_timeout (int, optional): seconds without requests before exiting. Defaults to SERVER_IDLE_TIMEOUT.
+    """
+    os.chdir(ENGINE_DIR)
+    if ENGINE_DIR not in sys.path:
+        sys.path.insert(0, ENGINE_DIR)
+
+    # pre-import the engine; failing modules are just left for the games to import
+    for module in PRELOAD_MODULES:
+        try:
+            __import__(module)
+        except Exception:
+            traceback.print_exc()
+
+    capture_file = os.path.join(ENGINE_DIR, "capture.py")
+    with open(capture_file, "r") as f:
+        capture_code = compile(f.read(), capture_file, "exec")
+
+    server = _bind(socket_path)
+    if server is None:
+        return  # another server is already serving this socket
+
+    # game handlers are not waited by the server; let the kernel reap them
+    signal.signal(signal.SIGCHLD, signal.SIG_IGN)
+    server.settimeout(idle_timeout)
+    sys.stdout.flush()
+    sys.stderr.flush()
+    try:
+        while True:
+            try:
+                conn, _ = server.accept()
+            except socket.timeout:
+                break
+            if os.fork() == 0:
+                server.close()
+                signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+                try:
+                    _handle_request(conn, capture_code)
+                finally:
+                    os._exit(0)
+            conn.close()
+    finally:
+        server.close()
+        try:
+            os.unlink(socket_path)
+        except OSError:
+            pass
+
+
+def _bind(socket_path):
+    """Binds a listening socket in socket_path, or returns None if a live server is already there"""
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        server.bind(socket_path)
+    except OSError:
+        if _connect(socket_path) is not None:
+            server.close()
+            return None
+        os.unlink(socket_path)  # stale socket left by a dead server
+        server.bind(socket_path)
+    os.chmod(socket_path, 0o600)
+    server.listen(64)
+    return server
+
+
+def _handle_request(conn, capture_code):
+    """Plays the game requested in connection conn in a forked child and reports back its exit status"""
+    message, fds, _, _ = socket.recv_fds(conn, 1 << 16, 3)
+    request = json.loads(message.decode())
+    if request.get("version") != PROTOCOL_VERSION or len(fds) != 3:
+        conn.sendall(json.dumps({"error": "protocol mismatch"}).encode() + b"\n")
+        return
+
+    pid = os.fork()
+    if pid == 0:
+        conn.close()
+        _run_game(request, fds, capture_code)  # never returns
+
+    for fd in fds:
+        os.close(fd)
+
+    # wait for the game to finish, but kill it if the client goes away
+    # (a pidfd, Linux 5.3+, becomes readable when the game ends; otherwise poll for it)
+    try:
+        watched, poll_interval = [conn, os.pidfd_open(pid)], None
+    except (AttributeError, OSError):
+        watched, poll_interval = [conn], 0.05
+    while True:
+        ready, _, _ = select.select(watched, [], [], poll_interval)
+        done_pid, wait_status, rusage = os.wait4(pid, os.WNOHANG)
+        if done_pid != 0:
+            break
+        if conn in ready and not conn.recv(1):
+            os.kill(pid, signal.SIGKILL)
+            os.waitpid(pid, 0)
+            return
+
+    status = os.waitstatus_to_exitcode(wait_status)
+    reply = {"status": status, "resources": game_resources.get_usage(rusage, wait_status)}
+    conn.sendall(json.dumps(reply).encode() + b"\n")
+
+
+def _run_game(request, fds, capture_code):
+    """Runs capture.py as __main__ in the current (forked) process, as a "python capture.py ..." would do"""
+    status = 0
+    try:
+        for target_fd, fd in zip((0, 1, 2), fds):
+            os.dup2(fd, target_fd)
+            os.close(fd)
+        os.chdir(request["cwd"])
+        sys.argv = ["capture.py"] + request["argv"]
+
+        # fresh __main__ module, so pickling and "import __main__" behave as in a standalone run
+        main_module = types.ModuleType("__main__")
+        main_module.__file__ = os.path.join(request["cwd"], "capture.py")
+        main_module.__builtins__ = __builtins__
+        sys.modules["__main__"] = main_module
+        exec(capture_code, main_module.__dict__)
+    except SystemExit as e:
+        if e.code is None:
+            status = 0
+        elif isinstance(e.code, int):
+            status = e.code
+        else:
+            print(e.code, file=sys.stderr)
+            status = 1
+    except BaseException:
+        traceback.print_exc()
+        status = 1
+    finally:
+        # capture.py may have redirected sys.stdout/sys.stderr into log-0
+        for stream in (sys.stdout, sys.stderr, sys.__stdout__, sys.__stderr__):
+            try:
+                stream.flush()
+            except Exception:
+                pass
+    os._exit(status)
+
+
+####################################################################################
+# CLIENT SIDE
+####################################################################################
+
+
+def _connect(socket_path):
+    """Returns a socket connected to the server in socket_path, or None if there is no live server"""
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        client.connect(socket_path)
+    except OSError:
+        client.close()
+        return None
+    return client
+
+
+def _start_server(socket_path):
+    """Starts a detached server for socket_path and returns a connection to it (or None if it did not come up)"""
+    with open(f"{socket_path}.log", "a") as log:
+        subprocess.Popen(
+            [sys.executable, os.path.join(ENGINE_DIR, os.path.basename(__file__)), "--serve", "--socket", socket_path],
+            cwd=ENGINE_DIR,
+            stdin=subprocess.DEVNULL,
+            stdout=log,
+            stderr=log,
+            start_new_session=True,
+        )
+    deadline = time.time() + SERVER_START_TIMEOUT
+    while time.time() < deadline:
+        client = _connect(socket_path)
+        if client is not None:
+            return client
+        time.sleep(0.1)
+    return None
+
+
+def request_game(socket_path, argv, resources_file=None):
+    """Asks the game server in socket_path to play a game with capture.py options argv in the current folder
+
+    Args:
+        socket_path (str): the AF_UNIX socket of the server
+        argv (list(str)): the options to capture.py
+        resources_file (str, optional): file where to write the resources used by the game. Defaults to None.
+
+    Returns:
+        int: the exit code of the game, or None if the server could not be used
+    """
+    client = _connect(socket_path) or _start_server(socket_path)
+    if client is None:
+        return None
+
+    with client:
+        request = {"version": PROTOCOL_VERSION, "cwd": os.getcwd(), "argv": argv}
+        try:
+            socket.send_fds(client, [json.dumps(request).encode()], [0, 1, 2])
+            reply = client.makefile("r").readline()
+        except OSError:
+            return None
+    try:
+        reply = json.loads(reply)
+        status = int(reply["status"])
+    except (ValueError, KeyError, TypeError):
+        return None
+    if resources_file is not None and "resources" in reply:
+        game_resources.save_usage(reply["resources"], resources_file)
+    return status
+
+
+def run_game_directly(argv, resources_file=None):
+    """Fallback: replaces this process with a standard "python capture.py <argv>" run in the current folder
+
+    If the resources used by the game are to be written into resources_file, it is run as a child process instead.
+    """
+    command = [sys.executable, "capture.py"] + argv
+    if resources_file is not None:
+        sys.exit(game_resources.run_and_record(command, resources_file))
+    sys.stdout.flush()
+    sys.stderr.flush()
+    os.execv(sys.executable, command)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Warm Pacman CTF game server (and client) for worker hosts.")
+    parser.add_argument("--socket", required=True, help="AF_UNIX socket of the game server.")
+    parser.add_argument("--serve", action="store_true", help="run as the server (default: run one game as client).")
+    parser.add_argument("--resources", help="file where to write the resources used by the game (client only).")
+    parser.add_argument(
+        "--idle-timeout",
+        type=int,
+        default=SERVER_IDLE_TIMEOUT,
+        help=f"seconds without requests before the server exits (default: {SERVER_IDLE_TIMEOUT}).",
+    )
+    parser.add_argument("capture_options", nargs=argparse.REMAINDER, help="-- followed by the capture.py options.")
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.socket, args.idle_timeout)
+        sys.exit(0)
+
+    capture_options = args.capture_options
+    if capture_options and capture_options[0] == "--":
+        capture_options = capture_options[1:]
+
+    exit_code = request_game(args.socket, capture_options, args.resources)
+    if exit_code is None:
+        run_game_directly(capture_options, args.resources)
+    sys.exit(exit_code)